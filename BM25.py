@@ -1,69 +1,137 @@
 import argparse
-import json
 import sys
 import os
-import sys
 import math
-
-from PorterStemmer import PorterStemmer
+import heapq
+import time
+import multiprocessing
+
+import Stemmer
+import Tokenizer
+import Positions
+import Impacts
+import BlockMax
+import DynamicPruning
+import IndexReader
+import VectorizedBM25
+import ForwardIndex
+import RelevanceFeedback
 
 # bm25 hyperparameters
 k_1 = 1.2
 b = 0.75
 
-def write_to_results_file(output_directory, top_ranked_documents):
-    with open(output_directory + "/hw4-bm25-baseline-k34lai.txt", 'a') as results_file:
-        results_file.write(top_ranked_documents + "\n")
-            
-def calculate_BM25_algorithm(inverted_index, lexicon, docnos, query_tokens, stem, doc_lengths, average_doc_length):
+# the output file is written through a buffer this large instead of a write per result line
+OUTPUT_BUFFER_BYTES = 1024 * 1024
+
+# the index and settings topics are ranked with, set before the worker processes are forked so
+# they share the read only index pages instead of each reading the index again
+batch_state = {}
+
+def add_proximity_scores(BM25_scores, query_terms, positions_reader, doc_lengths, average_doc_length):
+    # every pair of query terms adds min(idf) * acc / (K + acc), where acc sums 1 / distance^2
+    # over the occurrences of the two terms in a document that lie within the proximity window
+    term_positions = [positions_reader.get_doc_positions(term, doc_postings) for term, doc_postings, _ in query_terms]
+
+    for i in range(len(query_terms)):
+        for j in range(i + 1, len(query_terms)):
+            idf = min(query_terms[i][2], query_terms[j][2])
+            first_positions = term_positions[i]
+            second_positions = term_positions[j]
+
+            for doc_id in sorted(first_positions.keys() & second_positions.keys()):
+                accumulator = Positions.proximity_accumulator(first_positions[doc_id], second_positions[doc_id])
+                if not accumulator:
+                    continue
+
+                K = length_normalization(doc_lengths[doc_id] / average_doc_length, k_1, b)
+                BM25_scores[doc_id] += idf * accumulator / (K + accumulator)
+
+def select_top_k(scores, k):
+    # heapq.nlargest is sorted(..., reverse=True)[:k] including the order of equal scores,
+    # but only keeps k entries in its heap instead of sorting every matching document
+    if k is None:
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+    return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+def stem_query_tokens(query_tokens, stem, stem_cache=None):
+    # the terms every scorer looks the query up by, the tokens stemmed in query order if stem is set
+    if not stem:
+        return query_tokens
+    if stem_cache is None:
+        stem_cache = Stemmer.StemCache(record_new_stems=False)
+
+    return [stem_cache.stem(query_token) for query_token in query_tokens]
+
+def term_idf(N, posting_count, term_statistics=None, term_id=None):
+    # n_i is the collection's document frequency when term_statistics are given, which a shard
+    # needs to score as the unsharded index does, and the number of postings otherwise
+    if term_statistics is not None:
+        n_i = term_statistics.document_frequency(term_id)
+    else:
+        n_i = posting_count
+
+    return math.log((N - n_i + 0.5) / (n_i + 0.5))
+
+def length_normalization(length_ratio, k1, b):
+    # K of a document length_ratio times the average length, for a number or a numpy array
+    return k1 * ((1 - b) + b * length_ratio)
+
+def term_weight(f_i, K, idf):
+    # what one posting adds to a score, every scorer uses it so their scores match bit for bit
+    return f_i / (K + f_i) * idf
+
+def score_query_terms(inverted_index, lexicon, query_terms, N, doc_lengths, average_doc_length, term_statistics=None, first_entries=None):
+    # the bm25 score of every document a query term matches, keyed by doc id in the order the
+    # documents were first matched, and the (term, postings, idf) of the terms in the lexicon,
+    # first_entries gets the position in query_terms of the first term that matched a document
     BM25_scores = {}
-    porterStemmer = PorterStemmer()
-    N = len(docnos)
+    matched_terms = {}
+    # local names, looked up faster in the loop over every posting
+    normalization, weight = length_normalization, term_weight
 
-    for query_token in query_tokens:
-        if stem:
-            query_token = porterStemmer.stem(query_token, 0, len(query_token) - 1)
-        if query_token not in lexicon:
+    for entry, query_term in enumerate(query_terms):
+        if query_term not in lexicon:
             continue
 
-        query_token_id = lexicon[query_token]
-        doc_postings = inverted_index[query_token_id]
+        query_term_id = lexicon[query_term]
+        doc_postings = inverted_index[query_term_id]
 
-        # count number of docs in collection with query token in them
-        n_i = len(doc_postings[::2])
-        idf = math.log((N - n_i + 0.5) / (n_i + 0.5))
+        idf = term_idf(N, len(doc_postings) // 2, term_statistics, query_term_id)
+        matched_terms[query_term] = (query_term, doc_postings, idf)
 
         for index in range(0, len(doc_postings), 2):
             doc_id = doc_postings[index]
-            doc_no = docnos[doc_id]
-            f_i = doc_postings[index + 1]
-            doc_length = doc_lengths[doc_id]
-            K = k_1 * ((1 - b) + b * (doc_length / average_doc_length))
-            tf = f_i / (K + f_i)
-            BM25_score = tf * idf
+            BM25_score = weight(doc_postings[index + 1], normalization(doc_lengths[doc_id] / average_doc_length, k_1, b), idf)
 
             # update scores in dictionary
-            if doc_no in BM25_scores:
-                BM25_scores[doc_no] = BM25_scores[doc_no] + BM25_score
+            if doc_id in BM25_scores:
+                BM25_scores[doc_id] = BM25_scores[doc_id] + BM25_score
             else:
-                BM25_scores[doc_no] = BM25_score
+                BM25_scores[doc_id] = BM25_score
+                if first_entries is not None:
+                    first_entries[doc_id] = entry
 
-    sorted_BM25_scores = dict(sorted(BM25_scores.items(), key=lambda item: item[1], reverse=True))
+    return BM25_scores, matched_terms
 
-    return sorted_BM25_scores
+def result_order(result):
+    # sort key of a (score, first entry, doc id) result, best first and ties by first entry then
+    # doc id, which is the order score_query_terms first matches the documents in, so it is the
+    # order select_top_k leaves equal scores in too
+    score, entry, doc_id = result
+    return -score, entry, doc_id
 
-def get_inverted_index(directory_path):
-    inverted_index_file_path = directory_path + "/inverted-index.json"
+def calculate_BM25_algorithm(inverted_index, lexicon, docnos, query_tokens, stem, doc_lengths, average_doc_length, stem_cache=None, positions_reader=None, term_statistics=None, k=None):
+    query_terms = stem_query_tokens(query_tokens, stem, stem_cache)
+    BM25_scores, matched_terms = score_query_terms(inverted_index, lexicon, query_terms, len(docnos), doc_lengths, average_doc_length, term_statistics)
 
-    if os.path.exists(inverted_index_file_path): 
-        with open(inverted_index_file_path, 'r') as inverted_index_file:
-            inverted_index = json.load(inverted_index_file)
-    else:
-        print("Unable to find the inverted index file!")
-        sys.exit()
+    if positions_reader is not None and len(matched_terms) > 1:
+        add_proximity_scores(BM25_scores, [matched_terms[term] for term in sorted(matched_terms)], positions_reader, doc_lengths, average_doc_length)
 
-    inverted_index = {int(index): postings for index, postings in inverted_index.items()}
-    return inverted_index
+    sorted_BM25_scores = {docnos[doc_id]: score for doc_id, score in select_top_k(BM25_scores, k)}
+
+    return sorted_BM25_scores
 
 def get_queries(directory_path):
     queries_file_path = directory_path + "/queries.txt"
@@ -77,97 +145,45 @@ def get_queries(directory_path):
 
     return queries
 
-def get_lexicon(directory_path):
-    lexicon_file_path = directory_path + "/lexicon.json"
-
-    if os.path.exists(lexicon_file_path): 
-        with open(lexicon_file_path, 'r') as lexicon_file:
-            lexicon = json.load(lexicon_file)
-    else:
-        print("Unable to find the lexicon file!")
-        sys.exit()
-
-    return lexicon
-
-def get_docnos(directory_path):
-    docnos_file_path = directory_path + "/docnos.txt"
-
-    if os.path.exists(docnos_file_path): 
-        with open(docnos_file_path, 'r') as docnos_file:
-            docnos = docnos_file.read()
-    else:
-        print("Unable to find the docnos file!")
-        sys.exit()
-
-    return docnos
-
-def get_doc_lengths(directory_path):
-    doc_lengths_file_path = directory_path + "/doc-lengths.txt"
-    doc_lengths = []
-
-    if os.path.exists(doc_lengths_file_path): 
-        with open(doc_lengths_file_path, 'r') as doc_lengths_file:
-            for line in doc_lengths_file:
-                doc_lengths.append(int(line.strip()))
-    else:
-        print("Unable to find the doc-lengths file!")
-        sys.exit()
-
-    return doc_lengths
 
 def tokenize(text):
-    text = text.lower() 
-    tokens = set()
-
-    start = 0 
-    i = 0
-
-    for currChar in text:
-        if not currChar.isdigit() and not currChar.isalpha() :
-            if start != i :
-                token = text[start:i]
-                tokens.add(token)
-                
-            start = i + 1
-
-        i = i + 1
-
-    if start != i :
-        tokens.add(text[start:i])
-
-    return tokens
-
-# added for problem 7E part b bonus mark
-def BM25_parameter_optimization(inverted_index, lexicon, docnos, queries, doc_lengths, average_doc_length, stem, directory_path):
-    k1_values = [1.0, 1.2, 1.4, 1.6, 1.8]
-    b_values = [0.0, 0.5, 1.0]
-
-    global k_1, b
-    i = 0
-
-    for k1 in k1_values:
-        for b_value in b_values:
-            i += 1
-            k_1, b = k1, b_value
-            output_file = directory_path + f"/bm25-run-{i}-k34lai.txt"
-            with open(output_file, 'w') as output_file:
-                for index in range(0, len(queries), 2):
-                    query_tokens = tokenize(queries[index + 1])
-                    topic_id = queries[index]
+    return set(Tokenizer.iter_tokens(text))
+
+def rank_topic(topic):
+    # the result lines of one topic, ranked with the index in batch_state
+    topic_id, query = topic
+    state = batch_state
+    query_tokens = tokenize(query)
+
+    if state['forward_index'] is not None:
+        ranked_documents_dict = RelevanceFeedback.calculate_RM3(state['inverted_index'], state['lexicon'], state['docnos'], query_tokens, state['stem'], state['doc_lengths'], state['average_doc_length'], state['forward_index'], state['stem_cache'], state['term_statistics'], 1000, state['feedback_docs'], state['feedback_terms'], state['original_query_weight'])
+    elif state['vectorized_scorer'] is not None:
+        ranked_documents_dict = state['vectorized_scorer'].score(state['lexicon'], state['docnos'], query_tokens, state['stem'], state['stem_cache'], state['term_statistics'], k=1000)
+    elif state['block_index'] is not None:
+        ranked_documents_dict = DynamicPruning.calculate_BM25_DAAT(state['inverted_index'], state['lexicon'], state['docnos'], query_tokens, state['stem'], state['doc_lengths'], state['average_doc_length'], state['block_index'], 1000, state['strategy'], state['stem_cache'], state['term_statistics'])
+    elif state['impact_index'] is not None:
+        ranked_documents_dict = Impacts.calculate_impact_scores(state['impact_index'], state['inverted_index'], state['lexicon'], state['docnos'], query_tokens, state['stem'], state['stem_cache'], k=1000)
+    else:
+        ranked_documents_dict = calculate_BM25_algorithm(state['inverted_index'], state['lexicon'], state['docnos'], query_tokens, state['stem'], state['doc_lengths'], state['average_doc_length'], state['stem_cache'], state['positions_reader'], state['term_statistics'], k=1000)
 
-                    ranked_documents_dict = calculate_BM25_algorithm(inverted_index, lexicon, docnos, query_tokens, stem, doc_lengths, average_doc_length)
+    top_1000_documents = list(ranked_documents_dict.items())[:1000]
 
-                    top_1000_documents = list(ranked_documents_dict.items())[:1000]
-                    
-                    for index, (doc_no, score) in enumerate(top_1000_documents):
-                        output_file.write(f"{topic_id} Q0 {doc_no} {index + 1} {score} k34laiBM25run-{i}\n")
+    return "".join(f"{topic_id} Q0 {doc_no} {index + 1} {score} {state['name']}\n" for index, (doc_no, score) in enumerate(top_1000_documents))
 
 def main():
     # program arguments
     parser = argparse.ArgumentParser(description='')
     parser.add_argument('--directory_path', required=True, help='Directory path')
     parser.add_argument('--stem', required=True, help='Boolean true or false for whether to stem the words')
-    
+    parser.add_argument('--proximity', action='store_true', help='Add a term proximity score from the positional index')
+    parser.add_argument('--impacts', action='store_true', help='Rank by summing the quantized impacts stored at index time, if they match k1 and b')
+    parser.add_argument('--workers', type=int, default=1, help='Number of forked processes the topics are ranked in')
+    parser.add_argument('--strategy', choices=['exhaustive', 'vectorized'] + DynamicPruning.STRATEGIES, default='exhaustive', help='Score every posting, in python or with numpy arrays, or rank document at a time with WAND, Block-Max WAND or MaxScore pruning')
+    parser.add_argument('--rm3', action='store_true', help='Expand each query with RM3 pseudo relevance feedback from the forward index')
+    parser.add_argument('--fb_docs', type=int, default=RelevanceFeedback.FEEDBACK_DOCS, help='Top ranked documents the RM3 expansion terms are taken from')
+    parser.add_argument('--fb_terms', type=int, default=RelevanceFeedback.FEEDBACK_TERMS, help='Number of RM3 expansion terms')
+    parser.add_argument('--original_query_weight', type=float, default=RelevanceFeedback.ORIGINAL_QUERY_WEIGHT, help='Weight of the original query against the RM3 expansion terms')
+
     cli = parser.parse_args()
     directory_path = cli.directory_path
     stem = cli.stem
@@ -178,11 +194,64 @@ def main():
         print("This directory path does not exist! Please enter an existing directory path!")
         sys.exit()
 
-    inverted_index = get_inverted_index(directory_path)
+    index_reader = IndexReader.open_index(directory_path)
+    inverted_index, lexicon = index_reader.inverted_index, index_reader.lexicon
     queries = get_queries(directory_path)
-    lexicon = get_lexicon(directory_path)
-    docnos = get_docnos(directory_path)
-    doc_lengths = get_doc_lengths(directory_path)
+    docnos = index_reader.docnos
+    doc_lengths = index_reader.doc_lengths
+    stem_cache = Stemmer.load_stem_cache(directory_path) if stem else None
+    positions_reader = None
+    impact_index = None
+
+    if cli.workers > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+        print("Ranking with --workers needs processes forked from this one, which this platform does not support!")
+        sys.exit()
+
+    if cli.proximity and cli.impacts:
+        print("Proximity scores are not part of the impacts! Please choose either --proximity or --impacts!")
+        sys.exit()
+
+    if cli.strategy != 'exhaustive' and (cli.proximity or cli.impacts):
+        print("The vectorized and pruning strategies rank by plain BM25! Please leave out --proximity and --impacts!")
+        sys.exit()
+
+    if cli.strategy == 'vectorized' and not VectorizedBM25.numpy_available():
+        print("The vectorized strategy needs numpy! Please install numpy or choose another strategy!")
+        sys.exit()
+
+    if cli.rm3 and (cli.strategy != 'exhaustive' or cli.proximity or cli.impacts):
+        print("RM3 ranks the expanded queries by weighted BM25! Please leave out --strategy, --proximity and --impacts!")
+        sys.exit()
+
+    if cli.rm3 and (cli.fb_docs < 1 or cli.fb_terms < 1 or not 0 <= cli.original_query_weight <= 1):
+        print("--fb_docs and --fb_terms must be greater than 0 and --original_query_weight between 0 and 1!")
+        sys.exit()
+
+    forward_index = None
+    if cli.rm3:
+        if not ForwardIndex.forward_index_exists(directory_path):
+            print("Unable to find the forward index! Please rebuild the index with --forward_index!")
+            sys.exit()
+        forward_index = ForwardIndex.ForwardIndex(directory_path, index_reader.merged_term_ids())
+
+    block_index = None
+    if cli.strategy in DynamicPruning.STRATEGIES:
+        if not BlockMax.blocks_exist(directory_path):
+            print("Unable to find the postings blocks! Please rebuild the index!")
+            sys.exit()
+        block_index = BlockMax.BlockIndex(directory_path)
+
+    if cli.impacts:
+        if Impacts.impacts_current(directory_path, k_1, b):
+            impact_index = Impacts.ImpactIndex(directory_path)
+        else:
+            print("The impacts are missing, out of date or built for other k1 and b values, so scoring exactly instead")
+
+    if cli.proximity:
+        if not Positions.positions_exist(directory_path):
+            print("Unable to find the positional index! Please rebuild the index with --positions!")
+            sys.exit()
+        positions_reader = Positions.PositionsReader(directory_path)
 
     # for finding the number of cells that are filled for problem 5
     # total_sum = 0
@@ -190,10 +259,11 @@ def main():
     #     total_sum += len(value)
     # print(total_sum / 2)
 
-    average_doc_length = 0
-
-    if len(doc_lengths) > 0:
-        average_doc_length = sum(doc_lengths) / len(doc_lengths)
+    average_doc_length = index_reader.average_doc_length
+    term_statistics = index_reader.term_statistics
+    vectorized_scorer = None
+    if cli.strategy == 'vectorized':
+        vectorized_scorer = VectorizedBM25.VectorizedScorer(inverted_index, doc_lengths, average_doc_length)
 
     if stem:
         output_file = directory_path + "/hw4-bm25-stem-k34lai.txt"
@@ -202,24 +272,66 @@ def main():
         output_file = directory_path + "/hw4-bm25-baseline-k34lai.txt"
         name = "k34laiBM25baseline"
 
+    if positions_reader is not None:
+        output_file = output_file.replace("-k34lai.txt", "-proximity-k34lai.txt")
+        name += "proximity"
+    elif impact_index is not None:
+        output_file = output_file.replace("-k34lai.txt", "-impacts-k34lai.txt")
+        name += "impacts"
+    elif forward_index is not None:
+        output_file = output_file.replace("-k34lai.txt", "-rm3-k34lai.txt")
+        name += "rm3"
+
     # split each query into its own line
     queries = queries.splitlines()
-    docnos = docnos.splitlines()
-
-    # code for optimizing parameter by performing hyperparameter sweep
-    # BM25_parameter_optimization(inverted_index, lexicon, docnos, queries, doc_lengths, average_doc_length, stem, directory_path)
-
-    with open(output_file, 'w') as output_file:
-        for index in range(0, len(queries), 2):
-            query_tokens = tokenize(queries[index + 1])
-            topic_id = queries[index]
-
-            ranked_documents_dict = calculate_BM25_algorithm(inverted_index, lexicon, docnos, query_tokens, stem, doc_lengths, average_doc_length)
 
-            top_1000_documents = list(ranked_documents_dict.items())[:1000]
-            
-            for index, (doc_no, score) in enumerate(top_1000_documents):
-                output_file.write(f"{topic_id} Q0 {doc_no} {index + 1} {score} {name}\n")
+    batch_state.update({
+        'inverted_index': inverted_index,
+        'lexicon': lexicon,
+        'docnos': docnos,
+        'doc_lengths': doc_lengths,
+        'average_doc_length': average_doc_length,
+        'stem': stem,
+        'stem_cache': stem_cache,
+        'term_statistics': term_statistics,
+        'positions_reader': positions_reader,
+        'impact_index': impact_index,
+        'block_index': block_index,
+        'vectorized_scorer': vectorized_scorer,
+        'forward_index': forward_index,
+        'feedback_docs': cli.fb_docs,
+        'feedback_terms': cli.fb_terms,
+        'original_query_weight': cli.original_query_weight,
+        'strategy': cli.strategy,
+        'name': name
+    })
+    topics = [(queries[index], queries[index + 1]) for index in range(0, len(queries), 2)]
+    start = time.perf_counter()
+
+    with open(output_file, 'w', buffering=OUTPUT_BUFFER_BYTES) as output_file:
+        if cli.workers > 1:
+            # forked workers also share the parent's string hash seed, so the query token sets
+            # iterate in the same order and the scores match a run in one process
+            with multiprocessing.get_context('fork').Pool(cli.workers) as pool:
+                # imap hands the results back in topic order whichever worker finishes first
+                for result_lines in pool.imap(rank_topic, topics, chunksize=max(1, len(topics) // (cli.workers * 4))):
+                    output_file.write(result_lines)
+        else:
+            for result_lines in map(rank_topic, topics):
+                output_file.write(result_lines)
+
+    elapsed = time.perf_counter() - start
+    print(f"Ranked {len(topics)} queries in {elapsed:.2f}s, {len(topics) / elapsed:.1f} queries/sec")
+
+    if positions_reader is not None:
+        positions_reader.close()
+    if impact_index is not None:
+        impact_index.close()
+    if block_index is not None:
+        block_index.close()
+    if forward_index is not None:
+        forward_index.close()
+    index_reader.close()
 
 if __name__ == '__main__':
     main()
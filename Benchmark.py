@@ -0,0 +1,521 @@
+import argparse
+import asyncio
+import json
+import gzip
+import os
+import random
+import sys
+import time
+
+import BM25
+import BlockMax
+import BooleanRetrieval
+import DynamicPruning
+import CalculateMeasures
+import DocumentReader
+import Impacts
+import IndexReader
+import Positions
+import Postings
+import Query
+import QueryBiasedSummary
+import Sentences
+import Segments
+import Tokenizer
+import VectorizedBM25
+import SearchService
+from urllib.parse import quote
+from parsers import QrelsParser
+from Results import Results, Result
+
+def check_gzip_path(gzip_path):
+    if not os.path.exists(gzip_path):
+        print("This data path does not exist! Please enter a valid path to the latimes file!")
+        sys.exit()
+
+def read_relevant_texts(gzip_path, documents):
+    texts = []
+
+    for index, document in enumerate(DocumentReader.read_documents(gzip_path)):
+        if documents and index == documents:
+            break
+        texts.extend(document.relevant_text_strings())
+
+    return texts
+
+def time_runs(function, repeats):
+    best = None
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+def benchmark_tokenizer(cli):
+    check_gzip_path(cli.gzip_path)
+    texts = read_relevant_texts(cli.gzip_path, cli.documents)
+    characters = sum(len(text) for text in texts)
+
+    for text in texts:
+        reference_tokens = list(Tokenizer.split_tokens(text.lower()))
+        if Tokenizer.tokenize(text) != reference_tokens or list(Tokenizer.iter_tokens(text)) != reference_tokens:
+            print("The fast tokenizers do not match the reference tokenizer!")
+            sys.exit()
+
+    reference = time_runs(lambda: [list(Tokenizer.split_tokens(text.lower())) for text in texts], cli.repeats)
+    fast = time_runs(lambda: [Tokenizer.tokenize(text) for text in texts], cli.repeats)
+
+    print(f"{len(texts)} strings, {characters} characters, identical tokens")
+    print(f"character loop: {reference:.3f} seconds ({characters / reference / 1e6:.1f} M chars/second)")
+    print(f"Tokenizer.tokenize: {fast:.3f} seconds ({characters / fast / 1e6:.1f} M chars/second)")
+    print(f"speedup: {reference / fast:.1f}x")
+
+def benchmark_reader(cli):
+    check_gzip_path(cli.gzip_path)
+
+    def decompress():
+        with gzip.open(cli.gzip_path, 'rb') as gzip_file:
+            for _ in DocumentReader.read_chunks(gzip_file, DocumentReader.CHUNK_SIZE):
+                pass
+
+    def read():
+        for document in DocumentReader.read_documents(cli.gzip_path):
+            document.relevant_text_strings()
+
+    def read_and_tokenize():
+        for document in DocumentReader.read_documents(cli.gzip_path):
+            for text in document.relevant_text_strings():
+                Tokenizer.tokenize(text)
+
+    documents = sum(1 for _ in DocumentReader.read_documents(cli.gzip_path))
+    decompression = time_runs(decompress, cli.repeats)
+    reading = time_runs(read, cli.repeats)
+    tokenizing = time_runs(read_and_tokenize, cli.repeats)
+
+    print(f"{documents} documents")
+    print(f"gzip decompression: {decompression:.3f} seconds")
+    print(f"decompression and parsing: {reading:.3f} seconds ({documents / reading:.0f} documents/second)")
+    print(f"decompression, parsing and tokenizing: {tokenizing:.3f} seconds, {reading / tokenizing:.0%} of it reading the collection")
+
+def check_positions_path(directory_path):
+    if not os.path.exists(directory_path) or not Positions.positions_exist(directory_path):
+        print("Unable to find the positional index! Please build the index with --positions!")
+        sys.exit()
+
+def file_sizes(directory_path, file_name):
+    return sum(os.path.getsize(segment_path + file_name) for segment_path in Segments.get_segment_paths(directory_path))
+
+def benchmark_positions(cli):
+    check_positions_path(cli.directory_path)
+    index_reader = IndexReader.open_index(cli.directory_path)
+    inverted_index, lexicon = index_reader.inverted_index, index_reader.lexicon
+    docnos = index_reader.docnos
+    doc_lengths = index_reader.doc_lengths
+    average_doc_length = index_reader.average_doc_length
+    positions_reader = Positions.PositionsReader(cli.directory_path)
+
+    # the odd lines of the queries file are the query texts, each adjacent pair of their words is a phrase
+    query_texts = BM25.get_queries(cli.directory_path).splitlines()[1::2]
+    queries = [BM25.tokenize(text) for text in query_texts]
+    phrases = []
+    for text in query_texts:
+        tokens = Tokenizer.tokenize(text)
+        phrases.extend(tokens[index:index + 2] for index in range(len(tokens) - 1))
+
+    def rank(reader):
+        for query_tokens in queries:
+            BM25.calculate_BM25_algorithm(inverted_index, lexicon, docnos, query_tokens, False, doc_lengths, average_doc_length, positions_reader=reader)
+
+    def match():
+        for phrase in phrases:
+            Positions.match_phrase(phrase, inverted_index, lexicon, positions_reader)
+
+    baseline = time_runs(lambda: rank(None), cli.repeats)
+    proximity = time_runs(lambda: rank(positions_reader), cli.repeats)
+    phrase_matching = time_runs(match, cli.repeats)
+    positions_reader.close()
+
+    postings_size = file_sizes(cli.directory_path, Postings.POSTINGS_FILE_NAME)
+    positions_size = file_sizes(cli.directory_path, Positions.POSITIONS_FILE_NAME)
+
+    print(f"{len(queries)} queries, {len(phrases)} two word phrases")
+    print(f"BM25: {baseline / len(queries) * 1000:.2f} ms/query")
+    print(f"BM25 with proximity: {proximity / len(queries) * 1000:.2f} ms/query ({proximity / baseline:.1f}x)")
+    print(f"phrase matching: {phrase_matching / max(len(phrases), 1) * 1000:.2f} ms/phrase")
+    print(f"postings: {postings_size / 1e6:.1f} MB, positions: {positions_size / 1e6:.1f} MB ({positions_size / max(postings_size, 1):.1f}x the postings)")
+
+def read_query_topics(directory_path):
+    # (topic id, query tokens) for every query in the index directory's queries file
+    lines = BM25.get_queries(directory_path).splitlines()
+    return [(lines[index], BM25.tokenize(lines[index + 1])) for index in range(0, len(lines), 2)]
+
+def rankings_to_results(rankings):
+    # the top 1000 of each ranking as the Results a run file would parse into
+    results = Results()
+
+    for topic_id, ranked_documents_dict in rankings.items():
+        for rank, (doc_no, score) in enumerate(list(ranked_documents_dict.items())[:1000]):
+            results.add_result(topic_id, Result(doc_no, score, rank + 1))
+
+    return results
+
+def overlap(first_ranking, second_ranking, depth):
+    first = list(first_ranking)[:depth]
+    second = set(list(second_ranking)[:depth])
+    return len([doc_no for doc_no in first if doc_no in second]) / len(first) if first else 1.0
+
+def benchmark_impacts(cli):
+    if not Impacts.impacts_current(cli.directory_path, BM25.k_1, BM25.b):
+        print(f"Unable to find impacts for k1={BM25.k_1} and b={BM25.b}! Please build the index with --impacts or run Impacts.py on it!")
+        sys.exit()
+
+    index_reader = IndexReader.open_index(cli.directory_path)
+    inverted_index, lexicon = index_reader.inverted_index, index_reader.lexicon
+    docnos = index_reader.docnos
+    doc_lengths = index_reader.doc_lengths
+    average_doc_length = index_reader.average_doc_length
+    impact_index = Impacts.ImpactIndex(cli.directory_path)
+    bits = Impacts.read_impact_settings(cli.directory_path)['bits']
+    topics = read_query_topics(cli.directory_path)
+    exact_rankings = {}
+    impact_rankings = {}
+
+    def rank_exactly():
+        for topic_id, query_tokens in topics:
+            exact_rankings[topic_id] = BM25.calculate_BM25_algorithm(inverted_index, lexicon, docnos, query_tokens, False, doc_lengths, average_doc_length)
+
+    def rank_by_impacts():
+        for topic_id, query_tokens in topics:
+            impact_rankings[topic_id] = Impacts.calculate_impact_scores(impact_index, inverted_index, lexicon, docnos, query_tokens, False)
+
+    exact = time_runs(rank_exactly, cli.repeats)
+    quantized = time_runs(rank_by_impacts, cli.repeats)
+    impact_index.close()
+
+    print(f"{len(topics)} queries, {bits} bit impacts")
+    print(f"exact BM25: {exact / len(topics) * 1000:.2f} ms/query")
+    print(f"impacts: {quantized / len(topics) * 1000:.2f} ms/query ({exact / quantized:.1f}x)")
+    for depth in [10, 1000]:
+        mean_overlap = sum(overlap(exact_rankings[topic_id], impact_rankings[topic_id], depth) for topic_id, _ in topics) / len(topics)
+        print(f"top {depth} overlap with exact BM25: {mean_overlap:.3f}")
+
+    if cli.qrel:
+        qrel = QrelsParser(cli.qrel).parse()
+        for name, rankings in [("exact BM25", exact_rankings), ("impacts", impact_rankings)]:
+            measures = CalculateMeasures.calculate_metrics(qrel, (name, rankings_to_results(rankings)))
+            print(f"{name}: MAP {CalculateMeasures.calculate_mean(measures['average_precision']):.4f}, "
+                  f"P@10 {CalculateMeasures.calculate_mean(measures['precision_at_10']):.4f}, "
+                  f"NDCG@10 {CalculateMeasures.calculate_mean(measures['ndcg_at_10']):.4f}")
+
+def benchmark_topk(cli):
+    index_reader = IndexReader.open_index(cli.directory_path)
+    inverted_index, lexicon = index_reader.inverted_index, index_reader.lexicon
+    docnos = index_reader.docnos
+    doc_lengths = index_reader.doc_lengths
+    average_doc_length = index_reader.average_doc_length
+    topics = read_query_topics(cli.directory_path)
+
+    def rank(k):
+        return [BM25.calculate_BM25_algorithm(inverted_index, lexicon, docnos, query_tokens, False, doc_lengths, average_doc_length, k=k) for _, query_tokens in topics]
+
+    full_rankings = rank(None)
+    for k in [1000, 10]:
+        if any(list(top_k.items()) != list(full.items())[:k] for top_k, full in zip(rank(k), full_rankings)):
+            print(f"The top {k} results differ from the full sort!")
+            sys.exit()
+
+    # the selection on its own, over every query's scores in a fixed shuffled order
+    scores = []
+    for full in full_rankings:
+        items = list(full.items())
+        random.Random(0).shuffle(items)
+        scores.append(dict(items))
+
+    matching = sum(len(full) for full in full_rankings)
+    print(f"{len(topics)} queries, {matching / len(topics):.0f} matching documents per query, identical top k")
+
+    for k in [None, 1000, 10]:
+        name = "full sort" if k is None else f"k={k}"
+        scoring = time_runs(lambda: rank(k), cli.repeats)
+        selection = time_runs(lambda: [BM25.select_top_k(query_scores, k) for query_scores in scores], cli.repeats)
+        print(f"{name}: {scoring / len(topics) * 1000:.2f} ms/query, of which selection {selection / len(topics) * 1000:.2f} ms")
+
+    # common terms in a full collection match far more documents than a test index has
+    for size in cli.sizes:
+        generator = random.Random(size)
+        synthetic_scores = {f"LA{index:06d}": generator.random() for index in range(size)}
+        timings = [f"{'full sort' if k is None else f'k={k}'} {time_runs(lambda: BM25.select_top_k(synthetic_scores, k), cli.repeats) * 1000:.1f} ms" for k in [None, 1000, 10]]
+        print(f"selection over {size} random scores: {', '.join(timings)}")
+
+def benchmark_pruning(cli):
+    if not BlockMax.blocks_exist(cli.directory_path):
+        print("Unable to find the postings blocks! Please rebuild the index!")
+        sys.exit()
+
+    index_reader = IndexReader.open_index(cli.directory_path)
+    inverted_index, lexicon = index_reader.inverted_index, index_reader.lexicon
+    docnos = index_reader.docnos
+    doc_lengths = index_reader.doc_lengths
+    average_doc_length = index_reader.average_doc_length
+    term_statistics = index_reader.term_statistics
+    block_index = BlockMax.BlockIndex(cli.directory_path)
+    topics = read_query_topics(cli.directory_path)
+    postings = sum(len(inverted_index[lexicon[token]]) // 2 for _, query_tokens in topics for token in query_tokens if token in lexicon)
+
+    print(f"{len(topics)} queries, {postings / len(topics):.0f} postings per query")
+
+    for k in cli.k:
+        def rank_exhaustively():
+            return [BM25.calculate_BM25_algorithm(inverted_index, lexicon, docnos, query_tokens, False, doc_lengths, average_doc_length, term_statistics=term_statistics, k=k) for _, query_tokens in topics]
+
+        exhaustive_rankings = rank_exhaustively()
+        exhaustive = time_runs(rank_exhaustively, cli.repeats)
+        timings = [f"exhaustive {exhaustive / len(topics) * 1000:.1f} ms"]
+
+        for strategy in DynamicPruning.STRATEGIES:
+            def rank_document_at_a_time():
+                return [DynamicPruning.calculate_BM25_DAAT(inverted_index, lexicon, docnos, query_tokens, False, doc_lengths, average_doc_length, block_index, k, strategy, term_statistics=term_statistics) for _, query_tokens in topics]
+
+            if any(list(pruned.items()) != list(exhaustive_ranking.items()) for pruned, exhaustive_ranking in zip(rank_document_at_a_time(), exhaustive_rankings)):
+                print(f"{strategy} does not give the exhaustive top {k}!")
+                sys.exit()
+
+            pruned = time_runs(rank_document_at_a_time, cli.repeats)
+            timings.append(f"{strategy} {pruned / len(topics) * 1000:.1f} ms ({exhaustive / pruned:.1f}x)")
+
+        print(f"k={k}: {', '.join(timings)}, identical rankings")
+
+    block_index.close()
+
+def benchmark_boolean(cli):
+    if not BlockMax.blocks_exist(cli.directory_path):
+        print("Unable to find the postings blocks! Please rebuild the index!")
+        sys.exit()
+
+    index_reader = IndexReader.open_index(cli.directory_path)
+    inverted_index, lexicon = index_reader.inverted_index, index_reader.lexicon
+    docnos = index_reader.docnos
+    doc_lengths = index_reader.doc_lengths
+    average_doc_length = index_reader.average_doc_length
+    block_index = BlockMax.BlockIndex(cli.directory_path)
+    searcher = BooleanRetrieval.BooleanSearcher(index_reader.segment_postings, block_index, doc_lengths, average_doc_length)
+    topics = read_query_topics(cli.directory_path)
+
+    for terms in cli.terms:
+        # the first words of every query ANDed, against the same words ranked disjunctively
+        queries = [sorted(query_tokens)[:terms] for _, query_tokens in topics]
+        nodes = [('and', tuple(('term', token) for token in query_tokens)) for query_tokens in queries]
+
+        for query_tokens, node in zip(queries, nodes):
+            postings = [set(inverted_index[lexicon[token]][0::2]) if token in lexicon else set() for token in query_tokens]
+            if searcher.match(node) != sorted(set.intersection(*postings)):
+                print(f"The boolean matches of {' AND '.join(query_tokens)} differ from intersecting the full postings!")
+                sys.exit()
+
+        matches = sum(len(searcher.match(node)) for node in nodes)
+        disjunctive = time_runs(lambda: [BM25.calculate_BM25_algorithm(inverted_index, lexicon, docnos, set(query_tokens), False, doc_lengths, average_doc_length, k=cli.k) for query_tokens in queries], cli.repeats)
+        matching = time_runs(lambda: [searcher.match(node) for node in nodes], cli.repeats)
+        ranking = time_runs(lambda: [searcher.rank(node, cli.k) for node in nodes], cli.repeats)
+
+        print(f"{terms} terms, {len(nodes)} queries, {matches / len(nodes):.1f} matching documents per query, identical matches")
+        print(f"disjunctive BM25 k={cli.k} {disjunctive / len(nodes) * 1000:.2f} ms/query, "
+              f"AND {matching / len(nodes) * 1000:.2f} ms/query ({disjunctive / matching:.1f}x), "
+              f"AND ranked k={cli.k} {ranking / len(nodes) * 1000:.2f} ms/query ({disjunctive / ranking:.1f}x)")
+
+    block_index.close()
+
+def benchmark_vectorized(cli):
+    if not VectorizedBM25.numpy_available():
+        print("The vectorized scorer needs numpy! Please install numpy!")
+        sys.exit()
+
+    index_reader = IndexReader.open_index(cli.directory_path)
+    inverted_index, lexicon = index_reader.inverted_index, index_reader.lexicon
+    docnos = index_reader.docnos
+    doc_lengths = index_reader.doc_lengths
+    average_doc_length = index_reader.average_doc_length
+    term_statistics = index_reader.term_statistics
+    topics = read_query_topics(cli.directory_path)
+
+    # the first ranking converts the queried postings to arrays, the timed runs reuse them
+    start = time.perf_counter()
+    scorer = VectorizedBM25.VectorizedScorer(inverted_index, doc_lengths, average_doc_length)
+    [scorer.score(lexicon, docnos, query_tokens, False, term_statistics=term_statistics, k=max(cli.k)) for _, query_tokens in topics]
+    print(f"{len(topics)} queries, {time.perf_counter() - start:.2f}s to load the queried postings as arrays")
+
+    for k in cli.k:
+        def rank_in_python():
+            return [BM25.calculate_BM25_algorithm(inverted_index, lexicon, docnos, query_tokens, False, doc_lengths, average_doc_length, term_statistics=term_statistics, k=k) for _, query_tokens in topics]
+
+        def rank_vectorized():
+            return [scorer.score(lexicon, docnos, query_tokens, False, term_statistics=term_statistics, k=k) for _, query_tokens in topics]
+
+        if any(list(vectorized.items()) != list(python_ranking.items()) for vectorized, python_ranking in zip(rank_vectorized(), rank_in_python())):
+            print(f"The vectorized scorer does not give the python top {k}!")
+            sys.exit()
+
+        python_time = time_runs(rank_in_python, cli.repeats)
+        vectorized_time = time_runs(rank_vectorized, cli.repeats)
+        print(f"k={k}: python {python_time / len(topics) * 1000:.1f} ms, vectorized {vectorized_time / len(topics) * 1000:.1f} ms ({python_time / vectorized_time:.1f}x), identical rankings")
+
+def benchmark_summaries(cli):
+    if not Sentences.sentences_exist(cli.directory_path):
+        print("Unable to find the sentences! Please rebuild the index with --sentences!")
+        sys.exit()
+
+    index_reader = IndexReader.open_index(cli.directory_path)
+    document_store = Query.get_document_store(cli.directory_path)
+    sentence_store = Sentences.SentenceStore(cli.directory_path)
+    queries = BM25.get_queries(cli.directory_path).splitlines()[1::2]
+
+    # the results a first page of each query shows, summarized from the store and from the sentences
+    results = []
+    for query in queries:
+        ranking = BM25.calculate_BM25_algorithm(index_reader.inverted_index, index_reader.lexicon, index_reader.docnos, BM25.tokenize(query), False, index_reader.doc_lengths, index_reader.average_doc_length, k=cli.results)
+        results.extend((query, document_store.get_internal_id(doc_no)) for doc_no in ranking)
+
+    def summarize_documents():
+        summaries = []
+        for query, internal_id in results:
+            text_content = QueryBiasedSummary.text_content(document_store.get_document(internal_id))
+            summaries.append(QueryBiasedSummary.summarize(query, text_content or ""))
+        return summaries
+
+    def summarize_stored_sentences():
+        return [QueryBiasedSummary.summarize_sentences(query, internal_id, sentence_store) for query, internal_id in results]
+
+    if summarize_documents() != summarize_stored_sentences():
+        print("The summaries from the stored sentences differ from summarizing the documents!")
+        sys.exit()
+
+    document_time = time_runs(summarize_documents, cli.repeats)
+    sentence_time = time_runs(summarize_stored_sentences, cli.repeats)
+    print(f"{len(queries)} queries, {len(results)} results, identical summaries")
+    print(f"documents {document_time / len(results) * 1000:.3f} ms/result, stored sentences {sentence_time / len(results) * 1000:.3f} ms/result ({document_time / sentence_time:.1f}x)")
+
+    sentence_store.close()
+    document_store.close()
+
+async def fetch(host, port, path):
+    # one GET on its own connection, as the search service closes every connection after responding
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode('latin-1'))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, body = response.split(b"\r\n\r\n", 1)
+    return int(head.split(b" ", 2)[1]), body
+
+async def load_test(host, port, paths, concurrency):
+    # concurrency clients send the requests one after another until every path was requested
+    latencies = []
+    statuses = {}
+    next_path = iter(paths)
+
+    async def client():
+        for path in next_path:
+            start = time.perf_counter()
+            try:
+                status, _ = await fetch(host, port, path)
+            except ConnectionError:
+                status = 'connection error'
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - start, sorted(latencies), statuses
+
+def benchmark_service(cli):
+    # searches for the queries of the index directory against a running SearchService.py
+    lines = BM25.get_queries(cli.directory_path).splitlines()
+    queries = [lines[index + 1] for index in range(0, len(lines), 2)]
+
+    for round_number, concurrency in enumerate(cli.concurrency):
+        # every round searches for queries the earlier rounds did not, going on to later pages once
+        # every query was used, so the rounds are not answered from the service's response cache
+        searches = range(round_number * cli.requests, (round_number + 1) * cli.requests)
+        paths = [f"/search?q={quote(queries[search % len(queries)])}&page={search // len(queries) % 10 + 1}" for search in searches]
+
+        elapsed, latencies, statuses = asyncio.run(load_test(cli.host, cli.port, paths, concurrency))
+        print(f"concurrency {concurrency}: {len(paths) / elapsed:.1f} requests/sec, "
+              f"p50 {SearchService.percentile(latencies, 50) * 1000:.1f} ms, p95 {SearchService.percentile(latencies, 95) * 1000:.1f} ms, "
+              f"p99 {SearchService.percentile(latencies, 99) * 1000:.1f} ms, statuses {dict(sorted(statuses.items(), key=str))}")
+
+    _, body = asyncio.run(fetch(cli.host, cli.port, "/metrics"))
+    metrics = json.loads(body)
+    print(f"service: {metrics['rejected']} rejected, {metrics['timeouts']} timed out, response cache hit rate {metrics['response cache']['hit rate']:.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks for the index engine')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    tokenizer_parser = subparsers.add_parser('tokenizer', help='Compare the tokenizer against the reference character loop')
+    tokenizer_parser.add_argument('--gzip_path', required=True, help='File path to the latimes.gz file')
+    tokenizer_parser.add_argument('--documents', type=int, default=0, help='Only use the relevant text of this many documents, 0 for all')
+    tokenizer_parser.add_argument('--repeats', type=int, default=3, help='Number of timed runs, the best is reported')
+    tokenizer_parser.set_defaults(run=benchmark_tokenizer)
+
+    reader_parser = subparsers.add_parser('reader', help='Time decompressing and splitting the collection into documents')
+    reader_parser.add_argument('--gzip_path', required=True, help='File path to the latimes.gz file')
+    reader_parser.add_argument('--repeats', type=int, default=3, help='Number of timed runs, the best is reported')
+    reader_parser.set_defaults(run=benchmark_reader)
+
+    positions_parser = subparsers.add_parser('positions', help='Time proximity ranking and phrase matching over a positional index')
+    positions_parser.add_argument('--directory_path', required=True, help='Index built with --positions, with a queries.txt file')
+    positions_parser.add_argument('--repeats', type=int, default=3, help='Number of timed runs, the best is reported')
+    positions_parser.set_defaults(run=benchmark_positions)
+
+    impacts_parser = subparsers.add_parser('impacts', help='Compare ranking by quantized impacts against exact BM25')
+    impacts_parser.add_argument('--directory_path', required=True, help='Index built with --impacts, with a queries.txt file')
+    impacts_parser.add_argument('--qrel', help='Path to a qrel file, to also compare MAP, P@10 and NDCG@10')
+    impacts_parser.add_argument('--repeats', type=int, default=3, help='Number of timed runs, the best is reported')
+    impacts_parser.set_defaults(run=benchmark_impacts)
+
+    topk_parser = subparsers.add_parser('topk', help='Compare heap top k selection against sorting every BM25 score')
+    topk_parser.add_argument('--directory_path', required=True, help='Index directory with a queries.txt file')
+    topk_parser.add_argument('--sizes', type=int, nargs='*', default=[100000, 500000], help='Also time the selection alone over this many random scores')
+    topk_parser.add_argument('--repeats', type=int, default=3, help='Number of timed runs, the best is reported')
+    topk_parser.set_defaults(run=benchmark_topk)
+
+    pruning_parser = subparsers.add_parser('pruning', help='Compare WAND, Block-Max WAND and MaxScore against exhaustive BM25')
+    pruning_parser.add_argument('--directory_path', required=True, help='Index directory with a queries.txt file')
+    pruning_parser.add_argument('--k', type=int, nargs='+', default=[10, 100, 1000], help='Result list lengths to compare')
+    pruning_parser.add_argument('--repeats', type=int, default=3, help='Number of timed runs, the best is reported')
+    pruning_parser.set_defaults(run=benchmark_pruning)
+
+    vectorized_parser = subparsers.add_parser('vectorized', help='Compare the numpy BM25 scorer against the python one')
+    vectorized_parser.add_argument('--directory_path', required=True, help='Index directory with a queries.txt file')
+    vectorized_parser.add_argument('--k', type=int, nargs='+', default=[10, 1000], help='Result list lengths to compare')
+    vectorized_parser.add_argument('--repeats', type=int, default=3, help='Number of timed runs, the best is reported')
+    vectorized_parser.set_defaults(run=benchmark_vectorized)
+
+    boolean_parser = subparsers.add_parser('boolean', help='Compare AND queries with galloping intersection against disjunctive BM25')
+    boolean_parser.add_argument('--directory_path', required=True, help='Index directory with a queries.txt file')
+    boolean_parser.add_argument('--terms', type=int, nargs='+', default=[2, 3], help='Numbers of query words ANDed')
+    boolean_parser.add_argument('--k', type=int, default=10, help='Result list length')
+    boolean_parser.add_argument('--repeats', type=int, default=3, help='Number of timed runs, the best is reported')
+    boolean_parser.set_defaults(run=benchmark_boolean)
+
+    summaries_parser = subparsers.add_parser('summaries', help='Compare query biased summaries from the stored sentences against summarizing the documents')
+    summaries_parser.add_argument('--directory_path', required=True, help='Index built with --sentences, with a queries.txt file')
+    summaries_parser.add_argument('--results', type=int, default=10, help='Results summarized per query')
+    summaries_parser.add_argument('--repeats', type=int, default=3, help='Number of timed runs, the best is reported')
+    summaries_parser.set_defaults(run=benchmark_summaries)
+
+    service_parser = subparsers.add_parser('service', help='Load test a running SearchService.py with concurrent searches')
+    service_parser.add_argument('--directory_path', required=True, help='Directory with the queries.txt file the searches are taken from')
+    service_parser.add_argument('--host', default='127.0.0.1', help='Address the service listens on')
+    service_parser.add_argument('--port', type=int, default=8080, help='Port the service listens on')
+    service_parser.add_argument('--requests', type=int, default=500, help='Searches sent at every concurrency')
+    service_parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help='Numbers of concurrent clients')
+    service_parser.set_defaults(run=benchmark_service)
+
+    cli = parser.parse_args()
+    cli.run(cli)
+
+if __name__ == '__main__':
+    main()
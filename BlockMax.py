@@ -0,0 +1,135 @@
+import os
+import bisect
+from array import array
+import Postings
+import Segments
+from DocumentStore import map_file
+
+BLOCKS_FILE_NAME = "/postings-blocks.bin"
+BLOCKS_TABLE_FILE_NAME = "/postings-blocks-table.bin"
+
+# postings per block, every block of a term has this many except its last
+BLOCK_SIZE = 128
+
+# every block has one (last doc id, byte offset in the term's postings, max tf, min doc length)
+# entry, so score bounds can be computed for any k1 and b and the blocks double as skip pointers
+BLOCK_ENTRY_WIDTH = 4
+
+def vbyte_length(number):
+    return max(1, (number.bit_length() + 6) // 7)
+
+def term_blocks(postings, doc_lengths):
+    blocks = []
+    offset = 0
+    previous_doc_id = 0
+
+    for start in range(0, len(postings), 2 * BLOCK_SIZE):
+        max_tf = 0
+        min_doc_length = None
+        block_offset = offset
+
+        for index in range(start, min(start + 2 * BLOCK_SIZE, len(postings)), 2):
+            doc_id = postings[index]
+            tf = postings[index + 1]
+            offset += vbyte_length(doc_id - previous_doc_id) + vbyte_length(tf)
+            previous_doc_id = doc_id
+            max_tf = max(max_tf, tf)
+            if min_doc_length is None or doc_lengths[doc_id] < min_doc_length:
+                min_doc_length = doc_lengths[doc_id]
+
+        blocks.extend((previous_doc_id, block_offset, max_tf, min_doc_length))
+
+    return blocks
+
+def write_blocks(segment_path, doc_lengths):
+    # one pass over the written postings, doc lengths are indexed by internal id across all segments
+    table = Postings.read_postings_table(segment_path)
+    blocks = array('I')
+    blocks_table = array('Q', [0])
+
+    with open(segment_path + Postings.POSTINGS_FILE_NAME, 'rb') as postings_file:
+        data = memoryview(postings_file.read())
+
+    for term_id in range(len(table) // Postings.TABLE_ENTRY_WIDTH):
+        offset = table[term_id * Postings.TABLE_ENTRY_WIDTH]
+        length = table[term_id * Postings.TABLE_ENTRY_WIDTH + 1]
+        blocks.extend(term_blocks(Postings.decode_postings(data[offset:offset + length]), doc_lengths))
+        blocks_table.append(len(blocks) // BLOCK_ENTRY_WIDTH)
+
+    with open(segment_path + BLOCKS_FILE_NAME, 'wb') as blocks_file:
+        blocks.tofile(blocks_file)
+
+    with open(segment_path + BLOCKS_TABLE_FILE_NAME, 'wb') as blocks_table_file:
+        blocks_table.tofile(blocks_table_file)
+
+def blocks_exist(directory_path):
+    return all(os.path.exists(segment_path + BLOCKS_FILE_NAME) for segment_path in Segments.get_segment_paths(directory_path))
+
+class TermBlocks:
+    def __init__(self, last_doc_ids, ends, max_tfs, min_doc_lengths, offsets):
+        # block i holds the postings from ends[i - 1] (or 0) up to ends[i] of the term's postings list
+        self.last_doc_ids = last_doc_ids
+        self.ends = ends
+        self.max_tfs = max_tfs
+        self.min_doc_lengths = min_doc_lengths
+        self.offsets = offsets
+        self.count = len(last_doc_ids)
+
+    def __len__(self):
+        return self.count
+
+    def find_block(self, doc_id, start=0):
+        # the first block from start whose last doc id is at least doc_id, len(self) if none is
+        return bisect.bisect_left(self.last_doc_ids, doc_id, start)
+
+    def start(self, block):
+        return self.ends[block - 1] if block > 0 else 0
+
+class BlockIndex:
+    def __init__(self, directory_path):
+        self.segments = []
+
+        for segment_path in Segments.get_segment_paths(directory_path):
+            blocks_table = array('Q')
+            with open(segment_path + BLOCKS_TABLE_FILE_NAME, 'rb') as blocks_table_file:
+                blocks_table.frombytes(blocks_table_file.read())
+
+            blocks_map = map_file(segment_path + BLOCKS_FILE_NAME)
+            self.segments.append((
+                Segments.read_lexicon(segment_path),
+                blocks_table,
+                memoryview(blocks_map).cast('I'),
+                Postings.read_term_statistics(segment_path)
+            ))
+
+    def get_blocks(self, term):
+        # a segmented term's postings are its segments' lists one after another, so the block
+        # ends are shifted by the postings of the earlier segments
+        last_doc_ids = []
+        ends = []
+        max_tfs = []
+        min_doc_lengths = []
+        offsets = []
+        shift = 0
+
+        for lexicon, blocks_table, blocks, term_statistics in self.segments:
+            term_id = lexicon.get(term)
+            if term_id is None:
+                continue
+
+            document_frequency = term_statistics.document_frequency(term_id)
+            for block in range(blocks_table[term_id], blocks_table[term_id + 1]):
+                entry = block * BLOCK_ENTRY_WIDTH
+                last_doc_ids.append(blocks[entry])
+                offsets.append(blocks[entry + 1])
+                max_tfs.append(blocks[entry + 2])
+                min_doc_lengths.append(blocks[entry + 3])
+                ends.append(shift + min((block - blocks_table[term_id] + 1) * BLOCK_SIZE, document_frequency))
+            shift += document_frequency
+
+        return TermBlocks(last_doc_ids, ends, max_tfs, min_doc_lengths, offsets)
+
+    def close(self):
+        for lexicon, _, blocks, _ in self.segments:
+            lexicon.close()
+            blocks.release()
@@ -0,0 +1,243 @@
+import heapq
+import bisect
+from itertools import accumulate
+import BM25
+import BlockMax
+import DynamicPruning
+import Postings
+import Stemmer
+
+END = DynamicPruning.END
+
+def gallop(values, target, low):
+    # the first index from low whose value is at least target, len(values) if none is, found
+    # with doubling steps and a binary search over the last step so a long skip costs log of it
+    step = 1
+    high = low
+    while high < len(values) and values[high] < target:
+        low = high + 1
+        high += step
+        step *= 2
+
+    return bisect.bisect_left(values, target, low, min(high, len(values)))
+
+class BlockCursor:
+    def __init__(self, last_doc_ids, starts, ends, bases, postings, size):
+        # block i of the term is the vbyte bytes postings[i][starts[i]:ends[i]], its first doc id
+        # a gap from bases[i], so a block is only decoded when a doc id in it is asked for
+        self.last_doc_ids = last_doc_ids
+        self.starts = starts
+        self.ends = ends
+        self.bases = bases
+        self.postings = postings
+        self.size = size
+        self.block = 0
+        self.doc_ids = []
+        self.counts = []
+        self.position = 0
+        self.doc = END
+
+        if last_doc_ids:
+            self.load(0)
+
+    def load(self, block):
+        numbers = Postings.decode_vbyte(self.postings[block][self.starts[block]:self.ends[block]])
+        self.doc_ids = list(accumulate(numbers[0::2], initial=self.bases[block]))[1:]
+        self.counts = numbers[1::2]
+        self.block = block
+        self.position = 0
+        self.doc = self.doc_ids[0]
+
+    def count(self):
+        return self.counts[self.position]
+
+    def next(self):
+        self.position += 1
+        if self.position < len(self.doc_ids):
+            self.doc = self.doc_ids[self.position]
+        elif self.block + 1 < len(self.last_doc_ids):
+            self.load(self.block + 1)
+        else:
+            self.doc = END
+
+    def advance(self, target):
+        # move to the first posting with a doc id of at least target, galloping over the block
+        # skip pointers and decoding only the block it lands in
+        if self.doc >= target:
+            return
+
+        if target > self.last_doc_ids[self.block]:
+            block = gallop(self.last_doc_ids, target, self.block + 1)
+            if block == len(self.last_doc_ids):
+                self.position = len(self.doc_ids)
+                self.doc = END
+                return
+            self.load(block)
+
+        self.position = gallop(self.doc_ids, target, self.position)
+        self.doc = self.doc_ids[self.position]
+
+class ListCursor:
+    def __init__(self, doc_ids):
+        # the sorted doc ids of a subquery, or a range for every document
+        self.doc_ids = doc_ids
+        self.size = len(doc_ids)
+        self.position = 0
+        self.doc = doc_ids[0] if doc_ids else END
+
+    def next(self):
+        self.position += 1
+        self.doc = self.doc_ids[self.position] if self.position < self.size else END
+
+    def advance(self, target):
+        if self.doc >= target:
+            return
+
+        self.position = gallop(self.doc_ids, target, self.position)
+        self.doc = self.doc_ids[self.position] if self.position < self.size else END
+
+def cursor_size(cursor):
+    return cursor.size
+
+def intersect(cursors, exclusions):
+    # the rarest list leads and the others gallop to its doc ids, when one of them skips past
+    # a doc id the lead gallops to where that one stopped instead of stepping through its list
+    cursors.sort(key=cursor_size)
+    lead = cursors[0]
+    doc_ids = []
+
+    while lead.doc != END:
+        doc_id = lead.doc
+        for cursor in cursors[1:]:
+            cursor.advance(doc_id)
+            if cursor.doc != doc_id:
+                lead.advance(cursor.doc)
+                break
+        else:
+            if not is_excluded(doc_id, exclusions):
+                doc_ids.append(doc_id)
+            lead.next()
+
+    return doc_ids
+
+def is_excluded(doc_id, exclusions):
+    for cursor in exclusions:
+        cursor.advance(doc_id)
+        if cursor.doc == doc_id:
+            return True
+
+    return False
+
+def ranked_terms(node, terms=None):
+    # the terms outside NOT in the order they appear, which are the ones a match is scored on
+    if terms is None:
+        terms = []
+
+    if node[0] == 'term':
+        if node[1] not in terms:
+            terms.append(node[1])
+    elif node[0] != 'not':
+        for child in node[1]:
+            ranked_terms(child, terms)
+
+    return terms
+
+class BooleanSearcher:
+    def __init__(self, segment_postings, block_index, doc_lengths, average_doc_length, stem=False, stem_cache=None):
+        # segment_postings are IndexReader's mapped segments and block_index the same segments'
+        # BlockMax blocks, whose (last doc id, byte offset) entries are the skip pointers
+        if stem and stem_cache is None:
+            stem_cache = Stemmer.StemCache(record_new_stems=False)
+        self.segment_postings = segment_postings
+        self.block_index = block_index
+        self.doc_lengths = doc_lengths
+        self.average_doc_length = average_doc_length
+        self.stem = stem
+        self.stem_cache = stem_cache
+
+    def term_cursor(self, term):
+        if self.stem:
+            term = self.stem_cache.stem(term)
+
+        last_doc_ids = []
+        starts = []
+        ends = []
+        bases = []
+        postings = []
+        size = 0
+
+        # segments hold ascending ranges of global doc ids, so a term's segment lists follow on
+        for (lexicon, blocks_table, blocks, term_statistics), segment_postings in zip(self.block_index.segments, self.segment_postings):
+            term_id = lexicon.get(term)
+            if term_id is None:
+                continue
+
+            offset, length = segment_postings.term_range(term_id)
+            size += term_statistics.document_frequency(term_id)
+            base = 0
+            for block in range(blocks_table[term_id], blocks_table[term_id + 1]):
+                entry = block * BlockMax.BLOCK_ENTRY_WIDTH
+                last_doc_ids.append(blocks[entry])
+                starts.append(offset + blocks[entry + 1])
+                ends.append(offset + (blocks[entry + BlockMax.BLOCK_ENTRY_WIDTH + 1] if block + 1 < blocks_table[term_id + 1] else length))
+                bases.append(base)
+                postings.append(segment_postings.postings)
+                base = blocks[entry]
+
+        return BlockCursor(last_doc_ids, starts, ends, bases, postings, size)
+
+    def cursor(self, node):
+        if node[0] == 'term':
+            return self.term_cursor(node[1])
+        return ListCursor(self.match(node))
+
+    def match(self, node):
+        # the sorted doc ids of the documents matching a parsed query, where a node is
+        # ('term', token), ('and', children), ('or', children) or ('not', child)
+        if node[0] == 'term':
+            cursor = self.term_cursor(node[1])
+            doc_ids = []
+            while cursor.doc != END:
+                doc_ids.append(cursor.doc)
+                cursor.next()
+            return doc_ids
+
+        if node[0] == 'or':
+            doc_ids = set()
+            for child in node[1]:
+                doc_ids.update(self.match(child))
+            return sorted(doc_ids)
+
+        children = node[1] if node[0] == 'and' else [node]
+        cursors = [self.cursor(child) for child in children if child[0] != 'not']
+        exclusions = [self.cursor(child[1]) for child in children if child[0] == 'not']
+
+        # a query of only NOTs matches every other document
+        if not cursors:
+            cursors = [ListCursor(range(len(self.doc_lengths)))]
+
+        return intersect(cursors, exclusions)
+
+    def rank(self, node, k=None):
+        # the top k (doc id, score) of the matching documents by BM25 over the query terms
+        # outside NOT, ties in doc id order
+        doc_ids = self.match(node)
+        scores = [0.0] * len(doc_ids)
+        N = len(self.doc_lengths)
+
+        for term in ranked_terms(node):
+            cursor = self.term_cursor(term)
+            idf = BM25.term_idf(N, cursor.size)
+
+            for index, doc_id in enumerate(doc_ids):
+                cursor.advance(doc_id)
+                if cursor.doc == doc_id:
+                    K = BM25.length_normalization(self.doc_lengths[doc_id] / self.average_doc_length, BM25.k_1, BM25.b)
+                    scores[index] += BM25.term_weight(cursor.count(), K, idf)
+
+        if k is None:
+            order = sorted(range(len(doc_ids)), key=scores.__getitem__, reverse=True)
+        else:
+            order = heapq.nlargest(k, range(len(doc_ids)), key=scores.__getitem__)
+
+        return [(doc_ids[index], scores[index]) for index in order]
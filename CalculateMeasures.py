@@ -44,15 +44,16 @@ def calculate_metrics(qrel, results):
 
         query_result = sorted(query_result)
 
+        # get qrels relevant docs and sort them based on relevance for ideal relevance, once per
+        # query since they do not depend on the rank
+        relevant_docs_qrels = [(doc_id, qrel.get_relevance(query_id, doc_id))
+                     for doc_id in qrel.query_2_reldoc_nos[query_id]]
+        sorted_relevant_docs_qrels = sorted(relevant_docs_qrels, key=lambda x: x[1], reverse=True)
+
         # loop through all of query results or only the first 1000 results
         for index in range(min(1000, len(query_result))):
             relevance = float(qrel.get_relevance(query_id, query_result[index].doc_id))
 
-            # get qrels relevant docs and sort them based on relevance for ideal relevance
-            relevant_docs_qrels = [(doc_id, qrel.get_relevance(query_id, doc_id))
-                         for doc_id in qrel.query_2_reldoc_nos[query_id]]
-            sorted_relevant_docs_qrels = sorted(relevant_docs_qrels, key=lambda x: x[1], reverse=True)
-
             ideal_relevance = 0
             # ensure index is valid
             if index < len(sorted_relevant_docs_qrels):
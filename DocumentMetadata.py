@@ -0,0 +1,101 @@
+import os
+from array import array
+from datetime import date
+from DocumentStore import map_file
+
+DOCNOS_FILE_NAME = "/docnos.bin"
+DOC_LENGTHS_FILE_NAME = "/doc-lengths.bin"
+DOC_DATES_FILE_NAME = "/doc-dates.bin"
+HEADLINE_OFFSETS_FILE_NAME = "/headline-offsets.bin"
+HEADLINES_FILE_NAME = "/headlines.bin"
+
+# docnos are stored as fixed-width, null padded ascii so the i-th docno is at i * DOCNO_WIDTH
+DOCNO_WIDTH = 16
+DATE_FORMAT = '%B %d, %Y'
+
+class DocumentMetadataWriter:
+    def __init__(self, storage_path, append=False):
+        self.storage_path = storage_path
+        self.append = append
+        self.docnos = bytearray()
+        self.doc_lengths = array('I')
+        self.doc_dates = array('I')
+        self.headline_offsets = array('Q', [0])
+        self.headlines = bytearray()
+        self.headlines_start = 0
+
+        if append:
+            # the existing offsets already start with 0 and end at the current size of the heap
+            self.headline_offsets = array('Q')
+            self.headlines_start = os.path.getsize(storage_path + HEADLINES_FILE_NAME)
+
+    def add_document(self, doc_no, date_ordinal, headline):
+        encoded_doc_no = doc_no.encode('utf-8')
+        if len(encoded_doc_no) > DOCNO_WIDTH:
+            raise ValueError(f"The docno {doc_no} is longer than {DOCNO_WIDTH} bytes")
+
+        self.docnos += encoded_doc_no.ljust(DOCNO_WIDTH, b"\0")
+        self.doc_dates.append(date_ordinal)
+        self.headlines += headline.encode('utf-8')
+        self.headline_offsets.append(self.headlines_start + len(self.headlines))
+
+    def add_doc_length(self, doc_length):
+        self.doc_lengths.append(doc_length)
+
+    def close(self):
+        mode = 'ab' if self.append else 'wb'
+
+        with open(self.storage_path + DOCNOS_FILE_NAME, mode) as docnos_file:
+            docnos_file.write(self.docnos)
+        with open(self.storage_path + DOC_LENGTHS_FILE_NAME, mode) as doc_lengths_file:
+            self.doc_lengths.tofile(doc_lengths_file)
+        with open(self.storage_path + DOC_DATES_FILE_NAME, mode) as doc_dates_file:
+            self.doc_dates.tofile(doc_dates_file)
+        with open(self.storage_path + HEADLINE_OFFSETS_FILE_NAME, mode) as headline_offsets_file:
+            self.headline_offsets.tofile(headline_offsets_file)
+        with open(self.storage_path + HEADLINES_FILE_NAME, mode) as headlines_file:
+            headlines_file.write(self.headlines)
+
+def document_metadata_exists(directory_path):
+    return os.path.exists(directory_path + DOCNOS_FILE_NAME) and os.path.exists(directory_path + DOC_LENGTHS_FILE_NAME)
+
+class DocnoColumn:
+    def __init__(self, docnos):
+        self.docnos = docnos
+
+    def __len__(self):
+        return len(self.docnos) // DOCNO_WIDTH
+
+    def __getitem__(self, internal_id):
+        if not 0 <= internal_id < len(self):
+            raise IndexError(f"No document with internal id {internal_id}")
+
+        start = internal_id * DOCNO_WIDTH
+        return self.docnos[start:start + DOCNO_WIDTH].rstrip(b"\0").decode('utf-8')
+
+class DocumentMetadata:
+    def __init__(self, directory_path):
+        self.docnos = DocnoColumn(map_file(directory_path + DOCNOS_FILE_NAME))
+        self.doc_lengths = memoryview(map_file(directory_path + DOC_LENGTHS_FILE_NAME)).cast('I')
+        self.doc_dates = memoryview(map_file(directory_path + DOC_DATES_FILE_NAME)).cast('I')
+        self.headline_offsets = memoryview(map_file(directory_path + HEADLINE_OFFSETS_FILE_NAME)).cast('Q')
+        self.headlines = map_file(directory_path + HEADLINES_FILE_NAME)
+
+    def __len__(self):
+        return len(self.docnos)
+
+    def date(self, internal_id):
+        return date.fromordinal(self.doc_dates[internal_id]).strftime(DATE_FORMAT)
+
+    def headline(self, internal_id):
+        start = self.headline_offsets[internal_id]
+        end = self.headline_offsets[internal_id + 1]
+        return self.headlines[start:end].decode('utf-8')
+
+    def metadata(self, internal_id):
+        return {
+            'docno': self.docnos[internal_id],
+            'internal id': internal_id,
+            'date': self.date(internal_id),
+            'headline': self.headline(internal_id)
+        }
@@ -0,0 +1,139 @@
+import gzip
+import re
+
+DOC_CLOSING_TAG = b"</DOC>"
+DOC_NO_TAG = b"<DOCNO>"
+HEADLINE_OPENING_TAG = b"<HEADLINE>"
+HEADLINE_CLOSING_TAG = b"</HEADLINE>"
+P_OPENING_TAG = b"<P>"
+P_CLOSING_TAG = b"</P>"
+NEWLINE = b"\n"
+
+# the fields whose text is indexed, in the order they are searched for at each position
+RELEVANT_TAGS = [(b"<TEXT>", b"</TEXT>"), (b"<HEADLINE>", b"</HEADLINE>"), (b"<GRAPHIC>", b"</GRAPHIC>")]
+
+DOC_NO_REGEX = re.compile(rb'LA\d{6}-\d{4}')
+HEADLINE_TAGS_REGEX = re.compile(r'<\/?HEADLINE>')
+ALL_TAGS_REGEX = re.compile(r'<[^>]+>')
+
+# compressed collections are decompressed this many bytes at a time
+CHUNK_SIZE = 4 * 1024 * 1024
+
+class DocumentRecord:
+    def __init__(self, doc_no, headline, raw_document, text_spans):
+        self.doc_no = doc_no
+        self.headline = headline
+        self.raw_document = raw_document
+        self.text_spans = text_spans
+
+    def relevant_text_strings(self):
+        return relevant_text_strings(self.text_spans)
+
+def relevant_text_strings(text_spans):
+    return [ALL_TAGS_REGEX.sub('', bytes(span).decode('utf-8').strip()) for span in text_spans]
+
+def line_bounds(document, position):
+    line_start = document.rfind(NEWLINE, 0, position) + 1
+    line_end = document.find(NEWLINE, position)
+    return line_start, len(document) if line_end == -1 else line_end
+
+def find_doc_no(document):
+    position = document.find(DOC_NO_TAG)
+    if position == -1:
+        return ""
+
+    line_start, line_end = line_bounds(document, position)
+    match = DOC_NO_REGEX.search(document, line_start, line_end)
+
+    return match.group().decode('ascii') if match else ""
+
+def find_headline(document):
+    # every line from the one opening the headline to the one closing it, except the <P> lines
+    lines = []
+    position = document.find(HEADLINE_OPENING_TAG)
+
+    while position != -1:
+        closing_position = document.find(HEADLINE_CLOSING_TAG, position)
+        line_start, _ = line_bounds(document, position)
+        _, line_end = line_bounds(document, len(document) if closing_position == -1 else closing_position)
+
+        for line in document[line_start:line_end].split(NEWLINE):
+            if P_OPENING_TAG not in line and P_CLOSING_TAG not in line:
+                lines.append(line.decode('utf-8').strip())
+
+        position = document.find(HEADLINE_OPENING_TAG, line_end)
+
+    return HEADLINE_TAGS_REGEX.sub('', " ".join(lines)).strip()
+
+def find_text_spans(document, view):
+    # the earliest opening tag wins and its span runs to the first closing tag after at least
+    # one character, the same matches as <TEXT>([\s\S]+?)</TEXT>|<HEADLINE>...|<GRAPHIC>...
+    spans = []
+    position = 0
+    next_openings = [document.find(opening_tag) for opening_tag, _ in RELEVANT_TAGS]
+
+    while True:
+        best = None
+        for index, (opening_tag, closing_tag) in enumerate(RELEVANT_TAGS):
+            if next_openings[index] != -1 and next_openings[index] < position:
+                next_openings[index] = document.find(opening_tag, position)
+            opening = next_openings[index]
+            if opening == -1 or (best is not None and opening >= best[0]):
+                continue
+            closing = document.find(closing_tag, opening + len(opening_tag) + 1)
+            if closing != -1:
+                best = (opening, opening + len(opening_tag), closing, len(closing_tag))
+
+        if best is None:
+            return spans
+
+        opening, span_start, closing, closing_tag_length = best
+        spans.append(view[span_start:closing])
+        position = closing + closing_tag_length
+
+def parse_document(document):
+    view = memoryview(document)
+    return DocumentRecord(find_doc_no(document), find_headline(document), view, find_text_spans(document, view))
+
+def split_documents(chunks):
+    # a document is every byte after the previous document up to the end of its </DOC> line
+    data = b""
+    search_position = 0
+
+    for chunk in chunks:
+        data = data + chunk if data else chunk
+        start = 0
+
+        while True:
+            closing = data.find(DOC_CLOSING_TAG, search_position)
+            if closing == -1:
+                # a closing tag may be cut in half at the end of the chunk
+                search_position = max(start, len(data) - len(DOC_CLOSING_TAG) + 1)
+                break
+            line_end = data.find(NEWLINE, closing)
+            if line_end == -1:
+                search_position = closing
+                break
+
+            yield data[start:line_end + 1]
+            start = line_end + 1
+            search_position = start
+
+        data = data[start:]
+        search_position -= start
+
+    # a last </DOC> without a trailing newline still closes its document
+    if data.find(DOC_CLOSING_TAG) != -1:
+        yield data
+
+def read_chunks(binary_file, chunk_size):
+    while True:
+        chunk = binary_file.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+def read_documents(gzip_path, chunk_size=CHUNK_SIZE):
+    with gzip.open(gzip_path, 'rb') as gzip_file:
+        for document in split_documents(read_chunks(gzip_file, chunk_size)):
+            yield parse_document(document)
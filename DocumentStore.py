@@ -0,0 +1,156 @@
+import os
+import json
+import mmap
+import struct
+import zlib
+
+DOCUMENTS_FILE_NAME = "/documents.bin"
+DOCUMENT_OFFSETS_FILE_NAME = "/document-offsets.bin"
+DOCNO_IDS_FILE_NAME = "/docno-ids.bin"
+DOCUMENT_STORE_FILE_NAME = "/document-store.json"
+
+# one entry per internal id: block offset, block length, offset of the record in the
+# uncompressed block and record length
+OFFSET_ENTRY = struct.Struct('<QIII')
+
+# docno -> internal id entries, sorted by docno so lookups are a binary search
+DOCNO_WIDTH = 16
+DOCNO_ID_ENTRY = struct.Struct(f'<{DOCNO_WIDTH}sI')
+
+# uncompressed bytes gathered into one zlib block
+BLOCK_SIZE = 64 * 1024
+
+class DocumentStoreWriter:
+    def __init__(self, storage_path, compress, append=False):
+        self.storage_path = storage_path
+        self.compress = compress
+        self.offset = 0
+        self.block = bytearray()
+        self.block_records = []
+        self.docno_ids = []
+
+        if append:
+            # keep adding to the existing store with the compression it was created with
+            with open(storage_path + DOCUMENT_STORE_FILE_NAME, 'r') as document_store_file:
+                self.compress = json.load(document_store_file)['compressed']
+            self.offset = os.path.getsize(storage_path + DOCUMENTS_FILE_NAME)
+            with open(storage_path + DOCNO_IDS_FILE_NAME, 'rb') as docno_ids_file:
+                self.docno_ids = [(doc_no.rstrip(b"\0"), internal_id) for doc_no, internal_id in DOCNO_ID_ENTRY.iter_unpack(docno_ids_file.read())]
+
+        mode = 'ab' if append else 'wb'
+        self.documents_file = open(storage_path + DOCUMENTS_FILE_NAME, mode)
+        self.offsets_file = open(storage_path + DOCUMENT_OFFSETS_FILE_NAME, mode)
+
+    def add(self, internal_id, doc_no, raw_document):
+        if internal_id != len(self.docno_ids):
+            raise ValueError(f"Documents must be stored in internal id order, expected {len(self.docno_ids)} but got {internal_id}")
+
+        # the raw document arrives as the bytes read from the collection
+        self.block_records.append((len(self.block), len(raw_document)))
+        self.block += raw_document
+        self.docno_ids.append((doc_no.encode('utf-8'), internal_id))
+
+        if not self.compress or len(self.block) >= BLOCK_SIZE:
+            self.flush_block()
+
+    def flush_block(self):
+        if not self.block_records:
+            return
+
+        block = zlib.compress(self.block) if self.compress else self.block
+        self.documents_file.write(block)
+
+        for record_offset, record_length in self.block_records:
+            self.offsets_file.write(OFFSET_ENTRY.pack(self.offset, len(block), record_offset, record_length))
+
+        self.offset += len(block)
+        self.block = bytearray()
+        self.block_records = []
+
+    def close(self):
+        self.flush_block()
+        self.documents_file.close()
+        self.offsets_file.close()
+
+        with open(self.storage_path + DOCNO_IDS_FILE_NAME, 'wb') as docno_ids_file:
+            docno_ids_file.write(b"".join(DOCNO_ID_ENTRY.pack(doc_no, internal_id) for doc_no, internal_id in sorted(self.docno_ids)))
+
+        with open(self.storage_path + DOCUMENT_STORE_FILE_NAME, 'w') as document_store_file:
+            json.dump({'compressed': self.compress, 'block size': BLOCK_SIZE}, document_store_file, indent=4)
+
+def document_store_exists(directory_path):
+    return os.path.exists(directory_path + DOCUMENT_STORE_FILE_NAME)
+
+def map_file(file_path):
+    with open(file_path, 'rb') as mapped_file:
+        if os.fstat(mapped_file.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(mapped_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+class DocumentStore:
+    def __init__(self, directory_path):
+        with open(directory_path + DOCUMENT_STORE_FILE_NAME, 'r') as document_store_file:
+            self.compressed = json.load(document_store_file)['compressed']
+
+        self.documents_file = open(directory_path + DOCUMENTS_FILE_NAME, 'rb')
+        self.offsets = map_file(directory_path + DOCUMENT_OFFSETS_FILE_NAME)
+        self.docno_ids = map_file(directory_path + DOCNO_IDS_FILE_NAME)
+        self.cached_block_offset = None
+        self.cached_block = None
+
+    def __len__(self):
+        return len(self.offsets) // OFFSET_ENTRY.size
+
+    def read_block(self, block_offset, block_length):
+        if block_offset == self.cached_block_offset:
+            return self.cached_block
+
+        self.documents_file.seek(block_offset)
+        block = self.documents_file.read(block_length)
+
+        if self.compressed:
+            block = zlib.decompress(block)
+            # consecutive ids usually share a block, so keep the last one around
+            self.cached_block_offset = block_offset
+            self.cached_block = block
+
+        return block
+
+    def get_document(self, internal_id):
+        if not 0 <= internal_id < len(self):
+            raise IndexError(f"No document with internal id {internal_id}")
+
+        block_offset, block_length, record_offset, record_length = OFFSET_ENTRY.unpack_from(self.offsets, internal_id * OFFSET_ENTRY.size)
+        block = self.read_block(block_offset, block_length)
+        return bytes(block[record_offset:record_offset + record_length]).decode('utf-8')
+
+    def get_internal_id(self, doc_no):
+        key = doc_no.encode('utf-8').ljust(DOCNO_WIDTH, b"\0")
+        if len(key) > DOCNO_WIDTH:
+            return None
+
+        low = 0
+        high = len(self.docno_ids) // DOCNO_ID_ENTRY.size
+
+        while low < high:
+            middle = (low + high) // 2
+            entry_doc_no, internal_id = DOCNO_ID_ENTRY.unpack_from(self.docno_ids, middle * DOCNO_ID_ENTRY.size)
+            if entry_doc_no < key:
+                low = middle + 1
+            elif entry_doc_no > key:
+                high = middle
+            else:
+                return internal_id
+
+        return None
+
+    def get_document_by_docno(self, doc_no):
+        internal_id = self.get_internal_id(doc_no)
+
+        if internal_id is None:
+            raise KeyError(doc_no)
+
+        return self.get_document(internal_id)
+
+    def close(self):
+        self.documents_file.close()
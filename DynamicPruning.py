@@ -0,0 +1,234 @@
+import math
+import heapq
+import BM25
+
+STRATEGIES = ['wand', 'bmw', 'maxscore']
+
+# bounds are summed in a different order than the exact scores, so a document is only skipped
+# when its bound is below the threshold by more than the rounding that order can introduce
+EPSILON = 1e-9
+
+END = math.inf
+
+class TermCursor:
+    def __init__(self, entry_index, postings, blocks, idf, doc_lengths, average_doc_length):
+        self.entry_index = entry_index
+        self.postings = postings
+        self.blocks = blocks
+        self.idf = idf
+        self.doc_lengths = doc_lengths
+        self.average_doc_length = average_doc_length
+        self.size = len(postings) // 2
+
+        # a term with a negative idf can only lower a score, so its bounds are 0
+        self.block_bounds = [self.weight(max_tf, min_doc_length) if idf > 0 else 0.0 for max_tf, min_doc_length in zip(blocks.max_tfs, blocks.min_doc_lengths)]
+        self.upper_bound = max(self.block_bounds, default=0.0)
+
+        self.position = 0
+        self.block = 0
+        self.doc = postings[0] if self.size else END
+
+    def weight(self, f_i, doc_length):
+        K = BM25.length_normalization(doc_length / self.average_doc_length, BM25.k_1, BM25.b)
+        return BM25.term_weight(f_i, K, self.idf)
+
+    def score(self):
+        return self.weight(self.postings[2 * self.position + 1], self.doc_lengths[self.doc])
+
+    def next(self):
+        self.position += 1
+        if self.position >= self.size:
+            self.doc = END
+            return
+
+        while self.blocks.ends[self.block] <= self.position:
+            self.block += 1
+        self.doc = self.postings[2 * self.position]
+
+    def advance(self, target):
+        # move to the first posting with a doc id of at least target, skipping whole blocks
+        if self.doc >= target:
+            return
+
+        blocks = self.blocks
+        block = self.block if blocks.last_doc_ids[self.block] >= target else blocks.find_block(target, self.block)
+        if block == blocks.count:
+            self.position = self.size
+            self.doc = END
+            return
+
+        low = max(self.position + 1, blocks.start(block))
+        high = blocks.ends[block] - 1
+        postings = self.postings
+        while low < high:
+            middle = (low + high) // 2
+            if postings[2 * middle] < target:
+                low = middle + 1
+            else:
+                high = middle
+
+        self.block = block
+        self.position = low
+        self.doc = postings[2 * low]
+
+    def block_bound(self, target):
+        # bound and last doc id of the block target would be in, without moving the cursor
+        last_doc_ids = self.blocks.last_doc_ids
+        block = self.block if last_doc_ids[self.block] >= target else self.blocks.find_block(target, self.block)
+        if block == self.blocks.count:
+            return 0.0, END
+        return self.block_bounds[block], last_doc_ids[block]
+
+class TopK:
+    def __init__(self, k):
+        # a min heap of (score, -first query term, -doc id), the worst kept result on top, which
+        # orders ties the way the exhaustive scorer's insertion ordered dict does
+        self.k = k
+        self.heap = []
+        self.threshold = -math.inf
+
+    def can_enter(self, bound):
+        return bound + EPSILON >= self.threshold
+
+    def add(self, doc_id, contributions):
+        # (query term, score) contributions are summed in query term order, as
+        # calculate_BM25_algorithm adds them
+        contributions.sort()
+        score = contributions[0][1]
+        for _, contribution in contributions[1:]:
+            score += contribution
+
+        key = (score, -contributions[0][0], -doc_id)
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, key)
+        elif key > self.heap[0]:
+            heapq.heapreplace(self.heap, key)
+
+        if len(self.heap) == self.k:
+            self.threshold = self.heap[0][0]
+
+    def results(self):
+        return [(-negative_doc_id, score) for score, _, negative_doc_id in sorted(self.heap, reverse=True)]
+
+def cursor_doc(cursor):
+    return cursor.doc
+
+def wand(cursors, top_k, block_max):
+    while True:
+        cursors.sort(key=cursor_doc)
+
+        # the pivot is the first cursor at which the summed upper bounds could reach the threshold,
+        # no document before its doc id can make it into the top k
+        bound = 0.0
+        pivot = None
+        for index, cursor in enumerate(cursors):
+            if cursor.doc == END:
+                break
+            bound += cursor.upper_bound
+            if bound + EPSILON >= top_k.threshold:
+                pivot = index
+                break
+        if pivot is None:
+            return
+
+        pivot_doc = cursors[pivot].doc
+        while pivot + 1 < len(cursors) and cursors[pivot + 1].doc == pivot_doc:
+            pivot += 1
+
+        if block_max:
+            # the block maxes of the blocks holding the pivot doc give a tighter bound, if it fails
+            # every document up to the end of the shortest of those blocks can be skipped
+            block_bound = 0.0
+            next_doc = cursors[pivot + 1].doc if pivot + 1 < len(cursors) else END
+            for cursor in cursors[:pivot + 1]:
+                cursor_bound, last_doc_id = cursor.block_bound(pivot_doc)
+                block_bound += cursor_bound
+                if last_doc_id < next_doc:
+                    next_doc = last_doc_id + 1
+
+            if block_bound + EPSILON < top_k.threshold:
+                for cursor in cursors[:pivot + 1]:
+                    cursor.advance(next_doc)
+                continue
+
+        if cursors[0].doc == pivot_doc:
+            top_k.add(pivot_doc, [(cursor.entry_index, cursor.score()) for cursor in cursors[:pivot + 1]])
+            for cursor in cursors[:pivot + 1]:
+                cursor.next()
+        else:
+            for cursor in cursors:
+                if cursor.doc >= pivot_doc:
+                    break
+                cursor.advance(pivot_doc)
+
+def max_score(cursors, top_k):
+    # lists sorted by upper bound, the lowest ones whose bounds together cannot reach the
+    # threshold are non-essential and only looked up for documents the others produce
+    cursors = sorted(cursors, key=lambda cursor: (cursor.upper_bound, cursor.entry_index))
+    prefix_bounds = []
+    bound = 0.0
+    for cursor in cursors:
+        bound += cursor.upper_bound
+        prefix_bounds.append(bound)
+
+    while True:
+        first_essential = 0
+        while first_essential < len(cursors) and not top_k.can_enter(prefix_bounds[first_essential]):
+            first_essential += 1
+        if first_essential == len(cursors):
+            break
+
+        essential = cursors[first_essential:]
+        doc_id = min(cursor.doc for cursor in essential)
+        if doc_id == END:
+            break
+
+        contributions = []
+        bound = prefix_bounds[first_essential - 1] if first_essential > 0 else 0.0
+        for cursor in essential:
+            if cursor.doc == doc_id:
+                contribution = cursor.score()
+                contributions.append((cursor.entry_index, contribution))
+                bound += contribution
+                cursor.next()
+
+        for index in range(first_essential - 1, -1, -1):
+            if not top_k.can_enter(bound):
+                break
+            cursor = cursors[index]
+            cursor.advance(doc_id)
+            bound -= cursor.upper_bound
+            if cursor.doc == doc_id:
+                contribution = cursor.score()
+                contributions.append((cursor.entry_index, contribution))
+                bound += contribution
+
+        if top_k.can_enter(bound):
+            top_k.add(doc_id, contributions)
+
+def calculate_BM25_DAAT(inverted_index, lexicon, docnos, query_tokens, stem, doc_lengths, average_doc_length, block_index, k, strategy, stem_cache=None, term_statistics=None):
+    # document at a time BM25 with WAND, Block-Max WAND or MaxScore pruning, the top k is the
+    # same as calculate_BM25_algorithm's with the same scores and the same order of ties
+    N = len(docnos)
+    cursors = []
+    term_blocks = {}
+
+    for query_token in BM25.stem_query_tokens(query_tokens, stem, stem_cache):
+        if query_token not in lexicon:
+            continue
+
+        query_token_id = lexicon[query_token]
+        doc_postings = inverted_index[query_token_id]
+        idf = BM25.term_idf(N, len(doc_postings) // 2, term_statistics, query_token_id)
+
+        if query_token not in term_blocks:
+            term_blocks[query_token] = block_index.get_blocks(query_token)
+        cursors.append(TermCursor(len(cursors), doc_postings, term_blocks[query_token], idf, doc_lengths, average_doc_length))
+
+    top_k = TopK(k)
+    if strategy == 'maxscore':
+        max_score(cursors, top_k)
+    else:
+        wand(cursors, top_k, strategy == 'bmw')
+
+    return {docnos[doc_id]: score for doc_id, score in top_k.results()}
@@ -0,0 +1,85 @@
+import os
+import bisect
+from array import array
+import Postings
+import Segments
+from DocumentStore import map_file
+
+FORWARD_FILE_NAME = "/forward.bin"
+FORWARD_TABLE_FILE_NAME = "/forward-table.bin"
+
+class ForwardIndexWriter:
+    def __init__(self, storage_path):
+        # one term vector per document of the segment in internal id order, encoded like a
+        # postings list with term ids in place of doc ids, and the offset of each in the table
+        self.forward_file = open(storage_path + FORWARD_FILE_NAME, 'wb')
+        self.table_file_path = storage_path + FORWARD_TABLE_FILE_NAME
+        self.table = array('Q', [0])
+
+    def add(self, word_counts):
+        term_vector = []
+        for term_id in sorted(word_counts):
+            term_vector.extend((term_id, word_counts[term_id]))
+
+        blob = Postings.encode_postings(term_vector)
+        self.forward_file.write(blob)
+        self.table.append(self.table[-1] + len(blob))
+
+    def close(self):
+        self.forward_file.close()
+
+        with open(self.table_file_path, 'wb') as table_file:
+            self.table.tofile(table_file)
+
+def forward_index_exists(directory_path):
+    return all(os.path.exists(segment_path + FORWARD_FILE_NAME) for segment_path in Segments.get_segment_paths(directory_path))
+
+def read_forward_table(segment_path):
+    table = array('Q')
+    with open(segment_path + FORWARD_TABLE_FILE_NAME, 'rb') as table_file:
+        table.frombytes(table_file.read())
+
+    return table
+
+def merged_term_ids(term_sources, segments):
+    # segment term id -> merged term id for every segment
+    term_ids = [{} for _ in range(segments)]
+    for term_id, sources in enumerate(term_sources):
+        for segment_number, segment_term_id in sources:
+            term_ids[segment_number][segment_term_id] = term_id
+
+    return term_ids
+
+class ForwardIndex:
+    def __init__(self, directory_path, term_ids=None):
+        # the term_ids of IndexReader.merged_term_ids turn each segment's term ids into the
+        # merged ones the inverted index of a segmented index is read with
+        self.first_ids = [segment['first id'] for segment in Segments.read_segments(directory_path)['segments']]
+        self.segments = []
+
+        for segment_path in Segments.get_segment_paths(directory_path):
+            self.segments.append((
+                memoryview(map_file(segment_path + FORWARD_TABLE_FILE_NAME)).cast('Q'),
+                memoryview(map_file(segment_path + FORWARD_FILE_NAME))
+            ))
+
+        self.term_ids = term_ids
+
+    def term_vector(self, doc_id):
+        # [term id, count, term id, count, ...] of every term in the document
+        segment_number = bisect.bisect_right(self.first_ids, doc_id) - 1
+        table, data = self.segments[segment_number]
+        local_id = doc_id - self.first_ids[segment_number]
+        term_vector = Postings.decode_postings(data[table[local_id]:table[local_id + 1]])
+
+        if self.term_ids is not None:
+            term_ids = self.term_ids[segment_number]
+            for index in range(0, len(term_vector), 2):
+                term_vector[index] = term_ids[term_vector[index]]
+
+        return term_vector
+
+    def close(self):
+        for table, data in self.segments:
+            table.release()
+            data.release()
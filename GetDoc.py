@@ -1,11 +1,8 @@
 import sys
-import os
-import json
+import DocumentStore
+import DocumentMetadata
 
 def main():
-    document_file_path = ""
-    metadata_file_path = ""
-
     if len(sys.argv) != 4:
         print("Wrong number of inputs, please enter GetDoc followed by a path to the location of the documents and metadata store, the string 'id' or 'docno' and the internal integer id or the DOCNO!")
         print("For example, from the command prompt, this would look like the following if in the correct folder where the programs are stored:")
@@ -17,49 +14,36 @@ def main():
     string_reference = sys.argv[2]
     doc_no_or_id_classifier = sys.argv[3]
 
-    if string_reference == "docno":
-        yy = doc_no_or_id_classifier[6:8]
-        mm = doc_no_or_id_classifier[2:4]
-        dd = doc_no_or_id_classifier[4:6]
-        
-        document_file_path = file_path + f"/{yy}/{mm}/{dd}/{doc_no_or_id_classifier}.txt"
-        metadata_file_path = file_path + f"/{yy}/{mm}/{dd}/{doc_no_or_id_classifier}.json"
-    elif string_reference == "id":
-        docnos_document_path = file_path + "/docnos.txt"
-        if os.path.exists(docnos_document_path):
-            with open(docnos_document_path, 'r') as docnos_file:
-                docnos = [docno.strip() for docno in docnos_file]
-            try: 
-                docno = docnos[int(doc_no_or_id_classifier)]
-                yy = docno[6:8]
-                mm = docno[2:4]
-                dd = docno[4:6]
+    if not DocumentStore.document_store_exists(file_path):
+        print("Unable to find the document store in this directory. Try entering a new path!")
+        sys.exit()
 
-                document_file_path = file_path + f"/{yy}/{mm}/{dd}/{docno}.txt"
-                metadata_file_path = file_path + f"/{yy}/{mm}/{dd}/{docno}.json"
-            except IndexError:
-                print("The internal id integer provided does not exist. Try entering a new id!")
-                sys.exit()
+    if not DocumentMetadata.document_metadata_exists(file_path):
+        print("Unable to find the metadata files in this directory. Try entering a new path!")
+        sys.exit()
 
-            
-        else:
-            print("Unable to find docnos.txt and can't map internal integer id to docno!")
-            sys.exit()
+    document_store = DocumentStore.DocumentStore(file_path)
+    document_metadata = DocumentMetadata.DocumentMetadata(file_path)
 
-    if os.path.exists(document_file_path):
-        with open(document_file_path, 'r') as document_file:
-            document = document_file.read() 
+    if string_reference == "docno":
+        internal_id = document_store.get_internal_id(doc_no_or_id_classifier)
+        if internal_id is None:
+            print("Unable to find document file, this document number does not exist. Try entering a new docno!")
+            sys.exit()
+    elif string_reference == "id":
+        try: 
+            internal_id = int(doc_no_or_id_classifier)
+        except ValueError:
+            internal_id = -1
+        if not 0 <= internal_id < len(document_metadata):
+            print("The internal id integer provided does not exist. Try entering a new id!")
+            sys.exit()
     else:
-        print("Unable to find document file, this document number does not exist. Try entering a new docno!")
+        print("The second input must be the string 'id' or 'docno'!")
         sys.exit()
 
-    if os.path.exists(metadata_file_path): 
-        with open(metadata_file_path, 'r') as metadata_file:
-            metadata = json.load(metadata_file)
-    else:
-        print("Unable to find metadata file. Try entering a new docno!")
-        sys.exit()
-        
+    document = document_store.get_document(internal_id)
+    metadata = document_metadata.metadata(internal_id)
     doc_no = metadata['docno']
     internal_id = metadata['internal id']
     date = metadata['date']
@@ -68,4 +52,4 @@ def main():
     print(f"docno: {doc_no}\ninternal id: {internal_id}\ndate: {date}\nheadline: {headline}\nraw document:\n{document}")
 
 if __name__=="__main__":
-    main()
\ No newline at end of file
+    main()
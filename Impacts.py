@@ -0,0 +1,187 @@
+import sys
+import os
+import json
+import argparse
+from array import array
+import BM25
+import Segments
+import IndexReader
+import Manifest
+from DocumentStore import map_file
+
+IMPACTS_FILE_NAME = "/impacts.bin"
+IMPACTS_TABLE_FILE_NAME = "/impacts-table.bin"
+IMPACTS_SETTINGS_FILE_NAME = "/impacts.json"
+
+# every term id has one (offset, length) entry in the impacts table, counted in impacts
+TABLE_ENTRY_WIDTH = 2
+
+MIN_BITS = 8
+MAX_BITS = 16
+
+def impact_type(bits):
+    return 'b' if bits <= 8 else 'h'
+
+def term_scores(doc_postings, N, doc_lengths, average_doc_length, k_1, b):
+    # the same bm25 weight calculate_BM25_algorithm gives each posting of the term
+    idf = BM25.term_idf(N, len(doc_postings) // 2)
+    scores = []
+
+    for index in range(0, len(doc_postings), 2):
+        K = BM25.length_normalization(doc_lengths[doc_postings[index]] / average_doc_length, k_1, b)
+        scores.append(BM25.term_weight(doc_postings[index + 1], K, idf))
+
+    return scores
+
+def get_segment_names(directory_path):
+    return [segment['path'] for segment in Segments.read_segments(directory_path)['segments']]
+
+def count_term_ids(directory_path):
+    # the term ids of IndexReader's lexicon, the merged ids of a segmented index leave gaps
+    segment_lexicons = Segments.read_lexicons(directory_path)
+    term_ids = sum(len(segment_lexicon) for segment_lexicon in segment_lexicons)
+
+    for segment_lexicon in segment_lexicons:
+        segment_lexicon.close()
+
+    return term_ids
+
+def write_impacts(directory_path, k_1, b, bits):
+    # one signed integer per posting, scaled so the largest weight in the index uses every bit,
+    # the postings are decoded a term at a time, once for the scale and once for the impacts
+    index_reader = IndexReader.IndexReader(directory_path)
+    doc_lengths = index_reader.doc_lengths
+    N = index_reader.manifest['documents']
+    average_doc_length = index_reader.average_doc_length
+
+    max_score = 0.0
+    for _, doc_postings in index_reader.postings_lists():
+        for score in term_scores(doc_postings, N, doc_lengths, average_doc_length, k_1, b):
+            max_score = max(max_score, abs(score))
+
+    scale = ((1 << (bits - 1)) - 1) / max_score if max_score > 0 else 1.0
+    # the ids no term has keep an empty entry
+    table = array('Q', bytes(TABLE_ENTRY_WIDTH * len(index_reader.inverted_index) * 8))
+    offset = 0
+
+    # written under temporary names and renamed, the settings last, so readers never mix two builds
+    with open(directory_path + IMPACTS_FILE_NAME + ".tmp", 'wb') as impacts_file:
+        for term_id, doc_postings in index_reader.postings_lists():
+            impacts = array(impact_type(bits), [round(score * scale) for score in term_scores(doc_postings, N, doc_lengths, average_doc_length, k_1, b)])
+            impacts.tofile(impacts_file)
+            table[term_id * TABLE_ENTRY_WIDTH:(term_id + 1) * TABLE_ENTRY_WIDTH] = array('Q', (offset, len(impacts)))
+            offset += len(impacts)
+
+    term_ids = len(index_reader.inverted_index)
+    index_reader.close()
+
+    with open(directory_path + IMPACTS_TABLE_FILE_NAME + ".tmp", 'wb') as table_file:
+        table.tofile(table_file)
+
+    settings = {
+        'k1': k_1,
+        'b': b,
+        'bits': bits,
+        'scale': scale,
+        'documents': N,
+        'term ids': term_ids,
+        'segments': get_segment_names(directory_path)
+    }
+
+    with open(directory_path + IMPACTS_SETTINGS_FILE_NAME + ".tmp", 'w') as settings_file:
+        json.dump(settings, settings_file, indent=4)
+
+    for file_name in [IMPACTS_FILE_NAME, IMPACTS_TABLE_FILE_NAME, IMPACTS_SETTINGS_FILE_NAME]:
+        os.replace(directory_path + file_name + ".tmp", directory_path + file_name)
+
+def impacts_exist(directory_path):
+    return os.path.exists(directory_path + IMPACTS_SETTINGS_FILE_NAME)
+
+def read_impact_settings(directory_path):
+    with open(directory_path + IMPACTS_SETTINGS_FILE_NAME, 'r') as settings_file:
+        return json.load(settings_file)
+
+def refresh_impacts(directory_path):
+    # rebuild the impacts of an index whose documents or segments changed, with the same settings
+    if impacts_exist(directory_path):
+        settings = read_impact_settings(directory_path)
+        write_impacts(directory_path, settings['k1'], settings['b'], settings['bits'])
+
+def impacts_current(directory_path, k_1, b):
+    # impacts are only usable for the parameters and the exact index they were built from
+    if not impacts_exist(directory_path):
+        return False
+
+    settings = read_impact_settings(directory_path)
+    documents = Manifest.read_manifest(directory_path)['documents']
+
+    return (settings['k1'] == k_1 and settings['b'] == b and settings['documents'] == documents
+            and settings['segments'] == get_segment_names(directory_path)
+            and settings.get('term ids') == count_term_ids(directory_path))
+
+class ImpactIndex:
+    def __init__(self, directory_path):
+        settings = read_impact_settings(directory_path)
+        self.scale = settings['scale']
+        self.table = array('Q')
+
+        with open(directory_path + IMPACTS_TABLE_FILE_NAME, 'rb') as table_file:
+            self.table.frombytes(table_file.read())
+
+        self.impacts_map = map_file(directory_path + IMPACTS_FILE_NAME)
+        self.impacts = memoryview(self.impacts_map).cast(impact_type(settings['bits']))
+
+    def get_impacts(self, term_id):
+        # the impacts of the term, in the same order as its postings
+        offset = self.table[term_id * TABLE_ENTRY_WIDTH]
+        length = self.table[term_id * TABLE_ENTRY_WIDTH + 1]
+        return self.impacts[offset:offset + length]
+
+    def close(self):
+        self.impacts.release()
+        if hasattr(self.impacts_map, 'close'):
+            self.impacts_map.close()
+
+def calculate_impact_scores(impact_index, inverted_index, lexicon, docnos, query_tokens, stem, stem_cache=None, k=None):
+    # the quantized counterpart of calculate_BM25_algorithm, a document's score is a sum of integers
+    accumulators = {}
+
+    for query_token in BM25.stem_query_tokens(query_tokens, stem, stem_cache):
+        if query_token not in lexicon:
+            continue
+
+        query_token_id = lexicon[query_token]
+        doc_postings = inverted_index[query_token_id]
+
+        for doc_id, impact in zip(doc_postings[::2], impact_index.get_impacts(query_token_id)):
+            if doc_id in accumulators:
+                accumulators[doc_id] += impact
+            else:
+                accumulators[doc_id] = impact
+
+    scale = impact_index.scale
+    ranked_doc_ids = BM25.select_top_k(accumulators, k)
+
+    return {docnos[doc_id]: impact / scale for doc_id, impact in ranked_doc_ids}
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the quantized BM25 impacts of an index')
+    parser.add_argument('directory_path', help='Directory path of the index')
+    parser.add_argument('--bits', type=int, default=8, help='Bits per impact, from 8 to 16')
+    parser.add_argument('--k1', type=float, default=1.2, help='BM25 k1 the impacts are computed for')
+    parser.add_argument('--b', type=float, default=0.75, help='BM25 b the impacts are computed for')
+
+    cli = parser.parse_args()
+
+    if not os.path.exists(cli.directory_path):
+        print("This directory path does not exist! Please enter an existing directory path!")
+        sys.exit()
+
+    if not MIN_BITS <= cli.bits <= MAX_BITS:
+        print(f"The impacts must use between {MIN_BITS} and {MAX_BITS} bits!")
+        sys.exit()
+
+    write_impacts(cli.directory_path, cli.k1, cli.b, cli.bits)
+
+if __name__ == '__main__':
+    main()
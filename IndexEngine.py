@@ -1,127 +1,64 @@
 import sys
-import gzip
+import argparse
 import os
-import io
-import re
 from datetime import datetime
-import json
-from PorterStemmer import PorterStemmer
-
-DOC_OPENING_TAG = "<DOC>"
-DOC_NO_TAG = "<DOCNO>"
-HEADLINE_OPENING_TAG = "<HEADLINE>"
-HEADLINE_CLOSING_TAG = "</HEADLINE>"
-P_OPENING_TAG = "<P>"
-P_CLOSING_TAG = "</P>"
-DOC_CLOSING_TAG = "</DOC>"
-
-def save_document_and_metadata(storage_path, mmddyy, doc_no, document_metadata, raw_document):
-    file_path = create_directory(storage_path, mmddyy)
-    document_file_path = file_path + f"/{doc_no}.txt"
-    metadata_file_path = file_path + f"/{doc_no}.json"
-
-    with open(document_file_path, 'w') as document_file:
-        document_file.write(raw_document)
-
-    with open(metadata_file_path, 'w') as metadata_file:
-        json.dump(document_metadata, metadata_file, indent=4)
-
-def create_directory(storage_path, mmddyy):
-    month = mmddyy[:2]
-    day = mmddyy[2:4]
-    year = mmddyy[4:]
-
-    mmddyy_directory = f"/{year}/{month}/{day}"
-
-    file_path = storage_path + mmddyy_directory
-
-    if not os.path.exists(file_path):
-        os.makedirs(file_path)
-    
-    return file_path
-
-def format_date(doc_no):
+import multiprocessing
+from collections import deque
+import DocumentReader
+import Tokenizer
+import Stemmer
+import Postings
+import Positions
+import Lexicon
+import Impacts
+import Manifest
+import BlockMax
+import ForwardIndex
+import DocumentStore
+import DocumentMetadata
+import QueryBiasedSummary
+import Sentences
+import Segments
+import Shards
+
+RUNS_DIRECTORY = "/runs"
+
+# rough resident cost of one (doc_id, count) posting and of one postings list in the in-memory index
+POSTING_MEMORY_BYTES = 48
+TERM_MEMORY_BYTES = 120
+POSITION_MEMORY_BYTES = 2
+
+# documents handed to a worker process at a time when indexing with --workers
+DOCUMENTS_PER_BATCH = 256
+
+# surface form -> stem memo shared by every document this process tokenizes
+stem_cache = Stemmer.StemCache()
+
+def get_date(doc_no):
     doc_no_split = doc_no.split('-')
     mmddyy = doc_no_split[0][2:]
     date = datetime.strptime(mmddyy, '%m%d%y')
     date = date.replace(year = 1900 + date.year % 100)
-    formatted_date = date.strftime('%B %d, %Y')
-
-    return mmddyy, formatted_date
-
-def write_to_docnos(doc_no, storage_path):
-    docnos_file_path = storage_path + "/docnos.txt"
-
-    with open(docnos_file_path, 'a') as docnos_file:
-        docnos_file.write(doc_no + "\n")
 
-def create_metadata_dictionary(doc_no, internal_id, date, headline):
-    return {
-        'docno': doc_no,
-		'internal id': internal_id,
-        'date': date,
-        'headline': headline
-    }
+    return date
 
 def tokenize(text, tokens, stem):
-    text = text.lower() 
-    porterStemmer = PorterStemmer()
-    start = 0 
-    i = 0
-
-    for currChar in text:
-        if not currChar.isdigit() and not currChar.isalpha() :
-            if start != i :
-                token = text[start:i]
-                if stem:
-                    token = porterStemmer.stem(token, 0, len(token) - 1)
-                tokens.append(token)
-                
-            start = i + 1
-
-        i = i + 1
-
-    if start != i :
-        token = text[start:i]
-        if stem:
-            token = porterStemmer.stem(token, 0, len(token) - 1)
-        tokens.append(token)
+    if not stem:
+        tokens.extend(Tokenizer.tokenize(text))
+        return
+
+    tokens.extend(map(stem_cache.stem, Tokenizer.tokenize(text)))
 
 def tokenize_strings(strings, tokens, stem):
     for string in strings:
         tokenize(string, tokens, stem)
 
-def tokenize_relevant_text(raw_document, stem):
+def tokenize_relevant_text(relevant_text_strings, stem):
     tokens = []
-    relevant_text_strings = []
-
-    text_headline_graphic_regex = re.compile(
-        r'<TEXT>([\s\S]+?)<\/TEXT>|<HEADLINE>([\s\S]+?)<\/HEADLINE>|<GRAPHIC>([\s\S]+?)<\/GRAPHIC>'
-    )
-
-    matches = text_headline_graphic_regex.findall(raw_document)
-
-    for match in matches:
-        for group in match:
-            if group:
-                relevant_text = strip_all_tags(group.strip())
-                relevant_text_strings.append(relevant_text)
-
     tokenize_strings(relevant_text_strings, tokens, stem)
 
     return tokens
 
-def strip_all_tags(text):
-    strip_tags_regex = re.compile(r'<[^>]+>')
-    stripped_text = strip_tags_regex.sub('', text)
-    return stripped_text
-
-def write_to_doclengths(doc_length, storage_path):
-    doclengths_file_path = storage_path + "/doc-lengths.txt"
-
-    with open(doclengths_file_path, 'a') as doclengths_file:
-        doclengths_file.write(str(doc_length) + "\n")
-
 def convert_tokens_to_ids(tokens, lexicon):
     token_ids = []
     for token in tokens:
@@ -144,6 +81,16 @@ def count_words(token_ids):
     
     return word_counts
 
+def locate_words(token_ids):
+    term_positions = {}
+    for position, id in enumerate(token_ids):
+        if id in term_positions:
+            term_positions[id].append(position)
+        else:
+            term_positions[id] = [position]
+
+    return term_positions
+
 def add_to_postings(word_counts, doc_id, inv_index):
     for term_id in word_counts:
         count = word_counts[term_id]
@@ -154,106 +101,372 @@ def add_to_postings(word_counts, doc_id, inv_index):
         postings.append(count)
         inv_index[term_id] = postings
 
-def write_lexicon(lexicon, storage_path):
-    lexicon_file_path = storage_path + "/lexicon.json"
+def add_to_positions(term_positions, positions_index):
+    for term_id, positions in term_positions.items():
+        if term_id not in positions_index:
+            positions_index[term_id] = bytearray()
+        Positions.encode_positions(positions, positions_index[term_id])
 
-    with open(lexicon_file_path, 'w') as lexicon_file:
-        json.dump(lexicon, lexicon_file, indent=4)
+def estimate_postings_memory(inverted_index, postings_count, positions_count):
+    return postings_count * POSTING_MEMORY_BYTES + len(inverted_index) * TERM_MEMORY_BYTES + positions_count * POSITION_MEMORY_BYTES
 
-def write_inverted_index(inverted_index, storage_path):
-    inverted_index_file_path = storage_path + "/inverted-index.json"
+def get_positions_run_file_path(run_file_path):
+    return run_file_path[:-len(".bin")] + ".positions.bin"
 
-    with open(inverted_index_file_path, 'w') as inverted_index_file:
-        json.dump(inverted_index, inverted_index_file, indent=4)
+def write_run(inverted_index, storage_path, run_file_paths, positions_index=None):
+    runs_path = storage_path + RUNS_DIRECTORY
+
+    if not os.path.exists(runs_path):
+        os.makedirs(runs_path)
+
+    run_file_path = runs_path + f"/run-{len(run_file_paths)}.bin"
+    Postings.write_run(inverted_index, run_file_path)
+    if positions_index is not None:
+        Positions.write_run(positions_index, get_positions_run_file_path(run_file_path))
+    run_file_paths.append(run_file_path)
+
+def merge_runs(run_file_paths, storage_path, positional):
+    Postings.merge_runs(run_file_paths, storage_path)
+    if positional:
+        positions_run_file_paths = [get_positions_run_file_path(run_file_path) for run_file_path in run_file_paths]
+        Positions.merge_runs(positions_run_file_paths, storage_path)
+        run_file_paths = run_file_paths + positions_run_file_paths
+
+    for run_file_path in run_file_paths:
+        os.remove(run_file_path)
+    os.rmdir(storage_path + RUNS_DIRECTORY)
+
+def write_inverted_index(inverted_index, storage_path):
+    Postings.write_postings(inverted_index, storage_path)
+
+class IndexBuilder:
+    def __init__(self, storage_path, document_metadata, memory_budget, stems_writer, positional, forward_index=False):
+        self.storage_path = storage_path
+        self.document_metadata = document_metadata
+        self.memory_budget = memory_budget
+        self.stems_writer = stems_writer
+        self.positional = positional
+        self.lexicon = {}
+        self.inverted_index = {}
+        self.positions_index = {} if positional else None
+        self.postings_count = 0
+        self.positions_count = 0
+        self.run_file_paths = []
+        # documents arrive in internal id order, so their term vectors are written as they come
+        self.forward_index_writer = ForwardIndex.ForwardIndexWriter(storage_path) if forward_index else None
+
+    def add_document(self, doc_id, doc_length, word_counts, term_positions=None):
+        self.document_metadata.add_doc_length(doc_length)
+        if self.forward_index_writer is not None:
+            self.forward_index_writer.add(word_counts)
+        add_to_postings(word_counts, doc_id, self.inverted_index)
+        self.postings_count += len(word_counts)
+
+        if self.positional:
+            add_to_positions(term_positions, self.positions_index)
+            self.positions_count += doc_length
+
+        # spill the in-memory postings to a sorted run once they outgrow the memory budget
+        if self.memory_budget and estimate_postings_memory(self.inverted_index, self.postings_count, self.positions_count) >= self.memory_budget:
+            write_run(self.inverted_index, self.storage_path, self.run_file_paths, self.positions_index)
+            self.inverted_index = {}
+            self.positions_index = {} if self.positional else None
+            self.postings_count = 0
+            self.positions_count = 0
+
+    def builder_for(self, doc_no):
+        return self
+
+    def add_stems(self, new_stems):
+        if self.stems_writer is not None:
+            self.stems_writer.add(new_stems)
+
+    def add_batch(self, first_doc_id, local_terms, documents, doc_nos):
+        # local term ids are in order of first appearance within the batch, so assigning
+        # global ids in that order gives the same ids as a serial run
+        global_ids = convert_tokens_to_ids(local_terms, self.lexicon)
+
+        for offset, (doc_length, local_word_counts, local_term_positions) in enumerate(documents):
+            word_counts = {global_ids[local_id]: count for local_id, count in local_word_counts.items()}
+            term_positions = None
+            if local_term_positions is not None:
+                term_positions = {global_ids[local_id]: positions for local_id, positions in local_term_positions.items()}
+            self.add_document(first_doc_id + offset, doc_length, word_counts, term_positions)
+
+    def finish(self):
+        # write to lexicon file and inverted index file, merging the runs if any were spilled
+        if self.forward_index_writer is not None:
+            self.forward_index_writer.close()
+        Lexicon.write_lexicon(self.lexicon, self.storage_path)
+        if self.run_file_paths:
+            if self.inverted_index:
+                write_run(self.inverted_index, self.storage_path, self.run_file_paths, self.positions_index)
+            merge_runs(self.run_file_paths, self.storage_path, self.positional)
+        else:
+            write_inverted_index(self.inverted_index, self.storage_path)
+            if self.positional:
+                Positions.write_positions(self.positions_index, self.storage_path)
+
+class ShardedIndexBuilder:
+    def __init__(self, storage_path, document_metadata, memory_budget, stems_writer, positional, shards, partition):
+        # one builder per shard writes the lexicon and postings of the shard's documents, while
+        # the document store, metadata and stems stay whole in the storage directory, doc ids stay
+        # the collection's internal ids, and the memory budget is split between the shards
+        self.stems_writer = stems_writer
+        self.positional = positional
+        self.partition = partition
+        self.shard_paths = []
+        self.shard_builders = []
+
+        for shard_number in range(shards):
+            shard_path = Shards.get_shard_path(storage_path, shard_number)
+            os.makedirs(shard_path)
+            self.shard_paths.append(shard_path)
+            # a shard's doc ids are not a contiguous range, which the forward index relies on
+            self.shard_builders.append(IndexBuilder(shard_path, document_metadata, memory_budget / shards if memory_budget else None, None, positional))
+
+    def builder_for(self, doc_no):
+        if self.partition == 'date':
+            return self.shard_builders[Shards.date_partition(get_date(doc_no), len(self.shard_builders))]
+
+        return self.shard_builders[Shards.hash_partition(doc_no, len(self.shard_builders))]
+
+    def add_stems(self, new_stems):
+        if self.stems_writer is not None:
+            self.stems_writer.add(new_stems)
+
+    def add_batch(self, first_doc_id, local_terms, documents, doc_nos):
+        # a batch's documents go to different shards, so each document's terms get their shard's
+        # ids in the order the document first uses them, which is the order a serial run gives
+        for offset, (doc_no, (doc_length, local_word_counts, local_term_positions)) in enumerate(zip(doc_nos, documents)):
+            shard_builder = self.builder_for(doc_no)
+            term_ids = dict(zip(local_word_counts, convert_tokens_to_ids([local_terms[local_id] for local_id in local_word_counts], shard_builder.lexicon)))
+            word_counts = {term_ids[local_id]: count for local_id, count in local_word_counts.items()}
+            term_positions = None
+            if local_term_positions is not None:
+                term_positions = {term_ids[local_id]: positions for local_id, positions in local_term_positions.items()}
+            shard_builder.add_document(first_doc_id + offset, doc_length, word_counts, term_positions)
+
+    def finish(self):
+        for shard_builder in self.shard_builders:
+            shard_builder.finish()
+
+def store_document(document_store, document_metadata, internal_id, document):
+    # save document
+    document_store.add(internal_id, document.doc_no, document.raw_document)
+
+    # add the docno, date and headline to the metadata columns
+    document_metadata.add_document(document.doc_no, get_date(document.doc_no).toordinal(), document.headline)
+
+def process_document(relevant_text_strings, stem, lexicon, positional):
+    # break text, headline and graphic text into tokens
+    tokens = tokenize_relevant_text(relevant_text_strings, stem)
+
+    # get word counts of the terms, and where they occur if positions are kept
+    token_ids = convert_tokens_to_ids(tokens, lexicon)
+    term_positions = None
+    if positional:
+        term_positions = locate_words(token_ids)
+        word_counts = {term_id: len(positions) for term_id, positions in term_positions.items()}
+    else:
+        word_counts = count_words(token_ids)
+
+    return len(tokens), word_counts, term_positions
+
+def split_sentences(raw_document):
+    # the summary sentences of the document's text as Query.py reads it back from the store
+    text_content = QueryBiasedSummary.text_content(bytes(raw_document).decode('utf-8'))
+    if text_content is None:
+        return []
+
+    return QueryBiasedSummary.document_sentences(text_content)
+
+def process_batch(batch_text_spans, stem, positional, batch_raw_documents=None):
+    local_lexicon = {}
+    documents = [process_document(DocumentReader.relevant_text_strings(text_spans), stem, local_lexicon, positional) for text_spans in batch_text_spans]
+    sentences = None
+    if batch_raw_documents is not None:
+        sentences = [split_sentences(raw_document) for raw_document in batch_raw_documents]
+
+    return list(local_lexicon), documents, stem_cache.take_new_stems(), sentences
+
+def index_serially(documents, document_store, document_metadata, stem, index_builder, first_internal_id, sentence_writer=None):
+    for internal_id, document in enumerate(documents, first_internal_id):
+        store_document(document_store, document_metadata, internal_id, document)
+        if sentence_writer is not None:
+            sentence_writer.add(internal_id, split_sentences(document.raw_document))
+        builder = index_builder.builder_for(document.doc_no)
+        doc_length, word_counts, term_positions = process_document(document.relevant_text_strings(), stem, builder.lexicon, index_builder.positional)
+        builder.add_document(internal_id, doc_length, word_counts, term_positions)
+        index_builder.add_stems(stem_cache.take_new_stems())
+
+def index_in_parallel(documents, document_store, document_metadata, stem, index_builder, workers, first_internal_id, sentence_writer=None):
+    pending_batches = deque()
+    internal_id = first_internal_id
+
+    def collect_batch():
+        first_doc_id, doc_nos, result = pending_batches.popleft()
+        local_terms, processed_documents, new_stems, sentences = result.get()
+        index_builder.add_batch(first_doc_id, local_terms, processed_documents, doc_nos)
+        index_builder.add_stems(new_stems)
+        if sentence_writer is not None:
+            for doc_id, document_sentences in enumerate(sentences, first_doc_id):
+                sentence_writer.add(doc_id, document_sentences)
+
+    with multiprocessing.Pool(workers) as pool:
+        batch_text_spans = []
+        batch_doc_nos = []
+        # the workers split the sentences too, from the raw documents
+        batch_raw_documents = [] if sentence_writer is not None else None
+        first_doc_id = first_internal_id
+
+        for document in documents:
+            store_document(document_store, document_metadata, internal_id, document)
+            batch_text_spans.append([bytes(span) for span in document.text_spans])
+            batch_doc_nos.append(document.doc_no)
+            if batch_raw_documents is not None:
+                batch_raw_documents.append(bytes(document.raw_document))
+            internal_id += 1
+
+            if len(batch_text_spans) == DOCUMENTS_PER_BATCH:
+                pending_batches.append((first_doc_id, batch_doc_nos, pool.apply_async(process_batch, (batch_text_spans, stem, index_builder.positional, batch_raw_documents))))
+                batch_text_spans = []
+                batch_doc_nos = []
+                batch_raw_documents = [] if sentence_writer is not None else None
+                first_doc_id = internal_id
+
+            # only keep a couple of batches per worker in flight so memory stays bounded
+            if len(pending_batches) >= workers * 2:
+                collect_batch()
+
+        if batch_text_spans:
+            pending_batches.append((first_doc_id, batch_doc_nos, pool.apply_async(process_batch, (batch_text_spans, stem, index_builder.positional, batch_raw_documents))))
+
+        while pending_batches:
+            collect_batch()
 
 def main():
-    
-    # initialize variables
-    doc_no_array = []
-    internal_id = 0
-    is_headline = False
-    headline = ""
-    mmddyy = ""
-    formatted_date = ""
-    doc_no = ""
-    lexicon = {}
-    inverted_index = {}
-
-    if len(sys.argv) != 4:
-        print("Wrong number of inputs, please enter IndexEngine followed by a file path to the latimes.gz file, a file path to the storage folder, and a boolean true or false if stemming is wanted.")
-        print("For example, from the command prompt, this would look like the following if in the correct folder: python IndexEngine.py /searchengines/MiniCollection.gz /searchengines/mini-collection-index true")
-        sys.exit()
-    
-    gzip_path = sys.argv[1]
-    storage_path = sys.argv[2]
-    stem = sys.argv[3]
+    parser = argparse.ArgumentParser(description='Index the latimes.gz collection. For example: python IndexEngine.py /searchengines/MiniCollection.gz /searchengines/mini-collection-index true')
+    parser.add_argument('gzip_path', help='File path to the latimes.gz file')
+    parser.add_argument('storage_path', help='File path to the storage folder, which must not exist yet unless appending')
+    parser.add_argument('stem', help='Boolean true or false for whether to stem the words')
+    parser.add_argument('--memory_budget', type=float, help='Megabytes of postings to hold in memory before writing a sorted run to disk')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes used to tokenize, stem and count the documents')
+    parser.add_argument('--compress', action='store_true', help='Compress the document store in zlib blocks')
+    parser.add_argument('--append', action='store_true', help='Add the documents to an existing index as a new segment')
+    parser.add_argument('--positions', action='store_true', help='Also write a positional index for phrase and proximity queries')
+    parser.add_argument('--impacts', type=int, help='Also store BM25 scores quantized to this many bits (8 to 16) for the --k1 and --b parameters')
+    parser.add_argument('--k1', type=float, default=1.2, help='BM25 k1 used for the --impacts scores')
+    parser.add_argument('--b', type=float, default=0.75, help='BM25 b used for the --impacts scores')
+    parser.add_argument('--sentences', action='store_true', help='Also store the sentences and their token ids, so Query.py summarizes results without tokenizing them')
+    parser.add_argument('--forward_index', action='store_true', help='Also store the terms of every document, which BM25.py --rm3 expands queries from')
+    parser.add_argument('--shards', type=int, help='Split the documents into this many shards, each with its own lexicon and postings, for ShardCoordinator.py')
+    parser.add_argument('--partition', choices=Shards.PARTITIONS, default='hash', help='Assign documents to shards by a hash of the docno or by the month of their date')
+
+    cli = parser.parse_args()
+    gzip_path = cli.gzip_path
+    storage_path = cli.storage_path
+    stem = cli.stem
+    memory_budget = cli.memory_budget * 1024 * 1024 if cli.memory_budget else None
 
     if not os.path.exists(gzip_path):
         print("This data path does not exist! Please enter a valid path to the latimes file!")
         sys.exit()
-    if os.path.exists(storage_path):
-        print("This storage directory already exists! Either change the storage path to one that doesn't exist or delete the existing directory for the path you listed and rerun the program!")
+    if cli.impacts is not None and not Impacts.MIN_BITS <= cli.impacts <= Impacts.MAX_BITS:
+        print(f"The impacts must use between {Impacts.MIN_BITS} and {Impacts.MAX_BITS} bits!")
+        sys.exit()
+    if cli.shards is not None and cli.shards < 1:
+        print("--shards must be greater than 0!")
+        sys.exit()
+    if cli.shards is not None and (cli.append or cli.impacts is not None):
+        print("A sharded index is built in one go and scores exactly! Please leave out --append and --impacts!")
+        sys.exit()
+    if cli.shards is not None and cli.forward_index:
+        print("A shard's doc ids are not a contiguous range, which the forward index relies on! Please leave out --forward_index!")
+        sys.exit()
+    if cli.append:
+        if not DocumentMetadata.document_metadata_exists(storage_path):
+            print("This storage directory does not hold an index to append to! Please enter the path of an existing index!")
+            sys.exit()
+        # every segment is looked up with the same query terms, so they must all be stemmed or none
+        index_stem = Manifest.read_manifest(storage_path)['stem']
+        if index_stem != (stem.lower() == "true"):
+            print(f"The index was built with stem {str(index_stem).lower()}, so the new documents must be too! Please append with stem {str(index_stem).lower()}!")
+            sys.exit()
+        if cli.sentences and not Sentences.sentences_exist(storage_path):
+            print("The index was built without --sentences, so the new documents cannot have them! Please rebuild the index with --sentences!")
+            sys.exit()
+        if cli.forward_index and not ForwardIndex.forward_index_exists(storage_path):
+            print("The index was built without --forward_index, so the new documents cannot have one! Please rebuild the index with --forward_index!")
+            sys.exit()
+        if cli.positions and not Positions.positions_exist(storage_path):
+            print("The index was built without --positions, so the new documents cannot have them! Please rebuild the index with --positions!")
+            sys.exit()
+        # new documents continue the internal ids and get their own lexicon and postings
+        first_internal_id = len(DocumentMetadata.DocumentMetadata(storage_path))
+        index_path = Segments.new_segment_path(storage_path)
+    elif os.path.exists(storage_path):
+        print("This storage directory already exists! Either change the storage path to one that doesn't exist, delete the existing directory for the path you listed and rerun the program or pass --append to add to it!")
         sys.exit()
     else:
         os.makedirs(storage_path)
         print(f"The directory {storage_path} has been created")
+        first_internal_id = 0
+        index_path = storage_path
 
     stem = stem.lower() == "true"
+    document_store = DocumentStore.DocumentStoreWriter(storage_path, cli.compress, cli.append)
+    # the sentences cover every document or none, so appends keep them if the index has them
+    write_sentences = Sentences.sentences_exist(storage_path) if cli.append else cli.sentences
+    sentence_writer = Sentences.SentenceWriter(storage_path, cli.append) if write_sentences else None
+    # so does the forward index, whose segments are only merged when they all have one
+    write_forward_index = ForwardIndex.forward_index_exists(storage_path) if cli.append else cli.forward_index
+    # and the positions, which phrase matching and --proximity need in every segment
+    write_positions = Positions.positions_exist(storage_path) if cli.append else cli.positions
+    document_metadata = DocumentMetadata.DocumentMetadataWriter(storage_path, cli.append)
+    # the surface form -> stem table is shared by every segment, so appends add to it
+    stems_writer = Stemmer.StemsWriter(storage_path, cli.append) if stem else None
+    if cli.shards is not None:
+        index_builder = ShardedIndexBuilder(storage_path, document_metadata, memory_budget, stems_writer, cli.positions, cli.shards, cli.partition)
+    else:
+        index_builder = IndexBuilder(index_path, document_metadata, memory_budget, stems_writer, write_positions, write_forward_index)
 
-    with gzip.open(gzip_path, 'rt') as gzip_file:
-        string_buffer = io.StringIO()
-
-        for line in gzip_file:
-            string_buffer.write(line)
-
-            if HEADLINE_OPENING_TAG in line:
-                is_headline = True
-            if is_headline == True and P_OPENING_TAG not in line and P_CLOSING_TAG not in line:
-                headline += line.strip() + " "
-            if HEADLINE_CLOSING_TAG in line:
-                is_headline = False
-
-            if DOC_NO_TAG in line:
-                doc_no = re.search(r'LA\d{6}-\d{4}', line).group()
-                doc_no_array.append(doc_no)
-                mmddyy, formatted_date = format_date(doc_no)
-
-            if DOC_CLOSING_TAG in line:
-                raw_document = string_buffer.getvalue()
-
-                # strip headline of headline tags
-                headline = re.sub(r'<\/?HEADLINE>', '', headline).strip()
-
-                # create metadata dictionary
-                document_metadata = create_metadata_dictionary(doc_no, internal_id, formatted_date, headline)
-                
-                # save document
-                save_document_and_metadata(storage_path, mmddyy, doc_no, document_metadata, raw_document)
-
-                # break text, headline and graphic text into tokens
-                tokens = tokenize_relevant_text(raw_document, stem)
+    documents = DocumentReader.read_documents(gzip_path)
 
-                # get doc_length and write to doc_lengths file
-                doc_length = len(tokens)
-                write_to_doclengths(doc_length, storage_path)
+    if cli.workers > 1:
+        index_in_parallel(documents, document_store, document_metadata, stem, index_builder, cli.workers, first_internal_id, sentence_writer)
+    else:
+        index_serially(documents, document_store, document_metadata, stem, index_builder, first_internal_id, sentence_writer)
+
+    document_store.close()
+    if sentence_writer is not None:
+        sentence_writer.close()
+    document_metadata.close()
+    index_builder.finish()
+    doc_lengths = DocumentMetadata.DocumentMetadata(storage_path).doc_lengths
+    if cli.shards is not None:
+        for shard_path in index_builder.shard_paths:
+            BlockMax.write_blocks(shard_path, doc_lengths)
+        Shards.write_global_term_statistics(storage_path, index_builder.shard_paths)
+        Shards.write_shards(storage_path, cli.partition, cli.shards)
+    else:
+        BlockMax.write_blocks(index_path, doc_lengths)
+    if stems_writer is not None:
+        stems_writer.close()
 
-                # write to internal docnos
-                write_to_docnos(doc_no, storage_path)
+    if cli.append:
+        Segments.add_segment(storage_path, index_path, first_internal_id, len(document_metadata.doc_lengths))
 
-                # get word counts of the terms and append to the postings
-                token_ids = convert_tokens_to_ids(tokens, lexicon)
-                word_counts = count_words(token_ids)
-                add_to_postings(word_counts, internal_id, inverted_index)
+    Manifest.write_manifest(storage_path, stem)
 
-                string_buffer.seek(0)
-                string_buffer.truncate()
-                headline = ""
-                internal_id += 1
+    # impacts depend on the whole collection, so an append rebuilds any the index already has
+    if cli.impacts is not None:
+        Impacts.write_impacts(storage_path, cli.k1, cli.b, cli.impacts)
+    elif cli.append:
+        Impacts.refresh_impacts(storage_path)
 
-        # write to lexicon file and inverted index file
-        write_lexicon(lexicon, storage_path)
-        write_inverted_index(inverted_index, storage_path)
-        string_buffer.close()
+    if cli.append:
+        Segments.start_background_merge(storage_path)
     
 if __name__=="__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,215 @@
+import sys
+import heapq
+import itertools
+import Postings
+import Segments
+import DocumentMetadata
+import Manifest
+import ResultCache
+from DocumentStore import map_file
+
+# decoded postings lists kept for terms that are queried again, least recently used dropped first
+POSTINGS_CACHE_SIZE = 4096
+
+class SegmentPostings:
+    def __init__(self, segment_path):
+        # the postings table and the postings are mapped, a term's postings are only read and
+        # decoded when a query asks for them
+        self.table_map = map_file(segment_path + Postings.POSTINGS_TABLE_FILE_NAME)
+        self.table = memoryview(self.table_map).cast('Q')
+        self.postings_map = map_file(segment_path + Postings.POSTINGS_FILE_NAME)
+        self.postings = memoryview(self.postings_map)
+
+    def __len__(self):
+        return len(self.table) // Postings.TABLE_ENTRY_WIDTH
+
+    def term_range(self, term_id):
+        # byte offset and length of the term's postings
+        return self.table[term_id * Postings.TABLE_ENTRY_WIDTH], self.table[term_id * Postings.TABLE_ENTRY_WIDTH + 1]
+
+    def __getitem__(self, term_id):
+        offset, length = self.term_range(term_id)
+        return Postings.decode_postings(self.postings[offset:offset + length])
+
+    def close(self):
+        self.table.release()
+        self.postings.release()
+
+def tagged_terms(segment_number, segment_lexicon):
+    for term, segment_term_id in segment_lexicon.scan():
+        yield term, segment_number, segment_term_id
+
+class MergedLexicon:
+    def __init__(self, segment_lexicons):
+        # a term's merged id is its id in the first segment that has it after the ids of the
+        # segments before, so a lookup reads a block of each segment and no merged lexicon is
+        # built, the ids of the terms later segments repeat are left unused
+        self.segment_lexicons = segment_lexicons
+        self.first_ids = [0]
+        for segment_lexicon in segment_lexicons:
+            self.first_ids.append(self.first_ids[-1] + len(segment_lexicon))
+
+        # the (segment number, segment term id) pairs of every merged id handed out so far
+        self.term_sources = {}
+
+    def id_count(self):
+        return self.first_ids[-1]
+
+    def get(self, term, default=None):
+        sources = []
+        for segment_number, segment_lexicon in enumerate(self.segment_lexicons):
+            segment_term_id = segment_lexicon.get(term)
+            if segment_term_id is not None:
+                sources.append((segment_number, segment_term_id))
+
+        if not sources:
+            return default
+
+        segment_number, segment_term_id = sources[0]
+        term_id = self.first_ids[segment_number] + segment_term_id
+        self.term_sources[term_id] = sources
+        return term_id
+
+    def __getitem__(self, term):
+        term_id = self.get(term)
+        if term_id is None:
+            raise KeyError(term)
+        return term_id
+
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+    def merged_items(self):
+        # (term, merged id, sources) of every term in sorted utf-8 byte order, merged from the
+        # segment lexicons, which are sorted the same way, without looking any term up
+        streams = [tagged_terms(segment_number, segment_lexicon) for segment_number, segment_lexicon in enumerate(self.segment_lexicons)]
+
+        for term, entries in itertools.groupby(heapq.merge(*streams), key=lambda entry: entry[0]):
+            sources = [(segment_number, segment_term_id) for _, segment_number, segment_term_id in entries]
+            segment_number, segment_term_id = sources[0]
+            yield term.decode('utf-8'), self.first_ids[segment_number] + segment_term_id, sources
+
+    def segment_term_ids(self):
+        # segment term id -> merged term id for every segment, which hands out every merged id
+        term_ids = [{} for _ in self.segment_lexicons]
+        for _, term_id, sources in self.merged_items():
+            self.term_sources[term_id] = sources
+            for segment_number, segment_term_id in sources:
+                term_ids[segment_number][segment_term_id] = term_id
+
+        return term_ids
+
+class MergedTermStatistics:
+    def __init__(self, term_sources, segment_statistics):
+        # df and cf of a merged term summed over its segments when asked for
+        self.term_sources = term_sources
+        self.segment_statistics = segment_statistics
+
+    def document_frequency(self, term_id):
+        return sum(self.segment_statistics[segment_number].document_frequency(segment_term_id) for segment_number, segment_term_id in self.term_sources[term_id])
+
+    def collection_frequency(self, term_id):
+        return sum(self.segment_statistics[segment_number].collection_frequency(segment_term_id) for segment_number, segment_term_id in self.term_sources[term_id])
+
+class LazyInvertedIndex:
+    def __init__(self, segment_postings, merged_lexicon=None):
+        # term ids are the segment's own for a single segment and the ids of the merged lexicon
+        # otherwise, whose postings are the segments' lists one after another
+        self.segment_postings = segment_postings
+        self.term_sources = merged_lexicon.term_sources if merged_lexicon is not None else None
+        self.id_count = merged_lexicon.id_count() if merged_lexicon is not None else len(segment_postings[0])
+        self.cache = ResultCache.ResultCache(POSTINGS_CACHE_SIZE)
+
+    def __len__(self):
+        return self.id_count
+
+    def merged_postings(self, sources):
+        postings = []
+        for segment_number, segment_term_id in sources:
+            postings.extend(self.segment_postings[segment_number][segment_term_id])
+
+        return postings
+
+    def __getitem__(self, term_id):
+        if not 0 <= term_id < len(self):
+            raise KeyError(term_id)
+
+        postings = self.cache.get(term_id)
+        if postings is not None:
+            return postings
+
+        if self.term_sources is None:
+            postings = self.segment_postings[0][term_id]
+        else:
+            postings = self.merged_postings(self.term_sources[term_id])
+
+        self.cache.put(term_id, postings)
+        return postings
+
+class IndexReader:
+    def __init__(self, directory_path, index_path=None):
+        # everything is mapped or read on demand, the lexicons of a segmented index are merged
+        # term by term as they are looked up, a shard's lexicon and postings are in index_path
+        # and the collection's documents in directory_path
+        segment_paths = Segments.get_segment_paths(index_path or directory_path)
+        self.segment_postings = [SegmentPostings(segment_path) for segment_path in segment_paths]
+        self.segment_lexicons = [Segments.read_lexicon(segment_path) for segment_path in segment_paths]
+
+        if len(segment_paths) == 1:
+            self.lexicon = self.segment_lexicons[0]
+            self.inverted_index = LazyInvertedIndex(self.segment_postings)
+            self.term_statistics = Postings.read_term_statistics(segment_paths[0])
+        else:
+            self.lexicon = MergedLexicon(self.segment_lexicons)
+            self.inverted_index = LazyInvertedIndex(self.segment_postings, self.lexicon)
+            self.term_statistics = MergedTermStatistics(self.lexicon.term_sources, [Postings.read_term_statistics(segment_path) for segment_path in segment_paths])
+
+        self.document_metadata = DocumentMetadata.DocumentMetadata(directory_path)
+        self.docnos = self.document_metadata.docnos
+        self.doc_lengths = self.document_metadata.doc_lengths
+        self.manifest = Manifest.read_manifest(directory_path)
+        self.average_doc_length = self.manifest['average doc length']
+
+    def merged_term_ids(self):
+        # what ForwardIndex needs to turn segment term ids into the ones of the inverted index,
+        # None for a single segment, whose ids are the same
+        if len(self.segment_lexicons) == 1:
+            return None
+
+        return self.lexicon.segment_term_ids()
+
+    def postings_lists(self):
+        # (term id, postings) of every term, read one at a time and not cached
+        if len(self.segment_lexicons) == 1:
+            for term_id in range(len(self.inverted_index)):
+                yield term_id, self.segment_postings[0][term_id]
+        else:
+            for _, term_id, sources in self.lexicon.merged_items():
+                yield term_id, self.inverted_index.merged_postings(sources)
+
+    def close(self):
+        for segment_postings in self.segment_postings:
+            segment_postings.close()
+        for segment_lexicon in self.segment_lexicons:
+            segment_lexicon.close()
+
+def open_index(directory_path, index_path=None):
+    # the checks every program reading an index makes before its first query
+    if not Postings.postings_exist(Segments.get_segment_paths(index_path or directory_path)[0]):
+        print("Unable to find the inverted index file!")
+        sys.exit()
+
+    if not DocumentMetadata.document_metadata_exists(directory_path):
+        print("Unable to find the document metadata files!")
+        sys.exit()
+
+    if not Manifest.manifest_exists(directory_path):
+        print("Unable to find the index manifest! Please rebuild the index!")
+        sys.exit()
+
+    manifest = Manifest.read_manifest(directory_path)
+    if manifest['format version'] != Manifest.FORMAT_VERSION:
+        print(f"The index has format version {manifest['format version']} but version {Manifest.FORMAT_VERSION} is needed! Please rebuild the index!")
+        sys.exit()
+
+    return IndexReader(directory_path, index_path)
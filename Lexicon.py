@@ -0,0 +1,167 @@
+import os
+import re
+import bisect
+from array import array
+import Postings
+from DocumentStore import map_file
+
+LEXICON_FILE_NAME = "/lexicon.bin"
+LEXICON_BLOCKS_FILE_NAME = "/lexicon-blocks.bin"
+
+# terms per front coded block, a lookup decodes at most one block
+BLOCK_SIZE = 16
+
+WILDCARD = "*"
+
+def read_vbyte(data, position):
+    # one vbyte number starting at position, and the position after it
+    number = 0
+    shift = 0
+
+    while True:
+        byte = data[position]
+        position += 1
+        number |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return number, position
+        shift += 7
+
+def write_lexicon(lexicon, storage_path):
+    # terms sorted by their utf-8 bytes, each entry is (shared prefix length, suffix length,
+    # suffix, term id) and the first term of a block is stored in full
+    terms = sorted((term.encode('utf-8'), term_id) for term, term_id in lexicon.items())
+    buffer = bytearray()
+    blocks = array('Q', [len(terms)])
+    previous_term = b""
+
+    for index, (term, term_id) in enumerate(terms):
+        if index % BLOCK_SIZE == 0:
+            blocks.append(len(buffer))
+            previous_term = b""
+
+        shared = 0
+        limit = min(len(term), len(previous_term))
+        while shared < limit and term[shared] == previous_term[shared]:
+            shared += 1
+
+        Postings.encode_vbyte(shared, buffer)
+        Postings.encode_vbyte(len(term) - shared, buffer)
+        buffer += term[shared:]
+        Postings.encode_vbyte(term_id, buffer)
+        previous_term = term
+
+    blocks.append(len(buffer))
+
+    with open(storage_path + LEXICON_FILE_NAME, 'wb') as lexicon_file:
+        lexicon_file.write(buffer)
+
+    with open(storage_path + LEXICON_BLOCKS_FILE_NAME, 'wb') as blocks_file:
+        blocks.tofile(blocks_file)
+
+def lexicon_exists(directory_path):
+    return os.path.exists(directory_path + LEXICON_FILE_NAME)
+
+def wildcard_regex(pattern):
+    return re.compile(".*".join(re.escape(part) for part in pattern.split(WILDCARD)))
+
+class Lexicon:
+    def __init__(self, directory_path):
+        # the term blocks stay on disk, only the first term of every block is kept in memory
+        self.lexicon_map = map_file(directory_path + LEXICON_FILE_NAME)
+        blocks = array('Q')
+
+        with open(directory_path + LEXICON_BLOCKS_FILE_NAME, 'rb') as blocks_file:
+            blocks.frombytes(blocks_file.read())
+
+        self.term_count = blocks[0]
+        self.block_offsets = blocks[1:]
+        self.block_terms = [self.first_term(offset) for offset in self.block_offsets[:-1]]
+
+    def first_term(self, offset):
+        _, position = read_vbyte(self.lexicon_map, offset)
+        length, position = read_vbyte(self.lexicon_map, position)
+        return bytes(self.lexicon_map[position:position + length])
+
+    def read_block(self, block):
+        # (term bytes, term id) of every term in the block, in sorted order
+        entries = []
+        data = self.lexicon_map
+        position = self.block_offsets[block]
+        end = self.block_offsets[block + 1]
+        term = b""
+
+        while position < end:
+            shared, position = read_vbyte(data, position)
+            length, position = read_vbyte(data, position)
+            term = term[:shared] + data[position:position + length]
+            position += length
+            term_id, position = read_vbyte(data, position)
+            entries.append((term, term_id))
+
+        return entries
+
+    def find_block(self, key):
+        return bisect.bisect_right(self.block_terms, key) - 1
+
+    def get(self, term, default=None):
+        key = term.encode('utf-8')
+        block = self.find_block(key)
+
+        if block < 0:
+            return default
+
+        for block_term, term_id in self.read_block(block):
+            if block_term == key:
+                return term_id
+            if block_term > key:
+                break
+
+        return default
+
+    def __getitem__(self, term):
+        term_id = self.get(term)
+        if term_id is None:
+            raise KeyError(term)
+        return term_id
+
+    def __contains__(self, term):
+        return self.get(term) is not None
+
+    def __len__(self):
+        return self.term_count
+
+    def scan(self, key=b""):
+        # (term bytes, term id) in sorted order starting at the first term >= key
+        for block in range(max(self.find_block(key), 0), len(self.block_terms)):
+            for block_term, term_id in self.read_block(block):
+                if block_term >= key:
+                    yield block_term, term_id
+
+    def items(self):
+        for term, term_id in self.scan():
+            yield term.decode('utf-8'), term_id
+
+    def __iter__(self):
+        for term, _ in self.items():
+            yield term
+
+    def prefix_items(self, prefix):
+        # the terms starting with prefix are one contiguous range of the sorted lexicon
+        key = prefix.encode('utf-8')
+
+        for term, term_id in self.scan(key):
+            if not term.startswith(key):
+                return
+            yield term.decode('utf-8'), term_id
+
+    def wildcard_items(self, pattern):
+        # only the part before the first wildcard narrows the scan, the rest is matched per term
+        regex = wildcard_regex(pattern)
+
+        for term, term_id in self.prefix_items(pattern.split(WILDCARD)[0]):
+            if regex.fullmatch(term):
+                yield term, term_id
+
+    def close(self):
+        if hasattr(self.lexicon_map, 'close'):
+            self.lexicon_map.close()
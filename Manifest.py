@@ -0,0 +1,37 @@
+import os
+import json
+import Positions
+import DocumentMetadata
+
+MANIFEST_FILE_NAME = "/manifest.json"
+
+# bumped whenever a file of the index changes its layout
+FORMAT_VERSION = 1
+
+def write_manifest(directory_path, stem):
+    # collection statistics the scorers would otherwise recompute from every document length
+    doc_lengths = DocumentMetadata.DocumentMetadata(directory_path).doc_lengths
+    documents = len(doc_lengths)
+    total_doc_length = sum(doc_lengths)
+
+    manifest = {
+        'format version': FORMAT_VERSION,
+        'postings': 'vbyte doc id gaps and counts',
+        'lexicon': 'front coded sorted terms',
+        'stem': stem,
+        'positions': Positions.positions_exist(directory_path),
+        'documents': documents,
+        'total doc length': total_doc_length,
+        'average doc length': total_doc_length / documents if documents > 0 else 0
+    }
+
+    with open(directory_path + MANIFEST_FILE_NAME + ".tmp", 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=4)
+    os.replace(directory_path + MANIFEST_FILE_NAME + ".tmp", directory_path + MANIFEST_FILE_NAME)
+
+def manifest_exists(directory_path):
+    return os.path.exists(directory_path + MANIFEST_FILE_NAME)
+
+def read_manifest(directory_path):
+    with open(directory_path + MANIFEST_FILE_NAME, 'r') as manifest_file:
+        return json.load(manifest_file)
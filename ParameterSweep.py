@@ -0,0 +1,207 @@
+import argparse
+import sys
+import os
+import csv
+import math
+import random
+import time
+import multiprocessing
+
+import BM25
+import IndexReader
+import Stemmer
+import CalculateMeasures
+import VectorizedBM25
+from parsers import QrelsParser
+from Results import Results, Result
+
+# numpy is optional for the rest of the engine but the sweep rescores with it
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# results per topic that are evaluated, as in a bm25 run file
+RESULTS_PER_TOPIC = 1000
+
+MEASURES = {
+    'map': 'average_precision',
+    'p10': 'precision_at_10',
+    'ndcg10': 'ndcg_at_10'
+}
+
+# the collected topics and qrels every parameter setting is evaluated against, set before the
+# worker processes are forked so they share them instead of collecting them again
+sweep_state = {}
+
+def parameter_values(start, stop, step):
+    # start to stop inclusive, rounded so the values print the way they were asked for
+    count = int(math.floor((stop - start) / step + 1e-9)) + 1
+    return [round(start + index * step, 10) for index in range(count)]
+
+def grid_parameters(k1_range, b_range):
+    return [(k_1, b) for k_1 in parameter_values(*k1_range) for b in parameter_values(*b_range)]
+
+def random_parameters(k1_range, b_range, samples, seed):
+    # uniform samples from the same ranges the grid would cover
+    generator = random.Random(seed)
+    return [(generator.uniform(k1_range[0], k1_range[1]), generator.uniform(b_range[0], b_range[1])) for _ in range(samples)]
+
+def collect_topic(inverted_index, lexicon, N, query_tokens, stem, doc_lengths, average_doc_length, stem_cache=None, term_statistics=None):
+    # every posting of the query terms with its count, length ratio and the term's idf, none of
+    # which depend on k1 or b, indexed by the documents the query matches
+    term_postings = []
+
+    for query_token in BM25.stem_query_tokens(query_tokens, stem, stem_cache):
+        if query_token not in lexicon:
+            continue
+
+        query_token_id = lexicon[query_token]
+        doc_postings = numpy.array(inverted_index[query_token_id], dtype=numpy.int64)
+        idf = BM25.term_idf(N, len(doc_postings) // 2, term_statistics, query_token_id)
+        term_postings.append((doc_postings[0::2], doc_postings[1::2], idf))
+
+    doc_ids = numpy.unique(numpy.concatenate([term_doc_ids for term_doc_ids, _, _ in term_postings])) if term_postings else numpy.zeros(0, dtype=numpy.int64)
+    first_entries = numpy.zeros(len(doc_ids), dtype=numpy.int32)
+    terms = []
+
+    for term_doc_ids, counts, idf in term_postings:
+        terms.append((
+            numpy.searchsorted(doc_ids, term_doc_ids),
+            counts.astype(numpy.float64),
+            # the same doc_length / average_doc_length division BM25 does for every posting
+            doc_lengths[term_doc_ids] / average_doc_length,
+            idf
+        ))
+
+    # the first query term each document occurs in, which orders ties as BM25 does
+    for entry in range(len(terms) - 1, -1, -1):
+        first_entries[terms[entry][0]] = entry
+
+    return doc_ids, first_entries, terms
+
+def rank_topic(topic, k_1, b):
+    # the top results of a collected topic for k1 and b, scored exactly as calculate_BM25_algorithm
+    doc_ids, first_entries, terms = topic
+    scores = numpy.zeros(len(doc_ids), dtype=numpy.float64)
+
+    for candidates, counts, length_ratios, idf in terms:
+        scores[candidates] += BM25.term_weight(counts, BM25.length_normalization(length_ratios, k_1, b), idf)
+
+    order = VectorizedBM25.rank_order(doc_ids, scores, first_entries, RESULTS_PER_TOPIC)
+    return doc_ids[order], scores[order]
+
+def get_docno(doc_id):
+    # docnos of the documents that made it into a ranking, remembered across parameter settings
+    docno_cache = sweep_state['docno_cache']
+    if doc_id not in docno_cache:
+        docno_cache[doc_id] = sweep_state['docnos'][doc_id]
+    return docno_cache[doc_id]
+
+def evaluate_parameters(parameters):
+    k_1, b = parameters
+    results = Results()
+
+    for topic_id, topic in sweep_state['topics']:
+        ranked_doc_ids, ranked_scores = rank_topic(topic, k_1, b)
+        for rank, (doc_id, score) in enumerate(zip(ranked_doc_ids.tolist(), ranked_scores.tolist())):
+            results.add_result(topic_id, Result(get_docno(doc_id), score, rank + 1))
+
+    measures = CalculateMeasures.calculate_metrics(sweep_state['qrel'], (f"k1={k_1} b={b}", results))
+    return k_1, b, {name: CalculateMeasures.calculate_mean(measures[measure]) for name, measure in MEASURES.items()}
+
+def write_sweep_to_csv(output_file_path, evaluations):
+    with open(output_file_path, 'w', newline='') as csvfile:
+        fieldNames = ['k1', 'b', 'Mean Average Precision', 'Mean P@10', 'Mean NDCG@10']
+        writer = csv.DictWriter(csvfile, fieldnames=fieldNames)
+        writer.writeheader()
+        for k_1, b, means in evaluations:
+            writer.writerow({"k1": k_1,
+                             "b": b,
+                             "Mean Average Precision": f"{means['map']:.4f}",
+                             "Mean P@10": f"{means['p10']:.4f}",
+                             "Mean NDCG@10": f"{means['ndcg10']:.4f}"
+            })
+
+def main():
+    parser = argparse.ArgumentParser(description='Search BM25 k1 and b for the best effectiveness, rescoring each topic\'s postings in memory. For example: python ParameterSweep.py --directory_path /searchengines/latimes-index --stem false --qrel qrels.txt --workers 4')
+    parser.add_argument('--directory_path', required=True, help='Index directory with a queries.txt file')
+    parser.add_argument('--stem', required=True, help='Boolean true or false for whether the index was stemmed')
+    parser.add_argument('--qrel', required=True, help='Path to qrel file')
+    parser.add_argument('--k1_range', type=float, nargs=3, default=[0.2, 3.0, 0.1], metavar=('START', 'STOP', 'STEP'), help='k1 values searched, stop included')
+    parser.add_argument('--b_range', type=float, nargs=3, default=[0.0, 1.0, 0.05], metavar=('START', 'STOP', 'STEP'), help='b values searched, stop included')
+    parser.add_argument('--random', type=int, help='Evaluate this many random k1 and b values from the ranges instead of the grid')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random search')
+    parser.add_argument('--measure', choices=list(MEASURES), default='map', help='Measure the best setting is chosen by')
+    parser.add_argument('--workers', type=int, default=1, help='Number of forked processes the settings are evaluated in')
+
+    cli = parser.parse_args()
+    directory_path = cli.directory_path
+    stem = cli.stem.lower() == "true"
+
+    if not os.path.exists(directory_path):
+        print("This directory path does not exist! Please enter an existing directory path!")
+        sys.exit()
+
+    if not os.path.exists(cli.qrel):
+        print("Unable to find the qrel file!")
+        sys.exit()
+
+    if numpy is None:
+        print("The parameter sweep needs numpy! Please install numpy!")
+        sys.exit()
+
+    if cli.k1_range[2] <= 0 or cli.b_range[2] <= 0:
+        print("The k1 and b steps must be greater than 0!")
+        sys.exit()
+
+    if cli.workers > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+        print("Evaluating with --workers needs processes forked from this one, which this platform does not support!")
+        sys.exit()
+
+    start = time.perf_counter()
+    index_reader = IndexReader.open_index(directory_path)
+    document_metadata = index_reader.document_metadata
+    stem_cache = Stemmer.load_stem_cache(directory_path) if stem else None
+    queries = BM25.get_queries(directory_path).splitlines()
+    doc_lengths = numpy.asarray(document_metadata.doc_lengths, dtype=numpy.float64)
+
+    topics = []
+    for index in range(0, len(queries), 2):
+        topic = collect_topic(index_reader.inverted_index, index_reader.lexicon, len(document_metadata), BM25.tokenize(queries[index + 1]), stem, doc_lengths, index_reader.average_doc_length, stem_cache, index_reader.term_statistics)
+        topics.append((queries[index], topic))
+
+    sweep_state.update({
+        'topics': topics,
+        'qrel': QrelsParser(cli.qrel).parse(),
+        'docnos': document_metadata.docnos,
+        'docno_cache': {}
+    })
+
+    if cli.random:
+        parameters = random_parameters(cli.k1_range, cli.b_range, cli.random, cli.seed)
+    else:
+        parameters = grid_parameters(cli.k1_range, cli.b_range)
+
+    print(f"Read the index and collected the postings of {len(topics)} topics in {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+
+    if cli.workers > 1:
+        with multiprocessing.get_context('fork').Pool(cli.workers) as pool:
+            evaluations = pool.map(evaluate_parameters, parameters, chunksize=max(1, len(parameters) // (cli.workers * 4)))
+    else:
+        evaluations = [evaluate_parameters(setting) for setting in parameters]
+
+    elapsed = time.perf_counter() - start
+    print(f"Evaluated {len(parameters)} settings in {elapsed:.2f}s, {len(parameters) / elapsed:.1f} settings/sec")
+
+    output_file_path = directory_path + "/bm25-sweep-k34lai.csv"
+    write_sweep_to_csv(output_file_path, evaluations)
+
+    # the first setting searched wins a tie
+    k_1, b, means = max(evaluations, key=lambda evaluation: evaluation[2][cli.measure])
+    print(f"Best by {cli.measure}: k1={k_1:g} b={b:g}, MAP {means['map']:.4f}, P@10 {means['p10']:.4f}, NDCG@10 {means['ndcg10']:.4f}")
+    print(f"Every setting is in {output_file_path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+import os
+import heapq
+from array import array
+import Postings
+import Segments
+from DocumentStore import map_file
+
+POSITIONS_FILE_NAME = "/positions.bin"
+POSITIONS_TABLE_FILE_NAME = "/positions-table.bin"
+
+# every term id has one (offset, length) entry in the positions table
+TABLE_ENTRY_WIDTH = 2
+
+# query terms further apart than this do not count towards the proximity score
+PROXIMITY_WINDOW = 5
+
+def encode_positions(positions, buffer):
+    # one posting's positions as gaps, the number of positions is the term frequency in the postings
+    previous_position = 0
+
+    for position in positions:
+        Postings.encode_vbyte(position - previous_position, buffer)
+        previous_position = position
+
+def decode_positions(blob, postings):
+    # split the term's positions back into one sorted list per posting
+    numbers = Postings.decode_vbyte(blob)
+    positions = []
+    start = 0
+
+    for index in range(1, len(postings), 2):
+        end = start + postings[index]
+        position = 0
+        posting_positions = []
+        for gap in numbers[start:end]:
+            position += gap
+            posting_positions.append(position)
+        positions.append(posting_positions)
+        start = end
+
+    return positions
+
+class PositionsWriter:
+    def __init__(self, storage_path):
+        self.positions_file = open(storage_path + POSITIONS_FILE_NAME, 'wb')
+        self.table_file_path = storage_path + POSITIONS_TABLE_FILE_NAME
+        self.table = array('Q')
+        self.offset = 0
+
+    def add(self, term_id, blob):
+        if term_id != len(self.table) // TABLE_ENTRY_WIDTH:
+            raise ValueError(f"Positions must be written in term id order, expected {len(self.table) // TABLE_ENTRY_WIDTH} but got {term_id}")
+
+        self.positions_file.write(blob)
+        self.table.extend((self.offset, len(blob)))
+        self.offset += len(blob)
+
+    def close(self):
+        self.positions_file.close()
+
+        with open(self.table_file_path, 'wb') as table_file:
+            self.table.tofile(table_file)
+
+def write_positions(positions_index, storage_path):
+    positions_writer = PositionsWriter(storage_path)
+
+    for term_id in range(len(positions_index)):
+        positions_writer.add(term_id, positions_index[term_id])
+
+    positions_writer.close()
+
+def write_run(positions_index, run_file_path):
+    Postings.write_run(positions_index, run_file_path, encode=bytes)
+
+def merge_runs(run_file_paths, storage_path):
+    # every posting's positions are coded on their own, so a term's runs are simply concatenated
+    positions_writer = PositionsWriter(storage_path)
+    runs = [Postings.read_run(run_file_path, run_number) for run_number, run_file_path in enumerate(run_file_paths)]
+    current_term_id = None
+    current_blobs = []
+
+    for term_id, _, blob in heapq.merge(*runs):
+        if term_id != current_term_id:
+            if current_term_id is not None:
+                positions_writer.add(current_term_id, b"".join(current_blobs))
+            current_term_id = term_id
+            current_blobs = []
+        current_blobs.append(blob)
+
+    if current_term_id is not None:
+        positions_writer.add(current_term_id, b"".join(current_blobs))
+
+    positions_writer.close()
+
+def positions_exist(directory_path):
+    return all(os.path.exists(segment_path + POSITIONS_FILE_NAME) for segment_path in Segments.get_segment_paths(directory_path))
+
+def read_positions_table(segment_path):
+    table = array('Q')
+
+    with open(segment_path + POSITIONS_TABLE_FILE_NAME, 'rb') as table_file:
+        table.frombytes(table_file.read())
+
+    return table
+
+def read_term_blob(positions, table, term_id):
+    offset = table[term_id * TABLE_ENTRY_WIDTH]
+    length = table[term_id * TABLE_ENTRY_WIDTH + 1]
+
+    return positions[offset:offset + length]
+
+class PositionsReader:
+    def __init__(self, directory_path):
+        # positions stay on disk and are only read for the terms a query needs, through a mapping
+        # rather than a file offset, which forked workers and threads would all share
+        self.segments = []
+
+        for segment_path in Segments.get_segment_paths(directory_path):
+            self.segments.append((
+                Segments.read_lexicon(segment_path),
+                read_positions_table(segment_path),
+                memoryview(map_file(segment_path + POSITIONS_FILE_NAME))
+            ))
+
+    def get_positions(self, term, postings):
+        # segments are searched in the same order their postings were concatenated in
+        blobs = [read_term_blob(positions, table, lexicon[term]) for lexicon, table, positions in self.segments if term in lexicon]
+        return decode_positions(b"".join(blobs), postings)
+
+    def get_doc_positions(self, term, postings):
+        return dict(zip(postings[::2], self.get_positions(term, postings)))
+
+    def close(self):
+        for lexicon, _, positions in self.segments:
+            lexicon.close()
+            positions.release()
+
+def intersect_positions(first_positions, second_positions, offset):
+    # positions p of the first list with p + offset in the second, both lists sorted
+    matches = []
+    i = 0
+    j = 0
+
+    while i < len(first_positions) and j < len(second_positions):
+        target = first_positions[i] + offset
+        if second_positions[j] < target:
+            j += 1
+        elif second_positions[j] > target:
+            i += 1
+        else:
+            matches.append(first_positions[i])
+            i += 1
+            j += 1
+
+    return matches
+
+def match_phrase(phrase_terms, inverted_index, lexicon, positions_reader):
+    # returns doc id -> number of times the phrase occurs
+    if not phrase_terms or any(term not in lexicon for term in phrase_terms):
+        return {}
+
+    term_positions = []
+    for term in phrase_terms:
+        term_positions.append(positions_reader.get_doc_positions(term, inverted_index[lexicon[term]]))
+
+    # intersect the rarest terms first so the candidate set shrinks quickly
+    order = sorted(range(len(phrase_terms)), key=lambda index: len(term_positions[index]))
+    candidates = set(term_positions[order[0]])
+    for index in order[1:]:
+        candidates &= term_positions[index].keys()
+
+    phrase_matches = {}
+
+    for doc_id in sorted(candidates):
+        starts = term_positions[0][doc_id]
+        for offset in range(1, len(phrase_terms)):
+            starts = intersect_positions(starts, term_positions[offset][doc_id], offset)
+            if not starts:
+                break
+        if starts:
+            phrase_matches[doc_id] = len(starts)
+
+    return phrase_matches
+
+def proximity_accumulator(first_positions, second_positions):
+    # sum of 1 / distance^2 over the occurrence pairs at most PROXIMITY_WINDOW apart
+    accumulator = 0.0
+    start = 0
+
+    for first in first_positions:
+        while start < len(second_positions) and second_positions[start] < first - PROXIMITY_WINDOW:
+            start += 1
+        index = start
+        while index < len(second_positions) and second_positions[index] <= first + PROXIMITY_WINDOW:
+            distance = abs(second_positions[index] - first)
+            if distance:
+                accumulator += 1.0 / (distance * distance)
+            index += 1
+
+    return accumulator
@@ -0,0 +1,181 @@
+import os
+import heapq
+import struct
+from array import array
+from DocumentStore import map_file
+
+POSTINGS_FILE_NAME = "/postings.bin"
+POSTINGS_TABLE_FILE_NAME = "/postings-table.bin"
+TERM_STATISTICS_FILE_NAME = "/term-statistics.bin"
+
+# partial runs are a sequence of (term id, blob length) headers each followed by the encoded postings
+RUN_HEADER = struct.Struct('<II')
+
+# every term id has one (offset, length, df) entry in the postings table
+TABLE_ENTRY_WIDTH = 3
+
+# every term id has one (document frequency, collection frequency) entry in the term statistics
+STATISTICS_ENTRY_WIDTH = 2
+
+def encode_vbyte(number, buffer):
+    # low 7 bits first, the high bit marks that more bytes follow
+    while number >= 128:
+        buffer.append((number & 127) | 128)
+        number >>= 7
+    buffer.append(number)
+
+def decode_vbyte(blob):
+    numbers = []
+    number = 0
+    shift = 0
+
+    for byte in blob:
+        if byte < 128:
+            numbers.append(number | (byte << shift))
+            number = 0
+            shift = 0
+        else:
+            number |= (byte & 127) << shift
+            shift += 7
+
+    return numbers
+
+def encode_postings(postings):
+    # postings are interleaved [doc_id, count, doc_id, count, ...] with increasing doc ids
+    buffer = bytearray()
+    previous_doc_id = 0
+
+    for index in range(0, len(postings), 2):
+        doc_id = postings[index]
+        encode_vbyte(doc_id - previous_doc_id, buffer)
+        encode_vbyte(postings[index + 1], buffer)
+        previous_doc_id = doc_id
+
+    return buffer
+
+def decode_postings(blob):
+    postings = decode_vbyte(blob)
+    doc_id = 0
+
+    # turn the doc id gaps back into doc ids
+    for index in range(0, len(postings), 2):
+        doc_id += postings[index]
+        postings[index] = doc_id
+
+    return postings
+
+class PostingsWriter:
+    def __init__(self, storage_path):
+        self.postings_file = open(storage_path + POSTINGS_FILE_NAME, 'wb')
+        self.table_file_path = storage_path + POSTINGS_TABLE_FILE_NAME
+        self.statistics_file_path = storage_path + TERM_STATISTICS_FILE_NAME
+        self.table = array('Q')
+        self.statistics = array('Q')
+        self.offset = 0
+
+    def add(self, term_id, postings):
+        if term_id != len(self.table) // TABLE_ENTRY_WIDTH:
+            raise ValueError(f"Postings must be written in term id order, expected {len(self.table) // TABLE_ENTRY_WIDTH} but got {term_id}")
+
+        blob = encode_postings(postings)
+        self.postings_file.write(blob)
+        self.table.extend((self.offset, len(blob), len(postings) // 2))
+        self.statistics.extend((len(postings) // 2, sum(postings[1::2])))
+        self.offset += len(blob)
+
+    def close(self):
+        self.postings_file.close()
+
+        with open(self.table_file_path, 'wb') as table_file:
+            self.table.tofile(table_file)
+
+        with open(self.statistics_file_path, 'wb') as statistics_file:
+            self.statistics.tofile(statistics_file)
+
+def write_postings(inverted_index, storage_path):
+    postings_writer = PostingsWriter(storage_path)
+
+    for term_id in range(len(inverted_index)):
+        postings_writer.add(term_id, inverted_index[term_id])
+
+    postings_writer.close()
+
+def postings_exist(directory_path):
+    return os.path.exists(directory_path + POSTINGS_FILE_NAME) and os.path.exists(directory_path + POSTINGS_TABLE_FILE_NAME)
+
+def read_postings_table(directory_path):
+    table = array('Q')
+
+    with open(directory_path + POSTINGS_TABLE_FILE_NAME, 'rb') as table_file:
+        table.frombytes(table_file.read())
+
+    return table
+
+class TermStatistics:
+    def __init__(self, statistics):
+        # flat (df, cf) pairs aligned with the term ids, either mapped from disk or summed over segments
+        self.statistics = statistics
+
+    def document_frequency(self, term_id):
+        return self.statistics[term_id * STATISTICS_ENTRY_WIDTH]
+
+    def collection_frequency(self, term_id):
+        return self.statistics[term_id * STATISTICS_ENTRY_WIDTH + 1]
+
+    def __len__(self):
+        return len(self.statistics) // STATISTICS_ENTRY_WIDTH
+
+def read_term_statistics(directory_path):
+    statistics_map = map_file(directory_path + TERM_STATISTICS_FILE_NAME)
+    return TermStatistics(memoryview(statistics_map).cast('Q'))
+
+def read_inverted_index(directory_path):
+    table = read_postings_table(directory_path)
+
+    with open(directory_path + POSTINGS_FILE_NAME, 'rb') as postings_file:
+        data = memoryview(postings_file.read())
+
+    inverted_index = {}
+
+    for term_id in range(len(table) // TABLE_ENTRY_WIDTH):
+        offset = table[term_id * TABLE_ENTRY_WIDTH]
+        length = table[term_id * TABLE_ENTRY_WIDTH + 1]
+        inverted_index[term_id] = decode_postings(data[offset:offset + length])
+
+    return inverted_index
+
+def write_run(inverted_index, run_file_path, encode=encode_postings):
+    with open(run_file_path, 'wb') as run_file:
+        for term_id in sorted(inverted_index):
+            blob = encode(inverted_index[term_id])
+            run_file.write(RUN_HEADER.pack(term_id, len(blob)))
+            run_file.write(blob)
+
+def read_run(run_file_path, run_number):
+    with open(run_file_path, 'rb') as run_file:
+        while True:
+            header = run_file.read(RUN_HEADER.size)
+            if not header:
+                break
+            term_id, length = RUN_HEADER.unpack(header)
+            yield term_id, run_number, run_file.read(length)
+
+def merge_runs(run_file_paths, storage_path):
+    # runs hold increasing doc id ranges, so merging on (term id, run number) keeps every postings list sorted
+    postings_writer = PostingsWriter(storage_path)
+    runs = [read_run(run_file_path, run_number) for run_number, run_file_path in enumerate(run_file_paths)]
+    current_term_id = None
+    current_postings = []
+
+    for term_id, _, blob in heapq.merge(*runs):
+        if term_id != current_term_id:
+            if current_term_id is not None:
+                postings_writer.add(current_term_id, current_postings)
+            current_term_id = term_id
+            current_postings = []
+        current_postings.extend(decode_postings(blob))
+
+    if current_term_id is not None:
+        postings_writer.add(current_term_id, current_postings)
+
+    postings_writer.close()
@@ -1,158 +1,322 @@
 import BM25
 import QueryBiasedSummary
+import Tokenizer
+import Positions
+import Segments
+import IndexReader
+import BlockMax
+import BooleanRetrieval
+import DocumentStore
+import Sentences
+import ResultCache
 import sys
-import os
+import argparse
 import time
-import json
 import re
 
 DIRECTORY_PATH = '/searchengines/latimes-index'
 VALID_INPUTS = ['N', 'Q']
-
-def get_inverted_index(directory_path):
-    inverted_index_file_path = directory_path + "/inverted-index.json"
-
-    if os.path.exists(inverted_index_file_path): 
-        with open(inverted_index_file_path, 'r') as inverted_index_file:
-            inverted_index = json.load(inverted_index_file)
+RESULTS_PER_PAGE = 10
+
+# rankings are cached this deep, so 'M' can page through them without rescoring
+CACHED_RESULTS = 100
+RESULT_CACHE_SIZE = 128
+# seconds a cached ranking is used for, appended segments show up in later searches after that
+RESULT_CACHE_TTL = 300
+PHRASE_REGEX = re.compile(r'"([^"]+)"')
+WILDCARD_WORD_REGEX = re.compile(r'\S*\*\S*')
+
+# a query with one of these words in capitals is a boolean query, where parentheses group
+BOOLEAN_OPERATORS = ['AND', 'OR', 'NOT']
+BOOLEAN_TOKEN_REGEX = re.compile(r'[()]|[^\s()]+')
+
+def get_document_store(directory_path):
+    if DocumentStore.document_store_exists(directory_path):
+        document_store = DocumentStore.DocumentStore(directory_path)
     else:
-        print("Unable to find the inverted index file!")
+        print("Unable to find the document store!")
         sys.exit()
 
-    inverted_index = {int(index): postings for index, postings in inverted_index.items()}
-    return inverted_index
-
-def get_lexicon(directory_path):
-    lexicon_file_path = directory_path + "/lexicon.json"
-
-    if os.path.exists(lexicon_file_path): 
-        with open(lexicon_file_path, 'r') as lexicon_file:
-            lexicon = json.load(lexicon_file)
-    else:
-        print("Unable to find the lexicon file!")
-        sys.exit()
+    return document_store
 
-    return lexicon
+def get_boolean_searcher(directory_path, index_reader):
+    # boolean queries skip through the postings with the blocks written for dynamic pruning
+    if BlockMax.blocks_exist(directory_path):
+        return BooleanRetrieval.BooleanSearcher(index_reader.segment_postings, BlockMax.BlockIndex(directory_path), index_reader.doc_lengths, index_reader.average_doc_length)
+
+    return None
 
-def get_docnos(directory_path):
-    docnos_file_path = directory_path + "/docnos.txt"
+def get_sentence_store(directory_path):
+    # results are summarized from the sentences stored at index time if it was built with --sentences
+    if Sentences.sentences_exist(directory_path):
+        return Sentences.SentenceStore(directory_path)
 
-    if os.path.exists(docnos_file_path): 
-        with open(docnos_file_path, 'r') as docnos_file:
-            docnos = docnos_file.read()
-    else:
-        print("Unable to find the docnos file!")
-        sys.exit()
+    return None
+
+def get_positions_reader(directory_path):
+    # phrase and proximity matching are only available if the index was built with --positions
+    if Positions.positions_exist(directory_path):
+        return Positions.PositionsReader(directory_path)
 
-    return docnos
+    return None
+
+def filter_phrases(ranked_documents_dict, phrases, inverted_index, lexicon, docnos, positions_reader):
+    # keep the ranked documents that contain every quoted phrase
+    for phrase in phrases:
+        phrase_doc_nos = {docnos[doc_id] for doc_id in Positions.match_phrase(Tokenizer.tokenize(phrase), inverted_index, lexicon, positions_reader)}
+        ranked_documents_dict = {doc_no: score for doc_no, score in ranked_documents_dict.items() if doc_no in phrase_doc_nos}
+
+    return ranked_documents_dict
+
+def get_wildcard_patterns(query):
+    # a word with a * in it, such as presiden*, keeps only its letters, digits and wildcards
+    patterns = []
+
+    for word in WILDCARD_WORD_REGEX.findall(query):
+        pattern = "".join(char for char in word.lower() if char == '*' or char.isalpha() or char.isdigit())
+        if pattern.strip('*'):
+            patterns.append(pattern)
+
+    return patterns
+
+def expand_wildcards(patterns, term_lexicons):
+    # each segment's sorted lexicon is range scanned for the terms matching a pattern
+    terms = set()
+
+    for pattern in patterns:
+        for term_lexicon in term_lexicons:
+            terms.update(term for term, _ in term_lexicon.wildcard_items(pattern))
+
+    return terms
+
+def is_boolean_query(query):
+    return any(word in BOOLEAN_OPERATORS for word in query.split())
+
+def parse_boolean_query(query):
+    # NOT binds tighter than AND and AND tighter than OR, words with no operator between them are
+    # ANDed, so a OR b c NOT d is a OR (b AND c AND NOT d), a malformed query raises ValueError
+    tokens = [token for token in BOOLEAN_TOKEN_REGEX.findall(query) if token in '()' or Tokenizer.tokenize(token)]
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def parse_or():
+        nonlocal position
+        children = [parse_and()]
+        while peek() == 'OR':
+            position += 1
+            children.append(parse_and())
+        return children[0] if len(children) == 1 else ('or', tuple(children))
+
+    def parse_and():
+        nonlocal position
+        children = [parse_unary()]
+        while peek() not in (None, 'OR', ')'):
+            if peek() == 'AND':
+                position += 1
+            children.append(parse_unary())
+        return children[0] if len(children) == 1 else ('and', tuple(children))
+
+    def parse_unary():
+        nonlocal position
+        token = peek()
+        if token is None or token in ('AND', 'OR', ')'):
+            raise ValueError(f"Expected a word, NOT or ( {'at the end' if token is None else 'before ' + token} of the boolean query")
+        position += 1
+
+        if token == 'NOT':
+            return ('not', parse_unary())
+
+        if token == '(':
+            node = parse_or()
+            if peek() != ')':
+                raise ValueError("A ( in the boolean query is never closed")
+            position += 1
+            return node
+
+        # a word the tokenizer splits, such as u.s., needs all of its tokens
+        terms = tuple(('term', term) for term in dict.fromkeys(Tokenizer.iter_tokens(token)))
+        return terms[0] if len(terms) == 1 else ('and', terms)
+
+    node = parse_or()
+    if position < len(tokens):
+        raise ValueError("A ) in the boolean query has no matching (")
+
+    return node
+
+def parse_query(query):
+    # the ranked tokens, wildcard patterns and quoted phrases of a query
+    query_tokens = BM25.tokenize(WILDCARD_WORD_REGEX.sub(' ', query))
+    return query_tokens, get_wildcard_patterns(query), PHRASE_REGEX.findall(query)
+
+def query_key(query):
+    # queries that rank and summarize the same way share a key, whatever their word order, case
+    # or punctuation, the summaries depend on every token of the query text
+    if is_boolean_query(query):
+        return parse_boolean_query(query), frozenset(BM25.tokenize(query))
+
+    query_tokens, patterns, phrases = parse_query(query)
+
+    return (
+        frozenset(query_tokens),
+        frozenset(patterns),
+        frozenset(tuple(Tokenizer.tokenize(phrase)) for phrase in phrases),
+        frozenset(BM25.tokenize(query))
+    )
+
+def rank_query(query, inverted_index, lexicon, docnos, doc_lengths, average_doc_length, positions_reader=None, term_lexicons=None, result_cache=None, boolean_searcher=None, proximity=False):
+    # the cached result entry of a query, its top ranked (docno, score) pairs and the summaries
+    # printed for them so far
+    query_tokens, patterns, phrases = parse_query(query)
+    key = query_key(query)
+
+    if result_cache is not None:
+        cached_results = result_cache.get(key)
+        if cached_results is not None:
+            return cached_results
+
+    if is_boolean_query(query):
+        if boolean_searcher is None:
+            print("The index has no postings blocks, so AND, OR and NOT are matched as words")
+        else:
+            # only the documents matching the boolean query are ranked, by BM25 over its words
+            ranking = boolean_searcher.rank(parse_boolean_query(query), CACHED_RESULTS)
+            cached_results = {
+                'ranking': [(docnos[doc_id], score) for doc_id, score in ranking],
+                'summaries': {}
+            }
+
+            if result_cache is not None:
+                result_cache.put(key, cached_results)
+
+            return cached_results
+
+    if patterns and term_lexicons:
+        query_tokens |= expand_wildcards(patterns, term_lexicons)
+
+    # quoted phrases filter the ranking afterwards, so those queries need every matching document
+    k = None if phrases and positions_reader is not None else CACHED_RESULTS
+    # the positions only add a proximity score when asked for, building them in only enables phrases
+    proximity_reader = positions_reader if proximity else None
+    ranked_documents_dict = BM25.calculate_BM25_algorithm(inverted_index, lexicon, docnos, query_tokens, False, doc_lengths, average_doc_length, positions_reader=proximity_reader, k=k)
+
+    if phrases:
+        if positions_reader is None:
+            print("The index has no positions, so the quoted phrases are matched as separate words")
+        else:
+            ranked_documents_dict = filter_phrases(ranked_documents_dict, phrases, inverted_index, lexicon, docnos, positions_reader)
 
-def get_doc_lengths(directory_path):
-    doc_lengths_file_path = directory_path + "/doc-lengths.txt"
-    doc_lengths = []
+    cached_results = {
+        'ranking': list(ranked_documents_dict.items())[:CACHED_RESULTS],
+        'summaries': {}
+    }
 
-    if os.path.exists(doc_lengths_file_path): 
-        with open(doc_lengths_file_path, 'r') as doc_lengths_file:
-            for line in doc_lengths_file:
-                doc_lengths.append(int(line.strip()))
-    else:
-        print("Unable to find the doc-lengths file!")
-        sys.exit()
+    if result_cache is not None:
+        result_cache.put(key, cached_results)
 
-    return doc_lengths
+    return cached_results
 
-def tokenize(text):
-    text = text.lower() 
-    tokens = set()
+def summarize_result(query, doc_no, document_store, document_metadata, sentence_store=None):
+    internal_id = document_store.get_internal_id(doc_no)
+    metadata = document_metadata.metadata(internal_id)
 
-    start = 0 
-    i = 0
-
-    for currChar in text:
-        if not currChar.isdigit() and not currChar.isalpha() :
-            if start != i :
-                token = text[start:i]
-                tokens.add(token)
-                
-            start = i + 1
+    if sentence_store is not None:
+        summary = QueryBiasedSummary.summarize_sentences(query, internal_id, sentence_store)
+    else:
+        document = document_store.get_document(internal_id)
+        text_content = QueryBiasedSummary.text_content(document)
+        if text_content is None:
+            text_content = ""
+            print("No content between text tags")
 
-        i = i + 1
+        summary = QueryBiasedSummary.summarize(query, text_content)
+    headline = ""
+    if not metadata['headline']:
+        headline = "{}...".format(summary[:50])
+    else:
+        headline = metadata['headline']
+
+    return headline.replace('\n', ''), metadata['date'], summary
+
+def page_results(query, cached_results, page, document_store, document_metadata, sentence_store=None):
+    # one page of a cached ranking, summarizing the documents that were not shown before
+    ranking = cached_results['ranking']
+    summaries = cached_results['summaries']
+    first_rank = (page - 1) * RESULTS_PER_PAGE + 1
+    results = []
+
+    for rank, (doc_no, score) in enumerate(ranking[first_rank - 1:first_rank - 1 + RESULTS_PER_PAGE], first_rank):
+        if doc_no not in summaries:
+            summaries[doc_no] = summarize_result(query, doc_no, document_store, document_metadata, sentence_store)
+        headline, date, summary = summaries[doc_no]
+
+        results.append({
+            'rank': rank,
+            'docno': doc_no,
+            'score': score,
+            'headline': headline,
+            'date': date,
+            'summary': summary
+        })
+
+    return results
+
+def query_results(query, inverted_index, lexicon, docnos, doc_lengths, average_doc_length, document_store, document_metadata, positions_reader=None, term_lexicons=None, result_cache=None, page=1, boolean_searcher=None, sentence_store=None, proximity=False):
+    start = time.time()
+    rank_doc_no = {}
 
-    if start != i :
-        tokens.add(text[start:i])
+    try:
+        cached_results = rank_query(query, inverted_index, lexicon, docnos, doc_lengths, average_doc_length, positions_reader, term_lexicons, result_cache, boolean_searcher, proximity)
+    except ValueError as error:
+        print(f"{error}! Please try again!")
+        return rank_doc_no
 
-    return tokens
+    results = page_results(query, cached_results, page, document_store, document_metadata, sentence_store)
 
-def query_results(query, inverted_index, lexicon, docnos, doc_lengths, average_doc_length):
-    start = time.time()
-    rank_doc_no = {}
-    query_tokens = tokenize(query)
-
-    ranked_documents_dict = BM25.calculate_BM25_algorithm(inverted_index, lexicon, docnos, query_tokens, False, doc_lengths, average_doc_length)
-
-    limit = min(len(ranked_documents_dict), 10)
-    i = 1
-
-    for doc_no, score in ranked_documents_dict.items():
-        yy = doc_no[6:8]
-        mm = doc_no[2:4]
-        dd = doc_no[4:6]
-        document_file_path = DIRECTORY_PATH + f"/{yy}/{mm}/{dd}/{doc_no}.txt"
-        document_metadata_file_path = DIRECTORY_PATH + f"/{yy}/{mm}/{dd}/{doc_no}.json"
-        with open(document_file_path, 'r') as document_file:
-            document = document_file.read() 
-        with open(document_metadata_file_path, 'r') as metadata_file:
-            metadata = json.load(metadata_file)
-
-        text = re.search(r'<TEXT>(.*?)</TEXT>', document, re.DOTALL)
-        text_content = ""
-        if text:
-            text_content = text.group(1).strip()
-        else:
-            print("No content between text tags")
+    if not results:
+        print("There are no more results for this query")
 
-        summary = QueryBiasedSummary.summarize(query, text_content)
-        headline = ""
-        if not metadata['headline']:
-            headline = "{}...".format(summary[:50])
-        else:
-            headline = metadata['headline']
-        print("{}. {} ({})".format(i, headline.replace('\n', ''), metadata['date']))
-        print("{} ({})\n".format(summary, doc_no))
-        rank_doc_no[i] = doc_no
-        i += 1
-        if i > limit:
-            break
+    for result in results:
+        print("{}. {} ({})".format(result['rank'], result['headline'], result['date']))
+        print("{} ({})\n".format(result['summary'], result['docno']))
+        rank_doc_no[result['rank']] = result['docno']
 
     stop = time.time()
     print("Retrieval took {:.3f} seconds".format(stop - start))
     return rank_doc_no
 
-def query_program(inverted_index, lexicon, docnos, doc_lengths, average_doc_length):
+def query_program(inverted_index, lexicon, docnos, doc_lengths, average_doc_length, document_store, document_metadata, positions_reader=None, term_lexicons=None, result_cache=None, boolean_searcher=None, sentence_store=None, proximity=False):
     query = input("Enter a query: ")
     prompt = ''
+    page = 1
 
-    rankings = query_results(query, inverted_index, lexicon, docnos, doc_lengths, average_doc_length)
+    rankings = query_results(query, inverted_index, lexicon, docnos, doc_lengths, average_doc_length, document_store, document_metadata, positions_reader, term_lexicons, result_cache, page, boolean_searcher, sentence_store, proximity)
 
     while prompt not in VALID_INPUTS:
-        prompt = input("Enter rank of a document to view, \'N\' for a new query or \'Q\' to quit the program: ")
+        prompt = input("Enter rank of a document to view, \'M\' for more results, \'N\' for a new query or \'Q\' to quit the program: ")
 
         if prompt == 'Q':
+            if result_cache is not None:
+                stats = result_cache.stats()
+                print("Result cache: {} hits, {} misses, {} evictions".format(stats['hits'], stats['misses'], stats['evictions']))
             print("Quitting program")
             exit()
 
         if prompt == 'N':
-            query_program(inverted_index, lexicon, docnos, doc_lengths, average_doc_length)
+            query_program(inverted_index, lexicon, docnos, doc_lengths, average_doc_length, document_store, document_metadata, positions_reader, term_lexicons, result_cache, boolean_searcher, sentence_store, proximity)
+
+        if prompt == 'M':
+            # the next page comes from the cached ranking, earlier ranks stay viewable
+            page += 1
+            rankings.update(query_results(query, inverted_index, lexicon, docnos, doc_lengths, average_doc_length, document_store, document_metadata, positions_reader, term_lexicons, result_cache, page, boolean_searcher, sentence_store, proximity))
+            continue
 
         try:
             rank = int(prompt)
-            if len(rankings) >= rank > 0:
+            if rank in rankings:
                 doc_no = rankings[rank]
-                yy = doc_no[6:8]
-                mm = doc_no[2:4]
-                dd = doc_no[4:6]
-                document_file_path = DIRECTORY_PATH + f"/{yy}/{mm}/{dd}/{doc_no}.txt"
-                with open(document_file_path, 'r') as document_file:
-                    document = document_file.read() 
+                document = document_store.get_document_by_docno(doc_no)
                 print(doc_no)
                 print(document)
             else:
@@ -163,18 +327,32 @@ def query_program(inverted_index, lexicon, docnos, doc_lengths, average_doc_leng
             pass
 
 def main():
-    inverted_index = get_inverted_index(DIRECTORY_PATH)
-    lexicon = get_lexicon(DIRECTORY_PATH)
-    docnos = get_docnos(DIRECTORY_PATH)
-    doc_lengths = get_doc_lengths(DIRECTORY_PATH)
-    docnos = docnos.splitlines()
-
-    average_doc_length = 0
-
-    if len(doc_lengths) > 0:
-        average_doc_length = sum(doc_lengths) / len(doc_lengths)
+    parser = argparse.ArgumentParser(description='Search an index interactively')
+    parser.add_argument('--directory_path', default=DIRECTORY_PATH, help='Directory path of the index')
+    parser.add_argument('--proximity', action='store_true', help='Add a term proximity score from the positional index')
+
+    cli = parser.parse_args()
+    directory_path = cli.directory_path
+
+    index_reader = IndexReader.open_index(directory_path)
+    inverted_index = index_reader.inverted_index
+    lexicon = index_reader.lexicon
+    document_metadata = index_reader.document_metadata
+    docnos = index_reader.docnos
+    doc_lengths = index_reader.doc_lengths
+    document_store = get_document_store(directory_path)
+    positions_reader = get_positions_reader(directory_path)
+    term_lexicons = Segments.read_lexicons(directory_path)
+    result_cache = ResultCache.ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+    boolean_searcher = get_boolean_searcher(directory_path, index_reader)
+    sentence_store = get_sentence_store(directory_path)
+    average_doc_length = index_reader.average_doc_length
+
+    if cli.proximity and positions_reader is None:
+        print("Unable to find the positional index! Please rebuild the index with --positions!")
+        sys.exit()
 
-    query_program(inverted_index, lexicon, docnos, doc_lengths, average_doc_length)
+    query_program(inverted_index, lexicon, docnos, doc_lengths, average_doc_length, document_store, document_metadata, positions_reader, term_lexicons, result_cache, boolean_searcher, sentence_store, cli.proximity)
 
 if __name__=="__main__":
     main()
\ No newline at end of file
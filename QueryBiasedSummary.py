@@ -2,7 +2,9 @@ import re
 import heapq
 from typing import List
 import BM25
+import Tokenizer
 
+TEXT = re.compile(r'<TEXT>(.*?)</TEXT>', re.DOTALL)
 TAGS = re.compile(r'<[^>]+>')
 STOPS = re.compile(r'(?<=[.!?])\s+')
 ESCAPES = re.compile(r'[\n\\]+')
@@ -15,39 +17,69 @@ class QueryBiasedSentence:
     def __lt__(self, other):
         return self.score > other.score
 
-def summarize(query, text, top_n: int = 3):
+def text_content(document):
+    # what is between the text tags of a stored document, None if it has no text
+    text = TEXT.search(document)
+    if text:
+        return text.group(1).strip()
+
+    return None
+
+def split_sentences(text):
     text = re.sub(TAGS, '', text)
     text = re.sub(ESCAPES, ' ', text)
     sentences = re.split(STOPS, text)
 
-    trim_sentences = [s.strip() for s in sentences if len(s.strip().split()) > 4]
+    return [s.strip() for s in sentences if len(s.strip().split()) > 4]
 
-    query_tokens = BM25.tokenize(query)
-    heap = []
-
-    for index, sentence in enumerate(trim_sentences):
-        tokens = BM25.tokenize(sentence)
+def document_sentences(text):
+    # (sentence, tokens) of every sentence a summary can be made of, with the whitespace collapsed
+    # as in the summary and the tokens in sentence order, which IndexEngine stores with --sentences
+    return [(' '.join(sentence.split()), Tokenizer.tokenize(sentence)) for sentence in split_sentences(text)]
 
-        l = 2 if index == 0 else (1 if index == 1 else 0)
-        c = sum(list(tokens).count(q) for q in query_tokens)
-        d = len(set(query_tokens) & set(tokens))
+def score_sentence(index, tokens, query_terms):
+    # tokens are the sentence's in order and query_terms a set, both strings or both the ids of
+    # the sentence lexicon
+    l = 2 if index == 0 else (1 if index == 1 else 0)
+    d = len(query_terms.intersection(tokens))
+    # every query term was counted once however often the sentence repeats it
+    c = d
 
-        k_max = 0
+    # the longest run of query terms in a row in the sentence, which only needs looking for
+    # when two of them are in it
+    k_max = min(d, 1)
+    if d > 1:
         k = 0
         for t in tokens:
-            if t in query_tokens:
+            if t in query_terms:
                 k += 1
                 k_max = max(k_max, k)
             else:
                 k = 0
 
-        score = 2 * c + 3 * d + 4 * k_max + l
-        heapq.heappush(heap, QueryBiasedSentence(sentence, score))
+    return 2 * c + 3 * d + 4 * k_max + l
+
+def select_sentences(sentences, query_terms, top_n):
+    heap = []
+
+    for index, (sentence, tokens) in enumerate(sentences):
+        heapq.heappush(heap, QueryBiasedSentence(sentence, score_sentence(index, tokens, query_terms)))
+
+    return [heapq.heappop(heap).text for _ in range(min(top_n, len(heap)))]
 
-    summary = [heapq.heappop(heap).text for _ in range(min(top_n, len(heap)))]
+def summarize(query, text, top_n: int = 3):
+    sentences = [(sentence, Tokenizer.tokenize(sentence)) for sentence in split_sentences(text)]
+    summary = select_sentences(sentences, BM25.tokenize(query), top_n)
 
     final_summary = ' '.join(summary).strip()
     # collapse multiple spaces
     final_summary = re.sub(r'\s+', ' ', final_summary)
 
     return final_summary
+
+def summarize_sentences(query, internal_id, sentence_store, top_n: int = 3):
+    # the summary of summarize from a document's stored sentences, which are already split,
+    # tokenized and collapsed, so no text is read or tokenized for a result
+    query_ids = sentence_store.query_ids(frozenset(BM25.tokenize(query)))
+
+    return ' '.join(select_sentences(sentence_store.sentences(internal_id), query_ids, top_n))
@@ -0,0 +1,99 @@
+import BM25
+
+# RM3 settings, the defaults Anserini's bm25+rm3 baseline uses
+FEEDBACK_DOCS = 10
+FEEDBACK_TERMS = 10
+ORIGINAL_QUERY_WEIGHT = 0.5
+
+# a term in more than this share of the documents says little about any topic, so it is never
+# added to a query
+MAX_FEEDBACK_DOCUMENT_RATIO = 0.1
+
+def query_term_weights(lexicon, query_terms):
+    # every query term found in the lexicon weighted equally, in query token order
+    term_ids = []
+
+    for query_term in query_terms:
+        if query_term in lexicon and lexicon[query_term] not in term_ids:
+            term_ids.append(lexicon[query_term])
+
+    return {term_id: 1 / len(term_ids) for term_id in term_ids}
+
+def document_frequency(inverted_index, term_statistics, term_id):
+    if term_statistics is not None:
+        return term_statistics.document_frequency(term_id)
+    return len(inverted_index[term_id]) // 2
+
+def calculate_weighted_BM25(inverted_index, N, term_weights, doc_lengths, average_doc_length, term_statistics=None, k=None):
+    # (doc id, score) of the top k documents, where every term's BM25 score is scaled by its
+    # weight in the query, with weights of 1 this scores exactly as calculate_BM25_algorithm
+    scores = {}
+
+    for term_id, weight in term_weights.items():
+        doc_postings = inverted_index[term_id]
+        idf = BM25.term_idf(N, len(doc_postings) // 2, term_statistics, term_id)
+
+        for index in range(0, len(doc_postings), 2):
+            doc_id = doc_postings[index]
+            f_i = doc_postings[index + 1]
+            K = BM25.length_normalization(doc_lengths[doc_id] / average_doc_length, BM25.k_1, BM25.b)
+            BM25_score = weight * BM25.term_weight(f_i, K, idf)
+
+            if doc_id in scores:
+                scores[doc_id] = scores[doc_id] + BM25_score
+            else:
+                scores[doc_id] = BM25_score
+
+    return BM25.select_top_k(scores, k)
+
+def feedback_term_weights(forward_index, feedback_documents, doc_lengths, inverted_index, term_statistics, feedback_terms):
+    # the relevance model: each feedback document's term frequencies, normalized by its length and
+    # weighted by its first pass score, summed and cut to the heaviest terms, which sum to 1
+    relevance_model = {}
+
+    for doc_id, score in feedback_documents:
+        term_vector = forward_index.term_vector(doc_id)
+        doc_length = doc_lengths[doc_id]
+        for index in range(0, len(term_vector), 2):
+            term_id = term_vector[index]
+            relevance_model[term_id] = relevance_model.get(term_id, 0.0) + score * term_vector[index + 1] / doc_length
+
+    # the terms of one feedback document that occur nowhere else tie, the rarer ones are taken
+    # first so the cut does not depend on how term ids were assigned
+    max_document_frequency = MAX_FEEDBACK_DOCUMENT_RATIO * len(doc_lengths)
+    candidates = [(-weight, document_frequency(inverted_index, term_statistics, term_id), term_id) for term_id, weight in relevance_model.items() if weight > 0]
+    candidates.sort()
+    term_weights = {}
+
+    for negative_weight, n_i, term_id in candidates:
+        if len(term_weights) == feedback_terms:
+            break
+        if n_i <= max_document_frequency:
+            term_weights[term_id] = -negative_weight
+
+    total = sum(term_weights.values())
+    return {term_id: weight / total for term_id, weight in term_weights.items()}
+
+def expand_query(query_weights, feedback_weights, original_query_weight):
+    # RM3 interpolates the original query with the relevance model, the query terms stay first
+    expanded_weights = {term_id: original_query_weight * weight for term_id, weight in query_weights.items()}
+
+    for term_id, weight in feedback_weights.items():
+        expanded_weights[term_id] = expanded_weights.get(term_id, 0.0) + (1 - original_query_weight) * weight
+
+    return expanded_weights
+
+def calculate_RM3(inverted_index, lexicon, docnos, query_tokens, stem, doc_lengths, average_doc_length, forward_index, stem_cache=None, term_statistics=None, k=None, feedback_docs=FEEDBACK_DOCS, feedback_terms=FEEDBACK_TERMS, original_query_weight=ORIGINAL_QUERY_WEIGHT):
+    # BM25 with the query expanded from the term vectors of its top feedback_docs documents,
+    # which the forward index holds, so no document is read or tokenized again
+    N = len(docnos)
+
+    query_weights = query_term_weights(lexicon, BM25.stem_query_tokens(query_tokens, stem, stem_cache))
+    if not query_weights:
+        return {}
+
+    first_pass = calculate_weighted_BM25(inverted_index, N, {term_id: 1 for term_id in query_weights}, doc_lengths, average_doc_length, term_statistics, feedback_docs)
+    feedback_weights = feedback_term_weights(forward_index, first_pass, doc_lengths, inverted_index, term_statistics, feedback_terms)
+    expanded_weights = expand_query(query_weights, feedback_weights, original_query_weight)
+
+    return {docnos[doc_id]: score for doc_id, score in calculate_weighted_BM25(inverted_index, N, expanded_weights, doc_lengths, average_doc_length, term_statistics, k)}
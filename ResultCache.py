@@ -0,0 +1,51 @@
+import time
+from collections import OrderedDict
+
+class ResultCache:
+    def __init__(self, capacity, ttl=None):
+        # at most capacity entries, the least recently used is evicted first, and with a ttl an
+        # entry older than ttl seconds counts as a miss
+        self.capacity = capacity
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        if key in self.entries:
+            stored, value = self.entries[key]
+            if self.ttl is None or time.monotonic() - stored <= self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if key in self.entries:
+            del self.entries[key]
+        self.entries[key] = (time.monotonic(), value)
+
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit rate': self.hits / lookups if lookups > 0 else 0.0
+        }
@@ -0,0 +1,319 @@
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import Query
+import IndexReader
+import Segments
+import Positions
+import ResultCache
+
+# seconds a client gets to send its request line and headers
+REQUEST_READ_TIMEOUT = 10
+MAX_HEADER_LINES = 100
+
+# the latencies kept per endpoint for the percentiles /metrics reports
+LATENCY_WINDOW = 1000
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable',
+    504: 'Gateway Timeout'
+}
+
+# the index every search is ranked with, loaded before the worker processes are forked so they
+# share its pages instead of each reading the index again
+service_state = {}
+
+def load_index(directory_path, proximity=False):
+    index_reader = IndexReader.open_index(directory_path)
+
+    service_state.update({
+        'directory_path': directory_path,
+        'inverted_index': index_reader.inverted_index,
+        'lexicon': index_reader.lexicon,
+        'document_metadata': index_reader.document_metadata,
+        'average_doc_length': index_reader.average_doc_length,
+        'positions_reader': Query.get_positions_reader(directory_path),
+        'term_lexicons': Segments.read_lexicons(directory_path),
+        'result_cache': ResultCache.ResultCache(Query.RESULT_CACHE_SIZE, Query.RESULT_CACHE_TTL),
+        'boolean_searcher': Query.get_boolean_searcher(directory_path, index_reader),
+        'sentence_store': Query.get_sentence_store(directory_path),
+        'proximity': proximity
+    })
+
+def open_document_store():
+    # every worker opens the store itself, forked processes would share one file offset
+    service_state['document_store'] = Query.get_document_store(service_state['directory_path'])
+
+def search(query, page):
+    # a page of results for the query, the ranking stays cached in this worker for later pages
+    state = service_state
+    document_metadata = state['document_metadata']
+    cached_results = Query.rank_query(query, state['inverted_index'], state['lexicon'], document_metadata.docnos, document_metadata.doc_lengths, state['average_doc_length'], state['positions_reader'], state['term_lexicons'], state['result_cache'], state['boolean_searcher'], state['proximity'])
+
+    return {
+        'query': query,
+        'page': page,
+        'total': len(cached_results['ranking']),
+        'results': Query.page_results(query, cached_results, page, state['document_store'], document_metadata, state['sentence_store'])
+    }
+
+def get_document(doc_no):
+    document_store = service_state['document_store']
+    internal_id = document_store.get_internal_id(doc_no)
+    if internal_id is None:
+        return None
+
+    return {
+        'docno': doc_no,
+        'metadata': service_state['document_metadata'].metadata(internal_id),
+        'document': document_store.get_document(internal_id)
+    }
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)]
+
+class EndpointMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.statuses = {}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, status, latency):
+        self.requests += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.latencies.append(latency)
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        return {
+            'requests': self.requests,
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+            'latency ms': {
+                'p50': round(percentile(latencies, 50) * 1000, 3),
+                'p95': round(percentile(latencies, 95) * 1000, 3),
+                'p99': round(percentile(latencies, 99) * 1000, 3),
+                'max': round(latencies[-1] * 1000, 3) if latencies else 0.0
+            }
+        }
+
+class SearchService:
+    def __init__(self, workers, max_pending, timeout):
+        # scoring is cpu bound, so with more than one worker it runs in forked processes,
+        # otherwise in a single thread that keeps it off the event loop
+        if workers > 1:
+            self.executor = concurrent.futures.ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'), initializer=open_document_store)
+            # the first job forks every worker, which has to happen before the server listens or
+            # the workers would inherit the sockets of open connections and keep them from closing
+            self.executor.submit(int).result()
+        else:
+            open_document_store()
+            self.executor = concurrent.futures.ThreadPoolExecutor(1)
+
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.started = time.monotonic()
+        self.metrics = {endpoint: EndpointMetrics() for endpoint in ['search', 'doc', 'metrics', 'other']}
+        # whole responses of recent searches, keyed on the normalized query and the page
+        self.response_cache = ResultCache.ResultCache(Query.RESULT_CACHE_SIZE, Query.RESULT_CACHE_TTL)
+
+    async def run_in_executor(self, function, *arguments):
+        # at most max_pending jobs are queued or running, a request beyond that is turned away
+        # right away instead of waiting behind them
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            return 503, {'error': 'Too many pending requests, please retry'}
+
+        self.pending += 1
+        future = asyncio.get_running_loop().run_in_executor(self.executor, function, *arguments)
+        # a job that timed out still holds its slot until the worker is done with it
+        future.add_done_callback(self.release)
+
+        try:
+            return 200, await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return 504, {'error': f'The request took longer than {self.timeout} seconds'}
+
+    def release(self, future):
+        self.pending -= 1
+        if not future.cancelled():
+            # retrieve any exception so it is not reported as never retrieved
+            future.exception()
+
+    async def search(self, parameters):
+        query = parameters.get('q', [''])[0]
+        if not query.strip():
+            return 400, {'error': 'The q parameter must hold a query'}
+
+        try:
+            page = int(parameters.get('page', ['1'])[0])
+        except ValueError:
+            page = 0
+        if page < 1:
+            return 400, {'error': 'The page parameter must be a positive integer'}
+
+        try:
+            key = (Query.query_key(query), page)
+        except ValueError as error:
+            return 400, {'error': str(error)}
+
+        response = self.response_cache.get(key)
+        if response is not None:
+            return 200, response
+
+        status, response = await self.run_in_executor(search, query, page)
+        if status == 200:
+            self.response_cache.put(key, response)
+
+        return status, response
+
+    async def document(self, doc_no):
+        status, response = await self.run_in_executor(get_document, doc_no)
+        if status == 200 and response is None:
+            return 404, {'error': f'No document with docno {doc_no}'}
+
+        return status, response
+
+    def metrics_summary(self):
+        return {
+            'uptime seconds': round(time.monotonic() - self.started, 3),
+            'workers': self.workers,
+            'pending': self.pending,
+            'max pending': self.max_pending,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+            'response cache': self.response_cache.stats(),
+            'endpoints': {endpoint: metrics.summary() for endpoint, metrics in self.metrics.items()}
+        }
+
+    async def route(self, method, target):
+        url = urlsplit(target)
+
+        if url.path == '/search':
+            endpoint = 'search'
+        elif url.path.startswith('/doc/'):
+            endpoint = 'doc'
+        elif url.path == '/metrics':
+            endpoint = 'metrics'
+        else:
+            return 'other', 404, {'error': f'Unknown path {url.path}'}
+
+        if method != 'GET':
+            return endpoint, 405, {'error': 'Only GET requests are supported'}
+
+        if endpoint == 'search':
+            status, response = await self.search(parse_qs(url.query))
+        elif endpoint == 'doc':
+            status, response = await self.document(unquote(url.path[len('/doc/'):]))
+        else:
+            status, response = 200, self.metrics_summary()
+
+        return endpoint, status, response
+
+    async def handle_connection(self, reader, writer):
+        start = time.perf_counter()
+        endpoint = 'other'
+
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), REQUEST_READ_TIMEOUT)
+            for _ in range(MAX_HEADER_LINES):
+                header = await asyncio.wait_for(reader.readline(), REQUEST_READ_TIMEOUT)
+                if header in (b'\r\n', b'\n', b''):
+                    break
+
+            parts = request_line.decode('latin-1').split()
+            if len(parts) != 3:
+                status, response = 400, {'error': 'Malformed request line'}
+            else:
+                endpoint, status, response = await self.route(parts[0], parts[1])
+        except (asyncio.TimeoutError, ConnectionError):
+            writer.close()
+            return
+        except Exception as error:
+            status, response = 500, {'error': str(error)}
+
+        body = json.dumps(response).encode('utf-8')
+        head = f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\nConnection: close\r\n"
+        if status == 503:
+            head += "Retry-After: 1\r\n"
+
+        try:
+            writer.write(head.encode('latin-1') + b"\r\n" + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+        self.metrics[endpoint].record(status, time.perf_counter() - start)
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+async def serve(service, host, port):
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"Serving /search?q=, /doc/{{docno}} and /metrics on http://{host}:{port}")
+
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve searches over an index as JSON over HTTP. For example: python SearchService.py /searchengines/latimes-index --port 8080 --workers 4')
+    parser.add_argument('directory_path', help='Directory path of the index')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--workers', type=int, default=1, help='Number of forked processes searches are ranked in, 1 ranks them in a thread')
+    parser.add_argument('--max_pending', type=int, default=64, help='Searches and document reads queued or running before new ones are turned away with 503')
+    parser.add_argument('--proximity', action='store_true', help='Add a term proximity score from the positional index')
+    parser.add_argument('--timeout', type=float, default=5.0, help='Seconds a request may take before it is answered with 504')
+
+    cli = parser.parse_args()
+
+    if not os.path.exists(cli.directory_path):
+        print("This directory path does not exist! Please enter an existing directory path!")
+        sys.exit()
+
+    if cli.workers > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+        print("Serving with --workers needs processes forked from this one, which this platform does not support!")
+        sys.exit()
+
+    if cli.max_pending < 1 or cli.timeout <= 0:
+        print("--max_pending and --timeout must be greater than 0!")
+        sys.exit()
+
+    if cli.proximity and not Positions.positions_exist(cli.directory_path):
+        print("Unable to find the positional index! Please rebuild the index with --positions!")
+        sys.exit()
+
+    load_index(cli.directory_path, cli.proximity)
+    service = SearchService(cli.workers, cli.max_pending, cli.timeout)
+
+    try:
+        asyncio.run(serve(service, cli.host, cli.port))
+    except KeyboardInterrupt:
+        print("Stopping the search service")
+    finally:
+        service.close()
+
+if __name__ == '__main__':
+    main()
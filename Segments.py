@@ -0,0 +1,271 @@
+import sys
+import os
+import json
+import math
+import time
+import shutil
+import subprocess
+import Postings
+import Positions
+import Lexicon
+import Impacts
+import BlockMax
+import ForwardIndex
+import DocumentMetadata
+from DocumentStore import map_file
+
+SEGMENTS_FILE_NAME = "/segments.json"
+SEGMENTS_DIRECTORY = "/segments"
+SEGMENTS_LOCK_FILE_NAME = "/segments.lock"
+MERGE_LOCK_FILE_NAME = "/merge.lock"
+
+# the index built by a normal IndexEngine run lives in the storage directory itself
+BASE_SEGMENT = "."
+
+# segments whose document counts fall in the same power of MERGE_FACTOR share a tier, and
+# MERGE_FACTOR adjacent segments of one tier are compacted into a single segment
+MERGE_FACTOR = 4
+
+LOCK_POLL_SECONDS = 0.1
+
+def read_segments(directory_path):
+    segments_file_path = directory_path + SEGMENTS_FILE_NAME
+
+    if os.path.exists(segments_file_path):
+        with open(segments_file_path, 'r') as segments_file:
+            return json.load(segments_file)
+
+    return {'segments': [{'path': BASE_SEGMENT, 'first id': 0, 'documents': None}], 'next segment': 1}
+
+def write_segments(directory_path, segments):
+    # write then rename so readers never see a half written segment list
+    segments_file_path = directory_path + SEGMENTS_FILE_NAME
+
+    with open(segments_file_path + ".tmp", 'w') as segments_file:
+        json.dump(segments, segments_file, indent=4)
+    os.replace(segments_file_path + ".tmp", segments_file_path)
+
+def get_segment_paths(directory_path):
+    return [os.path.normpath(directory_path + "/" + segment['path']) for segment in read_segments(directory_path)['segments']]
+
+def acquire_lock(lock_file_path):
+    while True:
+        try:
+            os.close(os.open(lock_file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return
+        except FileExistsError:
+            time.sleep(LOCK_POLL_SECONDS)
+
+def release_lock(lock_file_path):
+    os.remove(lock_file_path)
+
+def new_segment_path(directory_path):
+    acquire_lock(directory_path + SEGMENTS_LOCK_FILE_NAME)
+    try:
+        segments = read_segments(directory_path)
+        segment_name = f"segment-{segments['next segment']}"
+        segments['next segment'] += 1
+        write_segments(directory_path, segments)
+    finally:
+        release_lock(directory_path + SEGMENTS_LOCK_FILE_NAME)
+
+    segment_path = directory_path + SEGMENTS_DIRECTORY + "/" + segment_name
+    os.makedirs(segment_path)
+
+    return segment_path
+
+def add_segment(directory_path, segment_path, first_id, documents):
+    acquire_lock(directory_path + SEGMENTS_LOCK_FILE_NAME)
+    try:
+        segments = read_segments(directory_path)
+
+        # an index written before segments existed is the base segment holding every earlier document
+        for segment in segments['segments']:
+            if segment['documents'] is None:
+                segment['documents'] = first_id
+
+        segments['segments'].append({
+            'path': os.path.relpath(segment_path, directory_path),
+            'first id': first_id,
+            'documents': documents
+        })
+        write_segments(directory_path, segments)
+    finally:
+        release_lock(directory_path + SEGMENTS_LOCK_FILE_NAME)
+
+def read_lexicon(segment_path):
+    return Lexicon.Lexicon(segment_path)
+
+def read_lexicons(directory_path):
+    return [read_lexicon(segment_path) for segment_path in get_segment_paths(directory_path)]
+
+def merge_lexicons(segment_lexicons):
+    # the terms of the first segment get the first merged ids in sorted utf-8 byte order, the order
+    # Lexicon.items yields them in, then each later segment's new terms follow in the same order,
+    # and every merged term lists the (segment number, segment term id) pairs it is made of in
+    # segment order
+    lexicon = {}
+    term_sources = []
+
+    for segment_number, segment_lexicon in enumerate(segment_lexicons):
+        for term, segment_term_id in segment_lexicon.items():
+            if term not in lexicon:
+                lexicon[term] = len(lexicon)
+                term_sources.append([])
+            term_sources[lexicon[term]].append((segment_number, segment_term_id))
+
+    return lexicon, term_sources
+
+def segment_tier(segment):
+    return int(math.log(max(segment['documents'], 1), MERGE_FACTOR))
+
+def find_merge(segments):
+    start = 0
+
+    while start < len(segments):
+        end = start + 1
+        while end < len(segments) and segment_tier(segments[end]) == segment_tier(segments[start]):
+            end += 1
+
+        if end - start >= MERGE_FACTOR:
+            return start, start + MERGE_FACTOR
+        start = end
+
+    return None
+
+def merge_segment_positions(segment_paths, merged_segment_path, term_sources):
+    segment_tables = [Positions.read_positions_table(segment_path) for segment_path in segment_paths]
+    segment_positions = [memoryview(map_file(segment_path + Positions.POSITIONS_FILE_NAME)) for segment_path in segment_paths]
+    positions_writer = Positions.PositionsWriter(merged_segment_path)
+
+    for term_id, sources in enumerate(term_sources):
+        blobs = [Positions.read_term_blob(segment_positions[segment_number], segment_tables[segment_number], segment_term_id) for segment_number, segment_term_id in sources]
+        positions_writer.add(term_id, b"".join(blobs))
+
+    positions_writer.close()
+
+    for positions in segment_positions:
+        positions.release()
+
+def merge_segment_forward_indexes(segment_paths, merged_segment_path, term_sources):
+    # the term vectors keep their documents' order, only their term ids change to the merged ones
+    term_ids = ForwardIndex.merged_term_ids(term_sources, len(segment_paths))
+    forward_index_writer = ForwardIndex.ForwardIndexWriter(merged_segment_path)
+
+    for segment_number, segment_path in enumerate(segment_paths):
+        table = ForwardIndex.read_forward_table(segment_path)
+        with open(segment_path + ForwardIndex.FORWARD_FILE_NAME, 'rb') as forward_file:
+            data = memoryview(forward_file.read())
+
+        for local_id in range(len(table) - 1):
+            term_vector = Postings.decode_postings(data[table[local_id]:table[local_id + 1]])
+            forward_index_writer.add({term_ids[segment_number][term_vector[index]]: term_vector[index + 1] for index in range(0, len(term_vector), 2)})
+
+    forward_index_writer.close()
+
+def merge_segment_files(segment_paths, merged_segment_path):
+    segment_lexicons = [read_lexicon(segment_path) for segment_path in segment_paths]
+    segment_tables = [Postings.read_postings_table(segment_path) for segment_path in segment_paths]
+    segment_postings_files = [open(segment_path + Postings.POSTINGS_FILE_NAME, 'rb') for segment_path in segment_paths]
+    lexicon, term_sources = merge_lexicons(segment_lexicons)
+
+    postings_writer = Postings.PostingsWriter(merged_segment_path)
+
+    for term_id, sources in enumerate(term_sources):
+        postings = []
+        for segment_number, segment_term_id in sources:
+            table = segment_tables[segment_number]
+            offset = table[segment_term_id * Postings.TABLE_ENTRY_WIDTH]
+            length = table[segment_term_id * Postings.TABLE_ENTRY_WIDTH + 1]
+            segment_postings_files[segment_number].seek(offset)
+            postings.extend(Postings.decode_postings(segment_postings_files[segment_number].read(length)))
+        postings_writer.add(term_id, postings)
+
+    postings_writer.close()
+
+    for segment_postings_file in segment_postings_files:
+        segment_postings_file.close()
+
+    # positions are kept only if every merged segment has them
+    if all(os.path.exists(segment_path + Positions.POSITIONS_FILE_NAME) for segment_path in segment_paths):
+        merge_segment_positions(segment_paths, merged_segment_path, term_sources)
+
+    if all(os.path.exists(segment_path + ForwardIndex.FORWARD_FILE_NAME) for segment_path in segment_paths):
+        merge_segment_forward_indexes(segment_paths, merged_segment_path, term_sources)
+
+    Lexicon.write_lexicon(lexicon, merged_segment_path)
+
+    for segment_lexicon in segment_lexicons:
+        segment_lexicon.close()
+
+def remove_segment_files(directory_path, segment):
+    segment_path = os.path.normpath(directory_path + "/" + segment['path'])
+
+    if segment['path'] == BASE_SEGMENT:
+        # the base segment shares the storage directory with the document store, so only drop its index files
+        for file_name in [Lexicon.LEXICON_FILE_NAME, Lexicon.LEXICON_BLOCKS_FILE_NAME, Postings.POSTINGS_FILE_NAME, Postings.POSTINGS_TABLE_FILE_NAME, Postings.TERM_STATISTICS_FILE_NAME, BlockMax.BLOCKS_FILE_NAME, BlockMax.BLOCKS_TABLE_FILE_NAME, Positions.POSITIONS_FILE_NAME, Positions.POSITIONS_TABLE_FILE_NAME, ForwardIndex.FORWARD_FILE_NAME, ForwardIndex.FORWARD_TABLE_FILE_NAME]:
+            if os.path.exists(segment_path + file_name):
+                os.remove(segment_path + file_name)
+    else:
+        shutil.rmtree(segment_path)
+
+def merge_segments(directory_path):
+    acquire_lock(directory_path + MERGE_LOCK_FILE_NAME)
+    try:
+        merged_any = False
+
+        while True:
+            segments = read_segments(directory_path)['segments']
+            merge = find_merge(segments)
+            if merge is None:
+                break
+            merged_any = True
+
+            start, end = merge
+            merged = segments[start:end]
+            merged_segment_path = new_segment_path(directory_path)
+            merge_segment_files([os.path.normpath(directory_path + "/" + segment['path']) for segment in merged], merged_segment_path)
+            BlockMax.write_blocks(merged_segment_path, DocumentMetadata.DocumentMetadata(directory_path).doc_lengths)
+
+            # appends may have added segments meanwhile, but only this merger removes them
+            acquire_lock(directory_path + SEGMENTS_LOCK_FILE_NAME)
+            try:
+                current = read_segments(directory_path)
+                current['segments'][start:end] = [{
+                    'path': os.path.relpath(merged_segment_path, directory_path),
+                    'first id': merged[0]['first id'],
+                    'documents': sum(segment['documents'] for segment in merged)
+                }]
+                write_segments(directory_path, current)
+            finally:
+                release_lock(directory_path + SEGMENTS_LOCK_FILE_NAME)
+
+            for segment in merged:
+                remove_segment_files(directory_path, segment)
+
+        # impact tables follow the term ids of the segments they were built from
+        if merged_any:
+            Impacts.refresh_impacts(directory_path)
+    finally:
+        release_lock(directory_path + MERGE_LOCK_FILE_NAME)
+
+def start_background_merge(directory_path):
+    # the merge runs detached so appending a batch returns as soon as its segment is searchable
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), directory_path], start_new_session=True)
+
+def main():
+    if len(sys.argv) != 2:
+        print("Wrong number of inputs, please enter Segments followed by the path to an index to compact its segments.")
+        print("For example: python Segments.py /searchengines/latimes-index")
+        sys.exit()
+
+    directory_path = sys.argv[1]
+
+    if not os.path.exists(directory_path + SEGMENTS_FILE_NAME):
+        print("This index has a single segment, there is nothing to merge!")
+        sys.exit()
+
+    merge_segments(directory_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import os
+from array import array
+import Postings
+import Lexicon
+from DocumentStore import map_file
+
+SENTENCES_DIRECTORY = "/sentences"
+SENTENCES_FILE_NAME = "/sentences.bin"
+SENTENCES_TABLE_FILE_NAME = "/sentences-table.bin"
+
+def get_sentences_path(directory_path):
+    return directory_path + SENTENCES_DIRECTORY
+
+def sentences_exist(directory_path):
+    return os.path.exists(get_sentences_path(directory_path) + SENTENCES_TABLE_FILE_NAME)
+
+# token ids are stored as fixed width numbers, which array decodes without a python loop
+TOKEN_ID_TYPECODE = 'I'
+
+def encode_sentences(sentences, lexicon):
+    # the vbyte length of the vbyte numbers (sentence count, then text length and token count of
+    # each sentence), the token ids of every sentence and the utf-8 texts one after the other
+    numbers = [len(sentences)]
+    token_ids = array(TOKEN_ID_TYPECODE)
+    texts = []
+
+    for text, tokens in sentences:
+        text = text.encode('utf-8')
+        numbers.extend((len(text), len(tokens)))
+        for token in tokens:
+            if token not in lexicon:
+                lexicon[token] = len(lexicon)
+            token_ids.append(lexicon[token])
+        texts.append(text)
+
+    encoded_numbers = bytearray()
+    for number in numbers:
+        Postings.encode_vbyte(number, encoded_numbers)
+
+    record = bytearray()
+    Postings.encode_vbyte(len(encoded_numbers), record)
+
+    return bytes(record + encoded_numbers) + token_ids.tobytes() + b"".join(texts)
+
+def decode_sentences(record):
+    numbers_length, position = Lexicon.read_vbyte(record, 0)
+    numbers = Postings.decode_vbyte(record[position:position + numbers_length])
+    position += numbers_length
+    token_counts = numbers[2::2]
+    token_ids = array(TOKEN_ID_TYPECODE)
+    token_ids.frombytes(record[position:position + sum(token_counts) * token_ids.itemsize])
+    text_position = position + len(token_ids) * token_ids.itemsize
+    sentences = []
+    token_position = 0
+
+    for text_length, token_count in zip(numbers[1::2], token_counts):
+        sentences.append((bytes(record[text_position:text_position + text_length]).decode('utf-8'), token_ids[token_position:token_position + token_count]))
+        token_position += token_count
+        text_position += text_length
+
+    return sentences
+
+class SentenceWriter:
+    def __init__(self, storage_path, append=False):
+        # one record per document in internal id order, whose token ids come from a lexicon of
+        # the unstemmed tokens shared by the whole collection, so appends keep adding to it
+        self.sentences_path = get_sentences_path(storage_path)
+        self.lexicon = {}
+        self.table = array('Q')
+
+        if append:
+            sentence_lexicon = Lexicon.Lexicon(self.sentences_path)
+            self.lexicon = dict(sentence_lexicon.items())
+            sentence_lexicon.close()
+            with open(self.sentences_path + SENTENCES_TABLE_FILE_NAME, 'rb') as table_file:
+                self.table.frombytes(table_file.read())
+        else:
+            os.makedirs(self.sentences_path)
+            self.table.append(0)
+
+        self.sentences_file = open(self.sentences_path + SENTENCES_FILE_NAME, 'ab' if append else 'wb')
+
+    def add(self, internal_id, sentences):
+        if internal_id != len(self.table) - 1:
+            raise ValueError(f"Sentences must be stored in internal id order, expected {len(self.table) - 1} but got {internal_id}")
+
+        record = encode_sentences(sentences, self.lexicon)
+        self.sentences_file.write(record)
+        self.table.append(self.table[-1] + len(record))
+
+    def close(self):
+        self.sentences_file.close()
+        Lexicon.write_lexicon(self.lexicon, self.sentences_path)
+
+        with open(self.sentences_path + SENTENCES_TABLE_FILE_NAME, 'wb') as table_file:
+            self.table.tofile(table_file)
+
+class SentenceStore:
+    def __init__(self, directory_path):
+        sentences_path = get_sentences_path(directory_path)
+        self.lexicon = Lexicon.Lexicon(sentences_path)
+        self.table = memoryview(map_file(sentences_path + SENTENCES_TABLE_FILE_NAME)).cast('Q')
+        self.data = memoryview(map_file(sentences_path + SENTENCES_FILE_NAME))
+        # the results of a page share their query, so its ids are looked up once
+        self.last_query_ids = (None, None)
+
+    def __len__(self):
+        return len(self.table) - 1
+
+    def sentences(self, internal_id):
+        # [(text, token ids), ...] of the document's sentences a summary can be made of
+        if not 0 <= internal_id < len(self):
+            raise IndexError(f"No sentences for internal id {internal_id}")
+
+        return decode_sentences(self.data[self.table[internal_id]:self.table[internal_id + 1]])
+
+    def query_ids(self, query_tokens):
+        last_query_tokens, query_ids = self.last_query_ids
+        if query_tokens != last_query_tokens:
+            query_ids = {self.lexicon[query_token] for query_token in query_tokens if query_token in self.lexicon}
+            self.last_query_ids = (query_tokens, query_ids)
+
+        return query_ids
+
+    def close(self):
+        self.table.release()
+        self.data.release()
+        self.lexicon.close()
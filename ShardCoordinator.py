@@ -0,0 +1,274 @@
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+import BM25
+import Stemmer
+import Shards
+import IndexReader
+import DocumentMetadata
+
+# the shard a server process ranks for, opened before it starts accepting connections
+shard_state = {}
+
+def run_local_shard(directory_path, shard_number, connection):
+    # a forked process opens its shard itself and ranks the queries the coordinator sends until
+    # it is sent None
+    index_reader = Shards.open_shard(directory_path, shard_number)
+
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        query_terms, k = request
+        connection.send(Shards.rank_shard(index_reader, query_terms, k))
+
+    index_reader.close()
+    connection.close()
+
+class LocalShard:
+    def __init__(self, directory_path, shard_number):
+        context = multiprocessing.get_context('fork')
+        self.connection, shard_connection = context.Pipe()
+        self.process = context.Process(target=run_local_shard, args=(directory_path, shard_number, shard_connection), daemon=True)
+        self.process.start()
+        shard_connection.close()
+
+    def send(self, query_terms, k):
+        self.connection.send((query_terms, k))
+
+    def receive(self):
+        return self.connection.recv()
+
+    def close(self):
+        self.connection.send(None)
+        self.process.join()
+        self.connection.close()
+
+class RemoteShard:
+    def __init__(self, endpoint):
+        # one connection kept open for every query, requests and answers are lines of JSON
+        host, _, port = endpoint.rpartition(':')
+        self.socket = socket.create_connection((host, int(port)))
+        self.stream = self.socket.makefile('rwb')
+
+    def request(self, request):
+        self.stream.write(json.dumps(request).encode('utf-8') + b"\n")
+        self.stream.flush()
+
+    def response(self):
+        line = self.stream.readline()
+        if not line:
+            raise ConnectionError("the shard server closed the connection")
+
+        response = json.loads(line)
+        if 'error' in response:
+            raise ConnectionError(response['error'])
+
+        return response
+
+    def describe(self):
+        self.request({})
+        return self.response()
+
+    def send(self, query_terms, k):
+        self.request({'query terms': query_terms, 'k': k})
+
+    def receive(self):
+        # json writes floats with repr, so the scores arrive exactly as the shard computed them
+        return [tuple(result) for result in self.response()['results']]
+
+    def close(self):
+        self.stream.close()
+        self.socket.close()
+
+class ShardRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if 'query terms' in request:
+                    # the postings cache is not thread safe, and ranking holds the GIL anyway
+                    with shard_state['lock']:
+                        response = {'results': Shards.rank_shard(shard_state['index_reader'], request['query terms'], request['k'])}
+                else:
+                    response = {'shard': shard_state['shard'], 'shards': shard_state['shards']}
+            except (ValueError, KeyError, TypeError) as error:
+                response = {'error': f"bad request: {error}"}
+
+            self.wfile.write(json.dumps(response).encode('utf-8') + b"\n")
+
+class ShardServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+def get_query_terms(query, stem, stem_cache):
+    # the query tokens in the order calculate_BM25_algorithm goes through them, stemmed here so
+    # the shards only look terms up
+    query_tokens = list(BM25.tokenize(query))
+    if stem:
+        return [stem_cache.stem(query_token) for query_token in query_tokens]
+
+    return query_tokens
+
+def search_shards(shards, query_terms, k):
+    # every shard is sent the query before any answer is read, so the shards rank it at once
+    for shard in shards:
+        shard.send(query_terms, k)
+
+    return Shards.merge_results([shard.receive() for shard in shards], k)
+
+def open_remote_shards(endpoints, shard_count):
+    shards = [RemoteShard(endpoint) for endpoint in endpoints]
+
+    for shard_number, (shard, endpoint) in enumerate(zip(shards, endpoints)):
+        description = shard.describe()
+        if description['shard'] != shard_number or description['shards'] != shard_count:
+            print(f"{endpoint} serves shard {description['shard']} of {description['shards']} but shard {shard_number} of {shard_count} was expected! Please list the endpoints in shard order!")
+            sys.exit()
+
+    return shards
+
+def check_parity(parity_path, topics, run_lines, stem, k, name):
+    # rank every topic again in this process with the unsharded index, by the same token order
+    index_reader = IndexReader.open_index(parity_path)
+    stem_cache = Stemmer.load_stem_cache(parity_path) if stem else None
+    differing_topics = []
+
+    for (topic_id, query), result_lines in zip(topics, run_lines):
+        ranked_documents_dict = BM25.calculate_BM25_algorithm(index_reader.inverted_index, index_reader.lexicon, index_reader.docnos, list(BM25.tokenize(query)), stem, index_reader.doc_lengths, index_reader.average_doc_length, stem_cache, term_statistics=index_reader.term_statistics, k=k)
+        unsharded_lines = "".join(f"{topic_id} Q0 {doc_no} {index + 1} {score} {name}\n" for index, (doc_no, score) in enumerate(ranked_documents_dict.items()))
+        if unsharded_lines != result_lines:
+            differing_topics.append(topic_id)
+
+    index_reader.close()
+
+    if differing_topics:
+        print(f"The sharded results differ from the unsharded index for topics {', '.join(differing_topics)}!")
+    else:
+        print(f"The sharded results match the unsharded index for all {len(topics)} topics")
+
+def search(cli):
+    directory_path = cli.directory_path
+    stem = cli.stem.lower() == "true"
+
+    if not Shards.shards_exist(directory_path):
+        print("Unable to find the shards! Please build the index with --shards!")
+        sys.exit()
+
+    shard_count = len(Shards.get_shard_paths(directory_path))
+
+    if cli.endpoints and len(cli.endpoints) != shard_count:
+        print(f"The index has {shard_count} shards but {len(cli.endpoints)} endpoints were given! Please give one endpoint per shard!")
+        sys.exit()
+
+    if not cli.endpoints and 'fork' not in multiprocessing.get_all_start_methods():
+        print("Local shards are processes forked from this one, which this platform does not support! Please serve the shards and pass --endpoints!")
+        sys.exit()
+
+    if cli.k < 1:
+        print("--k must be greater than 0!")
+        sys.exit()
+
+    if cli.parity is not None and not os.path.exists(cli.parity):
+        print("The unsharded index directory does not exist! Please enter an existing directory path!")
+        sys.exit()
+
+    docnos = DocumentMetadata.DocumentMetadata(directory_path).docnos
+    stem_cache = Stemmer.load_stem_cache(directory_path) if stem else None
+    queries = BM25.get_queries(directory_path).splitlines()
+    topics = [(queries[index], queries[index + 1]) for index in range(0, len(queries), 2)]
+
+    if stem:
+        output_file = directory_path + "/hw4-bm25-stem-k34lai.txt"
+        name = "k34laiBM25stem"
+    else:
+        output_file = directory_path + "/hw4-bm25-baseline-k34lai.txt"
+        name = "k34laiBM25baseline"
+
+    if cli.endpoints:
+        shards = open_remote_shards(cli.endpoints, shard_count)
+    else:
+        shards = [LocalShard(directory_path, shard_number) for shard_number in range(shard_count)]
+
+    run_lines = []
+    start = time.perf_counter()
+
+    try:
+        with open(output_file, 'w', buffering=BM25.OUTPUT_BUFFER_BYTES) as output_file:
+            for topic_id, query in topics:
+                results = search_shards(shards, get_query_terms(query, stem, stem_cache), cli.k)
+                result_lines = "".join(f"{topic_id} Q0 {docnos[doc_id]} {index + 1} {score} {name}\n" for index, (score, _, doc_id) in enumerate(results))
+                output_file.write(result_lines)
+                run_lines.append(result_lines)
+    except ConnectionError as error:
+        print(f"A shard stopped answering: {error}!")
+        sys.exit()
+    finally:
+        elapsed = time.perf_counter() - start
+        for shard in shards:
+            shard.close()
+
+    print(f"Ranked {len(topics)} queries over {shard_count} shards in {elapsed:.2f}s, {len(topics) / elapsed:.1f} queries/sec")
+
+    if cli.parity is not None:
+        check_parity(cli.parity, topics, run_lines, stem, cli.k, name)
+
+def serve(cli):
+    directory_path = cli.directory_path
+
+    if not Shards.shards_exist(directory_path):
+        print("Unable to find the shards! Please build the index with --shards!")
+        sys.exit()
+
+    shard_count = len(Shards.get_shard_paths(directory_path))
+    if not 0 <= cli.shard < shard_count:
+        print(f"The index has shards 0 to {shard_count - 1}! Please enter one of them!")
+        sys.exit()
+
+    shard_state.update({
+        'index_reader': Shards.open_shard(directory_path, cli.shard),
+        'shard': cli.shard,
+        'shards': shard_count,
+        'lock': threading.Lock()
+    })
+
+    with ShardServer((cli.host, cli.port), ShardRequestHandler) as server:
+        print(f"Serving shard {cli.shard} of {shard_count} on {cli.host}:{cli.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("Stopping the shard server")
+
+    shard_state['index_reader'].close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Rank BM25 over an index built with --shards, scattering each query to the shards and merging their top k. For example: python ShardCoordinator.py search --directory_path /searchengines/latimes-shards --stem false')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    search_parser = subparsers.add_parser('search', help='Rank the queries.txt topics over every shard and write the run file')
+    search_parser.add_argument('--directory_path', required=True, help='Directory path of the sharded index')
+    search_parser.add_argument('--stem', required=True, help='Boolean true or false for whether to stem the words')
+    search_parser.add_argument('--endpoints', nargs='+', help='host:port of the server of each shard in shard order, by default every shard is ranked in a local process')
+    search_parser.add_argument('--k', type=int, default=1000, help='Number of results per topic')
+    search_parser.add_argument('--parity', help='Directory path of the same collection indexed without shards, to check the run against')
+    search_parser.set_defaults(run=search)
+
+    serve_parser = subparsers.add_parser('serve', help='Rank the queries of a coordinator for one shard over TCP')
+    serve_parser.add_argument('--directory_path', required=True, help='Directory path of the sharded index')
+    serve_parser.add_argument('--shard', type=int, required=True, help='Number of the shard to serve')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    serve_parser.add_argument('--port', type=int, required=True, help='Port to listen on')
+    serve_parser.set_defaults(run=serve)
+
+    cli = parser.parse_args()
+    cli.run(cli)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import os
+import json
+import zlib
+import heapq
+from array import array
+import BM25
+import Postings
+import Segments
+import IndexReader
+from DocumentStore import map_file
+
+SHARDS_FILE_NAME = "/shards.json"
+SHARDS_DIRECTORY = "/shards"
+GLOBAL_TERM_STATISTICS_FILE_NAME = "/global-term-statistics.bin"
+
+PARTITIONS = ['hash', 'date']
+
+def get_shard_path(directory_path, shard_number):
+    return directory_path + SHARDS_DIRECTORY + f"/shard-{shard_number}"
+
+def hash_partition(doc_no, shards):
+    # crc32 rather than hash() so a docno lands in the same shard whatever the hash seed
+    return zlib.crc32(doc_no.encode('utf-8')) % shards
+
+def date_partition(date, shards):
+    # every document of a month lands in the same shard and the months take turns
+    return (date.year * 12 + date.month - 1) % shards
+
+def write_shards(directory_path, partition, shards):
+    # written last, so a directory with a shards file holds every shard complete
+    shards_file_path = directory_path + SHARDS_FILE_NAME
+    description = {
+        'partition': partition,
+        'shards': [os.path.relpath(get_shard_path(directory_path, shard_number), directory_path) for shard_number in range(shards)]
+    }
+
+    with open(shards_file_path + ".tmp", 'w') as shards_file:
+        json.dump(description, shards_file, indent=4)
+    os.replace(shards_file_path + ".tmp", shards_file_path)
+
+def shards_exist(directory_path):
+    return os.path.exists(directory_path + SHARDS_FILE_NAME)
+
+def read_shards(directory_path):
+    with open(directory_path + SHARDS_FILE_NAME, 'r') as shards_file:
+        return json.load(shards_file)
+
+def get_shard_paths(directory_path):
+    return [os.path.normpath(directory_path + "/" + shard_path) for shard_path in read_shards(directory_path)['shards']]
+
+def write_global_term_statistics(directory_path, shard_paths):
+    # each shard gets the (df, cf) of its terms over the whole collection, aligned with its own
+    # term ids, so a shard scores its documents with the idf the unsharded index would use
+    lexicons = [Segments.read_lexicon(shard_path) for shard_path in shard_paths]
+    collection_statistics = {}
+
+    for lexicon, shard_path in zip(lexicons, shard_paths):
+        term_statistics = Postings.read_term_statistics(shard_path)
+        for term, term_id in lexicon.items():
+            df = term_statistics.document_frequency(term_id)
+            cf = term_statistics.collection_frequency(term_id)
+            if term in collection_statistics:
+                collection_statistics[term][0] += df
+                collection_statistics[term][1] += cf
+            else:
+                collection_statistics[term] = [df, cf]
+        term_statistics.statistics.release()
+
+    for lexicon, shard_path in zip(lexicons, shard_paths):
+        global_statistics = array('Q', bytes(Postings.STATISTICS_ENTRY_WIDTH * len(lexicon) * 8))
+        for term, term_id in lexicon.items():
+            entry = term_id * Postings.STATISTICS_ENTRY_WIDTH
+            global_statistics[entry:entry + Postings.STATISTICS_ENTRY_WIDTH] = array('Q', collection_statistics[term])
+
+        with open(shard_path + GLOBAL_TERM_STATISTICS_FILE_NAME, 'wb') as statistics_file:
+            global_statistics.tofile(statistics_file)
+        lexicon.close()
+
+def read_global_term_statistics(shard_path):
+    statistics_map = map_file(shard_path + GLOBAL_TERM_STATISTICS_FILE_NAME)
+    return Postings.TermStatistics(memoryview(statistics_map).cast('Q'))
+
+def open_shard(directory_path, shard_number):
+    # the shard's lexicon and postings with the collection's documents, manifest and term
+    # statistics, so N, avgdl and every idf are the ones of the unsharded index
+    shard_path = get_shard_paths(directory_path)[shard_number]
+    index_reader = IndexReader.open_index(directory_path, shard_path)
+    index_reader.term_statistics = read_global_term_statistics(shard_path)
+
+    return index_reader
+
+def rank_shard(index_reader, query_terms, k=None):
+    # the shard's top k as (score, entry, doc id) with entry the position in query_terms of the
+    # first term that matched the document, in BM25.result_order, the order calculate_BM25_algorithm
+    # leaves equal scores in, so merging shards reproduces it
+    first_entries = {}
+    scores, _ = BM25.score_query_terms(index_reader.inverted_index, index_reader.lexicon, query_terms, len(index_reader.docnos), index_reader.doc_lengths, index_reader.average_doc_length, index_reader.term_statistics, first_entries)
+
+    results = [(score, first_entries[doc_id], doc_id) for doc_id, score in scores.items()]
+    if k is None:
+        return sorted(results, key=BM25.result_order)
+
+    return heapq.nsmallest(k, results, key=BM25.result_order)
+
+def merge_results(shard_results, k=None):
+    # every shard's results are already in result_order, so the collection's top k is a merge
+    merged = heapq.merge(*shard_results, key=BM25.result_order)
+    if k is None:
+        return list(merged)
+
+    return [result for _, result in zip(range(k), merged)]
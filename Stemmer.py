@@ -0,0 +1,78 @@
+import os
+from collections import OrderedDict
+from PorterStemmer import PorterStemmer
+
+STEMS_FILE_NAME = "/stems.txt"
+
+# distinct surface forms kept in memory while indexing, far more than the latimes vocabulary
+DEFAULT_CACHE_SIZE = 1 << 20
+
+class StemCache:
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, stems=None, record_new_stems=True):
+        self.porterStemmer = PorterStemmer()
+        self.max_size = max_size
+        self.cache = OrderedDict(stems or {})
+        self.record_new_stems = record_new_stems
+        self.new_stems = {}
+
+    def stem(self, token):
+        cache = self.cache
+
+        if token in cache:
+            cache.move_to_end(token)
+            return cache[token]
+
+        stem = self.porterStemmer.stem(token, 0, len(token) - 1)
+        cache[token] = stem
+        # a form the LRU evicted is recorded again, StemsWriter leaves out the forms it wrote
+        if self.record_new_stems:
+            self.new_stems[token] = stem
+
+        # evict the least recently used surface form
+        if self.max_size and len(cache) > self.max_size:
+            cache.popitem(last=False)
+
+        return stem
+
+    def take_new_stems(self):
+        # surface forms stemmed since the last call, to be added to the stems file
+        new_stems = self.new_stems
+        self.new_stems = {}
+        return new_stems
+
+def write_stems(stems, stems_file):
+    stems_file.write("".join(f"{surface} {stem}\n" for surface, stem in stems.items()))
+
+class StemsWriter:
+    def __init__(self, storage_path, append=False):
+        # each worker reports every form it stemmed itself, so forms another worker or an earlier
+        # build already wrote are left out and the file is the one a serial build writes
+        self.written_stems = set(read_stems(storage_path)) if append and stems_exist(storage_path) else set()
+        self.stems_file = open(storage_path + STEMS_FILE_NAME, 'a' if append else 'w')
+
+    def add(self, stems):
+        new_stems = {surface: stem for surface, stem in stems.items() if surface not in self.written_stems}
+        if new_stems:
+            self.written_stems.update(new_stems)
+            write_stems(new_stems, self.stems_file)
+
+    def close(self):
+        self.stems_file.close()
+
+def stems_exist(directory_path):
+    return os.path.exists(directory_path + STEMS_FILE_NAME)
+
+def read_stems(directory_path):
+    stems = {}
+
+    with open(directory_path + STEMS_FILE_NAME, 'r') as stems_file:
+        for line in stems_file:
+            surface, stem = line.split()
+            stems[surface] = stem
+
+    return stems
+
+def load_stem_cache(directory_path):
+    # query time stemming is a dictionary lookup for every surface form seen while indexing
+    stems = read_stems(directory_path) if stems_exist(directory_path) else {}
+    return StemCache(max_size=None, stems=stems, record_new_stems=False)
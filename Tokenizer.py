@@ -0,0 +1,64 @@
+import re
+import string
+
+# for ascii text, mapping every character other than a lowercase letter or digit to a space
+# and splitting on whitespace gives exactly the tokens
+ASCII_SEPARATORS = str.maketrans({chr(code): ' ' for code in range(128) if chr(code) not in string.ascii_lowercase + string.digits})
+
+# the same tokens found one at a time, for callers that stream them instead of splitting
+ASCII_TOKEN_REGEX = re.compile(r'[a-z0-9]+')
+
+# \w also matches numeric characters such as '½' that are neither letters nor digits, so
+# non-ascii matches are checked against the isalpha/isdigit rule before being used
+UNICODE_TOKEN_REGEX = re.compile(r'[^\W_]+')
+
+def split_tokens(text):
+    # reference tokenizer: a token is a maximal run of characters that are letters or digits
+    start = 0
+    i = 0
+
+    for currChar in text:
+        if not currChar.isdigit() and not currChar.isalpha():
+            if start != i:
+                yield text[start:i]
+
+            start = i + 1
+
+        i = i + 1
+
+    if start != i:
+        yield text[start:i]
+
+def is_token(text):
+    return all(currChar.isalpha() or currChar.isdigit() for currChar in text)
+
+def iter_unicode_tokens(text):
+    for match in UNICODE_TOKEN_REGEX.finditer(text):
+        token = match.group()
+        if token.isascii() or is_token(token):
+            yield token
+        else:
+            yield from split_tokens(token)
+
+def tokenize(text):
+    text = text.lower()
+
+    if text.isascii():
+        return text.translate(ASCII_SEPARATORS).split()
+
+    return list(iter_unicode_tokens(text))
+
+def iter_tokens(text):
+    # the tokens of tokenize, found lazily as they are asked for rather than split into a list
+    text = text.lower()
+
+    if text.isascii():
+        for match in ASCII_TOKEN_REGEX.finditer(text):
+            yield match.group()
+    else:
+        yield from iter_unicode_tokens(text)
+
+def iter_text_tokens(texts):
+    # streaming interface over many strings, such as the lines or fields of a document
+    for text in texts:
+        yield from iter_tokens(text)
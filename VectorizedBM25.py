@@ -0,0 +1,94 @@
+import BM25
+
+# numpy is optional, without it only the pure python scorers are available
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# marks a document no query term has matched yet
+NO_ENTRY = -1
+
+def numpy_available():
+    return numpy is not None
+
+def rank_order(doc_ids, scores, first_entries, k):
+    # indexes of the k best documents, highest score first, ties by the first query term that
+    # matched and then by doc id, which is the insertion order the python scorer's dict gives them
+    candidates = numpy.arange(len(doc_ids))
+
+    if k is not None and k < len(doc_ids):
+        # everything scoring at least the k-th best score, ties at the cutoff included
+        threshold = scores[numpy.argpartition(-scores, k - 1)[k - 1]]
+        candidates = numpy.flatnonzero(scores >= threshold)
+
+    order = candidates[numpy.lexsort((doc_ids[candidates], first_entries[candidates], -scores[candidates]))]
+    return order[:k] if k is not None else order
+
+class VectorizedScorer:
+    def __init__(self, inverted_index, doc_lengths, average_doc_length):
+        self.inverted_index = inverted_index
+        self.doc_lengths = numpy.asarray(doc_lengths, dtype=numpy.float64)
+        self.average_doc_length = average_doc_length
+        self.postings = {}
+
+        # float64 like the python scorer, float32 sums would not give the same scores
+        self.scores = numpy.zeros(len(self.doc_lengths), dtype=numpy.float64)
+        self.first_entries = numpy.full(len(self.doc_lengths), NO_ENTRY, dtype=numpy.int32)
+
+        self.parameters = None
+        self.normalization = None
+
+    def get_normalization(self):
+        # K of every document, recomputed only when k1 or b change, as they do in the parameter sweep
+        if self.parameters != (BM25.k_1, BM25.b):
+            self.parameters = (BM25.k_1, BM25.b)
+            self.normalization = BM25.length_normalization(self.doc_lengths / self.average_doc_length, BM25.k_1, BM25.b)
+        return self.normalization
+
+    def get_postings(self, term_id):
+        # doc ids and counts of a term as int32 arrays, converted the first time the term is queried
+        if term_id not in self.postings:
+            postings = numpy.array(self.inverted_index[term_id], dtype=numpy.int32)
+            self.postings[term_id] = (postings[0::2], postings[1::2])
+        return self.postings[term_id]
+
+    def score(self, lexicon, docnos, query_tokens, stem, stem_cache=None, term_statistics=None, k=None):
+        # calculate_BM25_algorithm over dense accumulators indexed by internal id, with the same
+        # scores, the same order of ties, and docnos only looked up for the returned documents
+        N = len(docnos)
+        normalization = self.get_normalization()
+        scores = self.scores
+        first_entries = self.first_entries
+        matched = []
+        entry = 0
+
+        for query_token in BM25.stem_query_tokens(query_tokens, stem, stem_cache):
+            if query_token not in lexicon:
+                continue
+
+            query_token_id = lexicon[query_token]
+            doc_ids, counts = self.get_postings(query_token_id)
+            idf = BM25.term_idf(N, len(doc_ids), term_statistics, query_token_id)
+
+            # a term's doc ids are distinct, so a plain scatter add is safe and every document
+            # gets its term scores added in query term order, as the python scorer adds them
+            scores[doc_ids] += BM25.term_weight(counts, normalization[doc_ids], idf)
+
+            new_doc_ids = doc_ids[first_entries[doc_ids] == NO_ENTRY]
+            first_entries[new_doc_ids] = entry
+            matched.append(new_doc_ids)
+            entry += 1
+
+        if not matched:
+            return {}
+
+        matched = numpy.concatenate(matched)
+        ranked_doc_ids = matched[rank_order(matched, scores[matched], first_entries[matched], k)]
+        ranked_documents = {docnos[int(doc_id)]: float(scores[doc_id]) for doc_id in ranked_doc_ids}
+
+        # only the matched documents were touched
+        scores[matched] = 0.0
+        first_entries[matched] = NO_ENTRY
+
+        return ranked_documents